@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Grouped count, sum and max over fetched events: a loop over Event.data
+dicts against sky.analytics over the same events and over EventFrames.
+
+    python -m benchmarks.bench_analytics [events] [objects]
+"""
+import sys
+import timeit
+
+from datetime import datetime, timedelta
+
+from sky import resources
+from sky.analytics import LocalQuery
+from sky.frame import EventFrame
+from sky.query import Query, Selection
+
+
+PROPERTIES = [
+    resources.Property(1, 'action', False, 'factor'),
+    resources.Property(2, 'price', False, 'float'),
+    resources.Property(3, 'count', False, 'integer'),
+]
+
+QUERY = Query(
+    Selection().group_by('action').count().sum('price').max('count')
+)
+
+
+def make_objects(count, objects):
+    start = datetime(2014, 2, 21, 10, 10, 23, 203)
+    per_object = count // objects
+    return [
+        [
+            resources.Event(
+                {
+                    'action': ('view', 'buy', 'signup')[i % 3],
+                    'price': i * 1.25,
+                    'count': i,
+                },
+                start + timedelta(seconds=i)
+            )
+            for i in range(per_object)
+        ]
+        for _ in range(objects)
+    ]
+
+
+def loop(objects):
+    result = {}
+    for events in objects:
+        for event in events:
+            data = event.data
+            group = result.setdefault(data['action'], {'count': 0})
+            group['count'] += 1
+            group['sum_price'] = group.get('sum_price', 0) + data['price']
+            group['max_count'] = max(group.get('max_count', 0), data['count'])
+    return result
+
+
+def main(count=100000, objects=100):
+    objects = make_objects(count, objects)
+    frames = [EventFrame.from_events(e, PROPERTIES) for e in objects]
+    local = LocalQuery(QUERY)
+    expected = local.run(frames)['action']
+    assert loop(objects) == expected, loop(objects)
+    print('%-16s %12s' % ('method', 'events/s'))
+    for name, func in (
+        ('loop', lambda: loop(objects)),
+        ('local/events', lambda: local.run(objects)),
+        ('local/frames', lambda: local.run(frames)),
+    ):
+        elapsed = min(timeit.repeat(func, number=1, repeat=3))
+        print('%-16s %12.0f' % (name, count / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
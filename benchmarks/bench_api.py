@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Operations per second, with median and 99th percentile latency, for each
+SkyClient API against the in-process SkyStubServer. ``latency_ms`` is
+added to every response to stand in for a remote server.
+
+    python -m benchmarks.bench_api [calls] [latency_ms]
+"""
+import sys
+import time
+
+from datetime import datetime, timedelta
+
+from sky import SkyClient, resources
+from sky.metrics import LatencyHistogram, clock
+from sky.query import Query, Selection
+from sky.stubserver import SkyStubServer
+
+
+START = datetime(2014, 2, 21)
+BULK_SIZE = 1000
+
+
+def setup(client):
+    table = client.create_table(resources.Table(name='bench'))
+    for name, data_type in (('action', 'factor'), ('n', 'integer')):
+        table.create_property(
+            resources.Property(name=name, data_type=data_type)
+        )
+    client.create_events(table, [
+        (
+            'user-%d' % (n % 10),
+            resources.Event(
+                {'action': 'view', 'n': n},
+                START + timedelta(seconds=n)
+            )
+        )
+        for n in range(1000)
+    ])
+    return table
+
+
+def operations(client, table):
+    """
+    (name, events per call, function of the call number), reads first so
+    that writes do not grow what they read
+    """
+    query = client.compile_query(
+        table,
+        Query(Selection().group_by('action').count())
+    )
+
+    def create_event(i):
+        client.create_event(
+            table,
+            'writer',
+            resources.Event({'n': i}, START + timedelta(seconds=i))
+        )
+
+    def create_events(i):
+        base = START + timedelta(days=1 + i)
+        client.create_events(table, [
+            (
+                'bulk-%d' % (n % 100),
+                resources.Event({'n': n}, base + timedelta(seconds=n))
+            )
+            for n in range(BULK_SIZE)
+        ])
+
+    return (
+        ('ping', 1, lambda i: client.ping()),
+        ('get_tables', 1, lambda i: client.get_tables()),
+        ('get_properties', 1, lambda i: client.get_properties(table)),
+        (
+            'get_event',
+            1,
+            lambda i: client.get_event(table, 'user-1', START + timedelta(
+                seconds=1
+            ))
+        ),
+        ('get_events', 100, lambda i: client.get_events(table, 'user-1')),
+        (
+            'iter_events',
+            100,
+            lambda i: list(client.iter_events(table, 'user-1'))
+        ),
+        ('query', 1, lambda i: client.query(table, query)),
+        ('create_event', 1, create_event),
+        ('create_events', BULK_SIZE, create_events),
+    )
+
+
+def main(calls=200, latency_ms=0):
+    with SkyStubServer() as server:
+        client = SkyClient(
+            server.host,
+            server.port,
+            codec='json',
+            schema_cache=None
+        )
+        table = setup(client)
+        server.latency = latency_ms / 1000.0
+        print('%-16s %10s %10s %9s %9s' % (
+            'api',
+            'ops/s',
+            'events/s',
+            'p50 ms',
+            'p99 ms'
+        ))
+        for name, events, func in operations(client, table):
+            histogram = LatencyHistogram()
+            count = calls if events < BULK_SIZE else max(1, calls // 20)
+            start = time.time()
+            for i in range(count):
+                began = clock()
+                func(i)
+                histogram.record(clock() - began)
+            elapsed = time.time() - start
+            print('%-16s %10.0f %10.0f %9.3f %9.3f' % (
+                name,
+                count / elapsed,
+                count * events / elapsed,
+                histogram.percentile(50) * 1000,
+                histogram.percentile(99) * 1000
+            ))
+        client.close()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
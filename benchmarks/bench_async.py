@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Wall clock for N concurrent get_event calls against a local SkyStubServer,
+AsyncSkyClient versus SkyClient on a thread pool.
+
+    python -m benchmarks.bench_async [calls] [concurrency]
+"""
+import asyncio
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sky import SkyClient
+from sky import resources
+from sky.aio import AsyncSkyClient
+from sky.stubserver import SkyStubServer
+
+
+TIMESTAMP = datetime(2014, 2, 21)
+
+
+def setup(server, calls):
+    """One event per object read, so that every get_event finds one"""
+    with SkyClient(server.host, server.port) as client:
+        table = client.create_table(resources.Table(name='events'))
+        table.create_property(
+            resources.Property(name='n', data_type='integer')
+        )
+        client.create_events(table, [
+            (object_id, resources.Event({'n': object_id}, TIMESTAMP))
+            for object_id in range(calls)
+        ])
+    return table
+
+
+def threaded(server, table, calls, concurrency):
+    client = SkyClient(server.host, server.port, pool_maxsize=concurrency)
+    with client, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(
+            lambda object_id: client.get_event(table, object_id, TIMESTAMP),
+            range(calls)
+        ))
+
+
+def asynchronous(server, table, calls, concurrency):
+    async def run():
+        client = AsyncSkyClient(
+            server.host,
+            server.port,
+            pool_maxsize=concurrency,
+            max_in_flight=concurrency
+        )
+        async with client:
+            await asyncio.gather(*[
+                client.get_event(table, object_id, TIMESTAMP)
+                for object_id in range(calls)
+            ])
+    asyncio.run(run())
+
+
+def main(calls=10000, concurrency=50):
+    with SkyStubServer() as server:
+        table = setup(server, calls)
+        for name, func in (('threaded', threaded), ('async', asynchronous)):
+            start = time.time()
+            func(server, table, calls, concurrency)
+            elapsed = time.time() - start
+            print('%-10s %8.2fs %10.1f calls/s' % (
+                name,
+                elapsed,
+                calls / elapsed
+            ))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
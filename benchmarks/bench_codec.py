@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Encode/decode throughput of each installed JSON codec over representative
+event and query payloads.
+
+    python -m benchmarks.bench_codec [repeat]
+"""
+import sys
+import timeit
+
+from sky import codec
+from sky import resources
+from sky import timestamp as ts
+
+
+def payloads():
+    events = [
+        resources.Event(
+            data={
+                'action': 'view',
+                'page': '/products/%d' % i,
+                'price': i * 1.25,
+                'logged_in': i % 2 == 0,
+                'count': i,
+            },
+            timestamp=ts.from_micros(1392977423000203 + i)
+        ).to_dict()
+        for i in range(1000)
+    ]
+    query = {
+        'steps': [
+            {
+                'type': 'condition',
+                'expression': 'action == "view"',
+                'within': [1, 7],
+                'steps': [
+                    {
+                        'type': 'selection',
+                        'dimensions': ['page'],
+                        'fields': [
+                            {'name': 'count', 'expression': 'count()'}
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+    results = {
+        'page': dict(
+            ('/products/%d' % i, {'count': i}) for i in range(1000)
+        )
+    }
+    return (
+        ('1k events', events),
+        ('funnel query', query),
+        ('query result', results),
+    )
+
+
+def installed_codecs():
+    for cls in codec.CODECS:
+        try:
+            yield cls()
+        except ImportError:
+            pass
+
+
+def main(repeat=200):
+    for name, payload in payloads():
+        for instance in installed_codecs():
+            encoded = instance.dumps(payload)
+            dumps = min(timeit.repeat(
+                lambda: instance.dumps(payload),
+                number=repeat,
+                repeat=3
+            )) / repeat
+            loads = min(timeit.repeat(
+                lambda: instance.loads(encoded),
+                number=repeat,
+                repeat=3
+            )) / repeat
+            print('%-14s %-8s %9d bytes dumps %8.1f us loads %8.1f us' % (
+                name,
+                instance.name,
+                len(encoded),
+                dumps * 1e6,
+                loads * 1e6
+            ))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+get_events_many against a local SkyStubServer taking ``delay_ms`` to answer
+each request, at concurrency 1, 2, 4, ... up to ``max_concurrency``.
+Fetching one object at a time costs one round trip per object, so the
+speedup should be close to the concurrency until the CPU time of client
+and stub, which share this process, catches up with the delay.
+
+    python -m benchmarks.bench_events_many [objects] [max_concurrency] \\
+        [delay_ms]
+"""
+import sys
+import time
+
+from datetime import datetime, timedelta
+
+from sky import SkyClient, resources
+from sky.stubserver import SkyStubServer
+
+
+START = datetime(2014, 2, 21, 10)
+
+
+def setup(client, object_ids, count=10):
+    """``count`` events for each object, a minute apart"""
+    table = client.create_table(resources.Table(name='bench'))
+    for name, data_type in (('object_id', 'string'), ('n', 'integer')):
+        table.create_property(
+            resources.Property(name=name, data_type=data_type)
+        )
+    client.create_events(table, [
+        (
+            object_id,
+            resources.Event(
+                {'object_id': object_id, 'n': n},
+                START + timedelta(minutes=n)
+            )
+        )
+        for object_id in object_ids
+        for n in range(count)
+    ])
+    return table
+
+
+def main(objects=100, max_concurrency=16, delay_ms=20):
+    object_ids = ['user-%d' % i for i in range(objects)]
+    with SkyStubServer() as server:
+        client = SkyClient(
+            server.host,
+            server.port,
+            codec='json',
+            pool_maxsize=max_concurrency
+        )
+        table = setup(client, object_ids)
+        server.latency = delay_ms / 1000.0
+        start = time.time()
+        for object_id in object_ids:
+            client.get_events(table, object_id)
+        serial = time.time() - start
+        print('%-12s %8.3fs' % ('get_events', serial))
+
+        concurrency = 1
+        while concurrency <= max_concurrency:
+            start = time.time()
+            for result in client.get_events_many(
+                table,
+                object_ids,
+                concurrency=concurrency
+            ):
+                assert result.error is None, result.error
+                assert len(result.events) == 10
+            elapsed = time.time() - start
+            print('%-12s %8.3fs %6.1fx' % (
+                'many x%d' % concurrency,
+                elapsed,
+                serial / elapsed
+            ))
+            concurrency *= 2
+        client.close()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Memory held by decoded events with and without factor interning, and the
+decode cost of interning.
+
+    python -m benchmarks.bench_factors [events] [distinct]
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+from sky import resources
+from sky.factors import FactorCache
+
+
+PROPERTIES = [
+    resources.Property(1, 'action', False, 'factor'),
+    resources.Property(2, 'country', False, 'factor'),
+    resources.Property(3, 'price', False, 'float'),
+]
+
+
+def make_body(count, distinct):
+    return json.dumps([
+        {
+            'timestamp': '2014-02-21T10:10:%02d.000000Z' % (i % 60),
+            'data': {
+                'action': 'action-%d' % (i % distinct),
+                'country': 'country-%d' % (i % 7),
+                'price': i * 1.25,
+            },
+        }
+        for i in range(count)
+    ])
+
+
+def decode(body, intern):
+    events = [resources.Event.from_dict_fast(d) for d in json.loads(body)]
+    if intern is not None:
+        for event in events:
+            intern(event.data)
+    return events
+
+
+def measure(body, intern):
+    tracemalloc.start()
+    start = time.time()
+    events = decode(body, intern)
+    elapsed = time.time() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(events), size, elapsed
+
+
+def main(count=100000, distinct=20):
+    body = make_body(count, distinct)
+    print('%-10s %12s %10s' % ('interning', 'bytes/ev', 'seconds'))
+    for name, intern in (
+        ('off', None),
+        ('on', FactorCache().interner('events', PROPERTIES)),
+    ):
+        events, size, elapsed = measure(body, intern)
+        print('%-10s %12.1f %10.3f' % (name, size / float(events), elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+A three step funnel over many objects: the general condition search of
+sky.analytics against sky.sequences.Funnel, in this process and on a pool
+of worker processes.
+
+    python -m benchmarks.bench_funnel [objects] [events] [window] [processes]
+"""
+import random
+import sys
+import time
+
+from sky.analytics import LocalQuery
+from sky.sequences import Funnel
+
+
+STEPS = ["action == 'view'", "action == 'cart'", "action == 'buy'"]
+
+
+def make_objects(count, events):
+    rng = random.Random(1)
+    return [
+        [
+            (i * 1000000, {'action': rng.choice(('view', 'cart', 'buy'))})
+            for i in range(events)
+        ]
+        for _ in range(count)
+    ]
+
+
+def main(count=2000, events=200, window=20, processes=4):
+    objects = make_objects(count, events)
+    f = Funnel(STEPS, within=(1, window))
+    print('%-20s %10s %12s' % ('method', 'seconds', 'events/s'))
+    expected = None
+    for name, run in (
+        ('analytics', lambda: LocalQuery(f.query()).run(objects)),
+        ('funnel', lambda: f.run(objects)),
+        (
+            'funnel/%d processes' % processes,
+            lambda: f.run(objects, processes=processes)
+        ),
+    ):
+        start = time.time()
+        result = run()
+        elapsed = time.time() - start
+        expected = expected or result
+        assert result == expected, (name, result, expected)
+        print('%-20s %10.3f %12.0f' % (
+            name,
+            elapsed,
+            count * events / elapsed
+        ))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Per call cost of SkyClient.send with instrumentation off and on, against
+an in-memory session so that network time does not hide it. "direct"
+calls request and decode_response itself, as send did before hooks.
+
+    python -m benchmarks.bench_instrument [calls]
+"""
+import sys
+import time
+
+from sky import SkyClient
+from sky.metrics import LatencyRecorder, to_prometheus
+
+
+class FakeResponse(object):
+
+    status_code = 200
+    content = b'{"count":1}'
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession(object):
+
+    def get(self, url, **kwargs):
+        return FakeResponse()
+
+    def close(self):
+        pass
+
+
+class FakeClient(SkyClient):
+
+    def make_session(self):
+        return FakeSession()
+
+
+def direct(client, calls):
+    for _ in range(calls):
+        client.decode_response(client.request('get', '/tables/t/query'))
+
+
+def send(client, calls):
+    for _ in range(calls):
+        client.send('get', '/tables/t/query')
+
+
+def measure(func, client, calls):
+    best = None
+    for _ in range(5):
+        start = time.perf_counter()
+        func(client, calls)
+        elapsed = (time.perf_counter() - start) / calls
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(calls=50000):
+    recorder = LatencyRecorder()
+    cases = (
+        ('direct', direct, FakeClient(codec='json')),
+        ('no hooks', send, FakeClient(codec='json')),
+        ('recorder', send, FakeClient(codec='json', post_hooks=[recorder])),
+    )
+    base = None
+    for name, func, client in cases:
+        per_call = measure(func, client, calls)
+        base = base or per_call
+        print('%-10s %8.2f us/call %+7.1f%%' % (
+            name,
+            per_call * 1e6,
+            (per_call / base - 1) * 100
+        ))
+    print('')
+    print(to_prometheus(recorder))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Requests/sec of SkyClient.send against a local SkyStubServer, comparing a
+new connection per request (the module level ``requests`` functions) with the
+client's pooled keep-alive session.
+
+    python -m benchmarks.bench_pool [requests] [threads]
+"""
+import sys
+import threading
+import time
+
+import requests
+
+from sky import SkyClient
+from sky.stubserver import SkyStubServer
+
+
+def unpooled(client, count):
+    url = client.make_url('/ping')
+    for _ in range(count):
+        requests.get(url).raise_for_status()
+
+
+def pooled(client, count):
+    for _ in range(count):
+        client.send('get', '/ping')
+
+
+def run(func, client, count, threads):
+    per_thread = count // threads
+    workers = [
+        threading.Thread(target=func, args=(client, per_thread))
+        for _ in range(threads)
+    ]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (per_thread * threads) / (time.time() - start)
+
+
+def main(count=2000, threads=4):
+    with SkyStubServer() as server:
+        with SkyClient(server.host, server.port, pool_maxsize=threads) as c:
+            for name, func in (('unpooled', unpooled), ('pooled', pooled)):
+                rate = run(func, c, count, threads)
+                print('%-10s %10.1f req/s' % (name, rate))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Time and allocations for decoding event dicts into resources.Event, with
+the pre-__slots__ Event kept here as the baseline.
+
+    python -m benchmarks.bench_resources [events]
+"""
+import sys
+import time
+import tracemalloc
+
+from datetime import datetime
+
+from sky import resources
+from sky import timestamp as ts
+
+
+class LegacyEvent(object):
+
+    def __init__(self, data={}, timestamp=None):
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        self.timestamp = timestamp
+        self.data = data
+
+    def from_dict(self, obj):
+        if 'timestamp' in obj:
+            self.timestamp = ts.loads(obj['timestamp'])
+        else:
+            self.timestamp = datetime.utcnow()
+        self.data = obj.get('data', {})
+        return self
+
+
+def legacy(objs):
+    return [LegacyEvent().from_dict(obj) for obj in objs]
+
+
+def from_dict(objs):
+    return [resources.Event().from_dict(obj) for obj in objs]
+
+
+def from_dict_fast(objs):
+    from_dict_fast = resources.Event.from_dict_fast
+    return [from_dict_fast(obj) for obj in objs]
+
+
+def from_dict_fast_with_timestamps(objs):
+    events = from_dict_fast(objs)
+    for event in events:
+        event.timestamp
+    return events
+
+
+def measure(func, objs):
+    start = time.time()
+    func(objs)
+    elapsed = time.time() - start
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    events = func(objs)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    del events
+    return elapsed, blocks, size
+
+
+def main(count=1000000):
+    objs = [
+        {
+            'timestamp': ts.dumps_micros(1392977423000203 + i),
+            'data': {'n': i}
+        }
+        for i in range(count)
+    ]
+    cases = (
+        ('legacy Event', legacy),
+        ('Event().from_dict', from_dict),
+        ('from_dict_fast', from_dict_fast),
+        ('from_dict_fast+ts', from_dict_fast_with_timestamps),
+    )
+    print('%d events' % count)
+    for name, func in cases:
+        elapsed, blocks, size = measure(func, objs)
+        print('%-20s %7.2fs %7.2f allocs/event %7.1f bytes/event' % (
+            name,
+            elapsed,
+            float(blocks) / count,
+            float(size) / count
+        ))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
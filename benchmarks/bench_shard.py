@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+ShardedSkyClient scaling from 1 to ``max_shards`` local SkyStubServers.
+
+Each query costs ``work_ms`` of server time split evenly over the shards,
+as scanning 1/n of the objects would, so fan-out latency should fall
+roughly as 1/n. Bulk writes cost ``batch_ms`` per batch on whichever shard
+receives it, so ingest rate should rise roughly n-fold.
+
+    python -m benchmarks.bench_shard [max_shards] [queries] [events] \\
+        [work_ms] [batch_ms]
+"""
+import sys
+import time
+
+from contextlib import ExitStack
+from datetime import datetime
+
+from sky import resources
+from sky.query import Query, Selection
+from sky.shard import ShardedSkyClient
+from sky.stubserver import SkyStubServer
+
+
+TIMESTAMP = datetime(2014, 2, 21)
+
+
+def start_shards(stack, count, **kwargs):
+    """A ShardedSkyClient over ``count`` stubs holding an empty table"""
+    servers = [
+        stack.enter_context(SkyStubServer()) for _ in range(count)
+    ]
+    client = stack.enter_context(ShardedSkyClient(
+        [(server.host, server.port) for server in servers],
+        **kwargs
+    ))
+    table = client.create_table(resources.Table(name='bench'))
+    table.create_property(resources.Property(name='n', data_type='integer'))
+    return servers, client, table
+
+
+def make_events(count):
+    return [
+        ('user-%d' % i, resources.Event({'n': i}, TIMESTAMP))
+        for i in range(count)
+    ]
+
+
+def measure_queries(shards, queries, work):
+    with ExitStack() as stack:
+        servers, client, table = start_shards(stack, shards)
+        client.create_events(table, make_events(100))
+        for server in servers:
+            server.latency = work / shards
+        q = Query(Selection().count()).compile()
+        start = time.time()
+        for _ in range(queries):
+            assert client.query(table, q)['count'] == 100
+        return (time.time() - start) / queries
+
+
+def measure_writes(shards, count, batch_delay):
+    events = make_events(count)
+    with ExitStack() as stack:
+        servers, client, table = start_shards(
+            stack,
+            shards,
+            bulk_events=True
+        )
+        for server in servers:
+            server.latency = batch_delay
+        start = time.time()
+        result = client.create_events(table, events)
+        assert result.written == count
+        return count / (time.time() - start)
+
+
+def main(max_shards=8, queries=20, events=20000, work_ms=200, batch_ms=20):
+    print('%-8s %14s %16s' % ('shards', 'query ms', 'events/s'))
+    for shards in range(1, max_shards + 1):
+        latency = measure_queries(shards, queries, work_ms / 1000.0)
+        rate = measure_writes(shards, events, batch_ms / 1000.0)
+        print('%-8d %14.1f %16.1f' % (shards, latency * 1000, rate))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Peak traced memory (tracemalloc) of reading one object's events with
+get_events versus iter_events, from a large synthetic history held by a
+SkyStubServer. The stub runs in a child process so that encoding its
+response is not counted against the client.
+
+    python -m benchmarks.bench_stream_memory [events]
+"""
+import multiprocessing
+import sys
+import time
+import tracemalloc
+
+from sky import SkyClient
+from sky import resources
+from sky import timestamp
+from sky.stubserver import SkyStubServer
+
+
+BATCH_SIZE = 10000
+
+
+def serve(count, address):
+    """Run a stub holding ``count`` events for object 1, until killed"""
+    with SkyStubServer() as server:
+        with SkyClient(server.host, server.port) as client:
+            table = client.create_table(resources.Table(name='events'))
+            for name, data_type in (
+                ('action', 'factor'),
+                ('page', 'string'),
+                ('n', 'integer'),
+            ):
+                table.create_property(
+                    resources.Property(name=name, data_type=data_type)
+                )
+            client.create_events(table, (
+                (
+                    1,
+                    resources.Event(
+                        {'action': 'view', 'page': '/products/%d' % i, 'n': i},
+                        timestamp.from_micros(1392977423000203 + i)
+                    )
+                )
+                for i in range(count)
+            ), batch_size=BATCH_SIZE)
+        address.put((server.host, server.port))
+        server.thread.join()
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.time()
+    count = func()
+    elapsed = time.time() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main(count=200000):
+    table = resources.Table(name='events')
+    address = multiprocessing.Queue()
+    stub = multiprocessing.Process(target=serve, args=(count, address))
+    stub.daemon = True
+    stub.start()
+    try:
+        host, port = address.get()
+        with SkyClient(host, port) as client:
+            print('%d events' % count)
+            cases = (
+                ('get_events', lambda: len(client.get_events(table, 1))),
+                (
+                    'iter_events',
+                    lambda: sum(1 for _ in client.iter_events(table, 1))
+                ),
+            )
+            for name, func in cases:
+                n, elapsed, peak = measure(func)
+                print('%-12s %8d events %7.2fs peak %8.1f MB' % (
+                    name,
+                    n,
+                    elapsed,
+                    peak / 1e6
+                ))
+    finally:
+        stub.terminate()
+        stub.join()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks for sky.timestamp against the strptime/strftime codec it
+replaced.
+
+    python -m benchmarks.bench_timestamp [count]
+"""
+import sys
+import timeit
+
+from datetime import datetime, timedelta
+
+from sky import timestamp
+
+
+def strptime_loads(s):
+    return datetime.strptime(s, timestamp.TIMESTAMP_FORMAT).replace(
+        tzinfo=timestamp.UTC
+    )
+
+
+def strftime_dumps(dt):
+    if dt.tzinfo:
+        dt = dt.astimezone(timestamp.UTC)
+    return dt.strftime(timestamp.TIMESTAMP_FORMAT)
+
+
+def main(count=100000):
+    start = datetime(2014, 2, 21, tzinfo=timestamp.UTC)
+    datetimes = [start + timedelta(seconds=i, microseconds=i) for i in
+                 range(count)]
+    strings = [timestamp.dumps(dt) for dt in datetimes]
+    micros = [timestamp.to_micros(dt) for dt in datetimes]
+
+    cases = (
+        ('loads (strptime)', lambda: [strptime_loads(s) for s in strings]),
+        ('loads', lambda: [timestamp.loads(s) for s in strings]),
+        ('loads_many', lambda: timestamp.loads_many(strings)),
+        ('loads_micros_many', lambda: timestamp.loads_micros_many(strings)),
+        ('dumps (strftime)', lambda: [strftime_dumps(d) for d in datetimes]),
+        ('dumps', lambda: [timestamp.dumps(d) for d in datetimes]),
+        ('dumps_many', lambda: timestamp.dumps_many(datetimes)),
+        ('dumps_micros_many', lambda: timestamp.dumps_micros_many(micros)),
+    )
+    for name, func in cases:
+        elapsed = min(timeit.repeat(func, number=1, repeat=3))
+        print('%-20s %8.3f us/op' % (name, elapsed / count * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
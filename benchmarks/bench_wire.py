@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Bytes per event and encode throughput of bulk event bodies: NDJSON with
+each installed JSON codec against the compact sky.wire encoding.
+
+    python -m benchmarks.bench_wire [events]
+"""
+import sys
+import timeit
+
+from datetime import datetime, timedelta
+
+from sky import bulk
+from sky import codec
+from sky import resources
+from sky import wire
+
+
+PROPERTIES = [
+    resources.Property(1, 'action', False, 'factor'),
+    resources.Property(2, 'page', False, 'string'),
+    resources.Property(3, 'price', False, 'float'),
+    resources.Property(4, 'count', False, 'integer'),
+    resources.Property(5, 'logged_in', False, 'boolean'),
+]
+
+
+def make_events(count):
+    start = datetime(2014, 2, 21, 10, 10, 23, 203)
+    return [
+        (
+            'user-%d' % (i % 1000),
+            resources.Event(
+                {
+                    'action': 'view',
+                    'page': '/products/%d' % (i % 500),
+                    'price': i * 1.25,
+                    'count': i,
+                    'logged_in': i % 2 == 0,
+                },
+                start + timedelta(seconds=i)
+            )
+        )
+        for i in range(count)
+    ]
+
+
+def encoders():
+    for cls in codec.CODECS:
+        try:
+            instance = cls()
+        except ImportError:
+            continue
+        yield (
+            'ndjson/%s' % instance.name,
+            lambda o, e, c=instance: bulk.encode_event(c, o, e)
+        )
+    if wire.msgpack is None:
+        print('msgpack is not installed, skipping the compact encoding')
+    else:
+        yield 'msgpack', wire.EventEncoder(PROPERTIES).encode
+
+
+def main(count=100000):
+    events = make_events(count)
+    base = None
+    print('%-16s %10s %12s %8s' % ('encoding', 'bytes/ev', 'events/s', 'size'))
+    for name, encode in encoders():
+        size = sum(len(encode(o, e)) for o, e in events) / float(count)
+        elapsed = min(timeit.repeat(
+            lambda: [encode(o, e) for o, e in events],
+            number=1,
+            repeat=3
+        ))
+        base = base or size
+        print('%-16s %10.1f %12.0f %7.0f%%' % (
+            name,
+            size,
+            count / elapsed,
+            size / base * 100
+        ))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
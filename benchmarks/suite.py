@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+The client's hot paths timed as one suite, with results kept as JSON so
+runs can be compared against a baseline.
+
+    python -m benchmarks.suite                          # just report
+    python -m benchmarks.suite --save baseline.json     # record a baseline
+    python -m benchmarks.suite --compare baseline.json  # fail on regressions
+
+Each case reports the best of ``--repeat`` runs, in seconds per
+operation, after calibrating how many operations make a run last at
+least ``--min-time``. A case more than ``--threshold`` (10% by default)
+slower than its baseline is a regression, and the exit status is 1.
+Cases marked slow, such as decoding a million events, only run with
+``--full``. Baselines only mean something on the machine that made them.
+
+    make bench-baseline     # on the release branch
+    make bench              # on the change
+"""
+import argparse
+import contextlib
+import json
+import platform
+import sys
+import time
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sky import SkyClient, resources
+from sky import timestamp as ts
+from sky import wire
+from sky.analytics import LocalQuery
+from sky.codec import get_codec
+from sky.frame import EventFrame
+from sky.metrics import clock
+from sky.query import Query, Selection, funnel
+from sky.stubserver import SkyStubServer
+
+
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_REPEAT = 5
+DEFAULT_MIN_TIME = 0.2
+
+Case = namedtuple('Case', ('name', 'setup', 'ops', 'slow'))
+
+CASES = []
+
+
+def case(name, ops=1, slow=False):
+    """
+    Register a generator function that sets a case up, yields the function
+    to time (which does ``ops`` operations a call) and then cleans up
+    """
+    def register(func):
+        CASES.append(Case(name, contextlib.contextmanager(func), ops, slow))
+        return func
+    return register
+
+
+# FIXTURES
+
+START = datetime(2014, 2, 21, 10, 10, 23, 203, tzinfo=ts.UTC)
+
+
+def make_events(count):
+    return [
+        resources.Event(
+            {
+                'action': 'view',
+                'page': '/products/%d' % (i % 1000),
+                'price': i * 1.25,
+                'count': i,
+            },
+            START + timedelta(seconds=i)
+        )
+        for i in range(count)
+    ]
+
+
+class FakeResponse(object):
+
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession(object):
+
+    def __init__(self, content):
+        self.response = FakeResponse(content)
+
+    def get(self, url, **kwargs):
+        return self.response
+
+    def close(self):
+        pass
+
+
+class FakeClient(SkyClient):
+    """A client whose every GET answers ``content`` without any I/O"""
+
+    def __init__(self, content, **kwargs):
+        SkyClient.__init__(self, **kwargs)
+        self.content = content
+
+    def make_session(self):
+        return FakeSession(self.content)
+
+
+# CASES
+
+@case('timestamp.loads', ops=1000)
+def timestamp_loads():
+    strings = [
+        ts.dumps(START + timedelta(microseconds=i)) for i in range(1000)
+    ]
+    loads = ts.loads
+    yield lambda: [loads(s) for s in strings]
+
+
+@case('timestamp.dumps', ops=1000)
+def timestamp_dumps():
+    datetimes = [START + timedelta(microseconds=i) for i in range(1000)]
+    dumps = ts.dumps
+    yield lambda: [dumps(dt) for dt in datetimes]
+
+
+@case('Event.to_dict', ops=1000)
+def event_to_dict():
+    events = make_events(1000)
+    yield lambda: [event.to_dict() for event in events]
+
+
+@case('Event.from_dict', ops=1000)
+def event_from_dict():
+    objs = [event.to_dict() for event in make_events(1000)]
+    Event = resources.Event
+    yield lambda: [Event().from_dict(obj) for obj in objs]
+
+
+@case('SkyClient.send')
+def client_send():
+    client = FakeClient(b'{"count":1}', codec='json')
+    yield lambda: client.send('get', '/tables/bench/query')
+
+
+@case('Query.compile')
+def query_compile():
+    q = Query(funnel(
+        ["action == 'view'", "action == 'cart'", "action == 'buy'"],
+        selection=Selection().group_by('page').count()
+    ))
+    yield q.compile
+
+
+@case('query.dumps')
+def query_dumps():
+    codec = get_codec()
+    q = Query(funnel(
+        ["action == 'view'", "action == 'cart'", "action == 'buy'"],
+        selection=Selection().group_by('page').count()
+    )).to_dict()
+    yield lambda: codec.dumps(q, sort_keys=True)
+
+
+def get_events_case(count):
+    def setup():
+        codec = get_codec()
+        body = codec.dumps([event.to_dict() for event in make_events(count)])
+        client = FakeClient(body, codec=codec)
+        table = resources.Table(name='bench')
+        yield lambda: client.get_events(table, 'user')
+    return setup
+
+
+for _count, _name, _slow in (
+    (1000, '1k', False),
+    (100000, '100k', False),
+    (1000000, '1m', True),
+):
+    case('get_events.%s' % _name, ops=_count, slow=_slow)(
+        get_events_case(_count)
+    )
+
+
+if wire.msgpack is not None:
+    @case('wire.encode', ops=1000)
+    def wire_encode():
+        encoder = wire.EventEncoder([
+            resources.Property(1, 'action', False, 'factor'),
+            resources.Property(2, 'page', False, 'string'),
+            resources.Property(3, 'price', False, 'float'),
+            resources.Property(4, 'count', False, 'integer'),
+        ])
+        events = make_events(1000)
+        encode = encoder.encode
+        yield lambda: [encode('user', event) for event in events]
+
+
+@case('analytics.frame', ops=1000)
+def analytics_frame():
+    frame = EventFrame.from_events(make_events(1000), [
+        resources.Property(1, 'action', False, 'factor'),
+        resources.Property(2, 'page', False, 'string'),
+        resources.Property(3, 'price', False, 'float'),
+        resources.Property(4, 'count', False, 'integer'),
+    ])
+    local = LocalQuery(Query(
+        Selection().group_by('action').count().sum('price').max('count')
+    ))
+    yield lambda: local.state().add_frame(frame).result()
+
+
+@case('create_events.stub', ops=10000)
+def bulk_ingest():
+    with SkyStubServer() as server:
+        client = SkyClient(server.host, server.port, schema_cache=None)
+        table = client.create_table(resources.Table(name='bench'))
+        for name in ('action', 'page', 'price', 'count'):
+            table.create_property(resources.Property(name=name))
+        events = [('user-%d' % (i % 100), e) for i, e in enumerate(
+            make_events(10000)
+        )]
+
+        def ingest():
+            result = client.create_events(table, events)
+            assert not result.failed, result
+
+        yield ingest
+        client.close()
+
+
+# RUNNING AND COMPARING
+
+def timed(func, number):
+    start = clock()
+    for _ in range(number):
+        func()
+    return clock() - start
+
+
+def measure(func, repeat, min_time):
+    """Best seconds per call of ``func`` over ``repeat`` calibrated runs"""
+    number = 1
+    elapsed = timed(func, number)
+    while elapsed < min_time:
+        number *= max(2, min(10, int(min_time / max(elapsed, 1e-9)) + 1))
+        elapsed = timed(func, number)
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        best = min(best, timed(func, number) / number)
+    return best
+
+
+def run(cases, repeat=DEFAULT_REPEAT, min_time=DEFAULT_MIN_TIME, out=None):
+    results = {}
+    for bench in cases:
+        with bench.setup() as func:
+            per_call = measure(func, repeat, min_time)
+        seconds = per_call / bench.ops
+        results[bench.name] = {
+            'seconds': seconds,
+            'ops_per_sec': 1 / seconds if seconds else None,
+        }
+        if out is not None:
+            out.write('%-22s %12.3f us/op %14.0f ops/s\n' % (
+                bench.name,
+                seconds * 1e6,
+                results[bench.name]['ops_per_sec']
+            ))
+            out.flush()
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    (name, baseline seconds, current seconds, ratio, regressed) for every
+    case in both runs
+    """
+    rows = []
+    for name, result in sorted(current['results'].items()):
+        base = baseline['results'].get(name)
+        if base is None or not base['seconds']:
+            continue
+        ratio = result['seconds'] / base['seconds']
+        rows.append((
+            name,
+            base['seconds'],
+            result['seconds'],
+            ratio,
+            ratio > 1 + threshold
+        ))
+    return rows
+
+
+def report(rows, out):
+    out.write('\n%-22s %12s %12s %9s\n' % (
+        'case',
+        'baseline us',
+        'current us',
+        'change'
+    ))
+    for name, base, current, ratio, regressed in rows:
+        out.write('%-22s %12.3f %12.3f %+8.1f%%%s\n' % (
+            name,
+            base * 1e6,
+            current * 1e6,
+            (ratio - 1) * 100,
+            '  REGRESSION' if regressed else ''
+        ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare to')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help='slowdown counted as a regression, 0.1 meaning 10%%'
+    )
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME)
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help='include slow cases'
+    )
+    parser.add_argument(
+        '--filter',
+        default='',
+        help='only run cases whose name contains this'
+    )
+    args = parser.parse_args(argv)
+
+    cases = [
+        bench for bench in CASES
+        if (args.full or not bench.slow) and args.filter in bench.name
+    ]
+    current = run(cases, args.repeat, args.min_time, sys.stdout)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.compare:
+        try:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        except IOError:
+            sys.stdout.write(
+                '\nNo baseline at %s, make one with --save\n' % args.compare
+            )
+            return 0
+        rows = compare(current, baseline, args.threshold)
+        report(rows, sys.stdout)
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,11 +11,19 @@ setup(
     long_description=open('README.rst').read(),
     keywords="skydb, behavioral database",
     license='BSD',
-    packages=find_packages(exclude=['tests','sandbox']),
+    packages=find_packages(
+        exclude=['tests', 'tests.*', 'benchmarks', 'sandbox']
+    ),
+    python_requires='>=3.7',
     install_requires=[
         'requests',
         'pytz'
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'fast': ['orjson'],
+        'compact': ['msgpack'],
+    },
     # See http://pypi.python.org/pypi?%3Aaction=list_classifiers
     classifiers=[
         'Development Status :: 3 - Alpha',
@@ -24,10 +32,12 @@ setup(
         'License :: OSI Approved :: BSD License',
         'Operating System :: OS Independent',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: pypy',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ]
 )
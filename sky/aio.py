@@ -0,0 +1,545 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio client for Sky, built on aiohttp (``pip install sky[async]``).
+
+AsyncSkyClient mirrors SkyClient method for method, with every call being
+awaitable. It works with the same ``sky.resources`` objects, so a Table
+returned by either client delegates back to the client that produced it.
+"""
+import asyncio
+import itertools
+import time
+
+import aiohttp
+
+from collections import deque
+
+from . import bulk
+from . import codec as codecs
+from . import policy
+from . import resources
+from . import stream
+from . import timestamp as ts
+from .client import HTTP_METHODS, EventsResult, QueryResult
+from .query import CompiledQuery, Query
+
+
+class AsyncSkyClient(object):
+
+    def __init__(
+        self,
+        host='127.0.0.1',
+        port=8585,
+        use_ssl=False,
+        pool_maxsize=100,
+        pool_maxsize_per_host=0,
+        max_in_flight=100,
+        connect_timeout=policy.DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=policy.DEFAULT_READ_TIMEOUT,
+        codec=None
+    ):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.pool_maxsize = pool_maxsize
+        self.pool_maxsize_per_host = pool_maxsize_per_host
+        self.max_in_flight = max_in_flight
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.codec = codecs.get_codec(codec)
+        self.bulk_events = None
+        self._session = None
+        self._semaphore = None
+
+    # TABLE API
+
+    async def get_tables(self):
+        tables = []
+        response = await self.send('get', '/tables')
+        for data in response:
+            tables.append(resources.Table(client=self).from_dict(data))
+        return tables
+
+    async def get_table(self, name):
+        response = await self.send('get', '/tables/%s' % name)
+        return resources.Table(client=self).from_dict(response)
+
+    async def create_table(self, table):
+        response = await self.send('post', '/tables', table.to_dict())
+        table.client = self
+        return table.from_dict(response)
+
+    async def delete_table(self, table):
+        await self.send('delete', '/tables/%s' % table.name)
+        return None
+
+    # PROPERTIES API
+
+    async def get_properties(self, table):
+        properties = []
+        response = await self.send(
+            'get',
+            '/tables/%s/properties' % table.name
+        )
+        for data in response:
+            properties.append(resources.Property().from_dict(data))
+        return properties
+
+    async def get_property(self, table, name):
+        response = await self.send(
+            'get',
+            '/tables/%s/properties/%s' % (table.name, name)
+        )
+        return resources.Property().from_dict(response)
+
+    async def create_property(self, table, prop):
+        response = await self.send(
+            'post',
+            '/tables/%s/properties' % table.name,
+            prop.to_dict()
+        )
+        return prop.from_dict(response)
+
+    async def update_property(self, table, property_name, prop):
+        response = await self.send(
+            'patch',
+            '/tables/%s/properties/%s' % (table.name, property_name),
+            prop.to_dict()
+        )
+        return prop.from_dict(response)
+
+    async def delete_property(self, table, prop):
+        await self.send(
+            'delete',
+            '/tables/%s/properties/%s' % (table.name, prop.name)
+        )
+        return None
+
+    # EVENT API
+
+    async def get_events(self, table, object_id):
+        events = []
+        response = await self.send(
+            'get',
+            '/tables/%s/objects/%s/events' % (table.name, object_id)
+        )
+        for data in response:
+            events.append(resources.Event.from_dict_fast(data))
+        return events
+
+    async def get_events_many(
+        self,
+        table,
+        object_ids,
+        concurrency=None,
+        ordered=True
+    ):
+        """
+        Async generator counterpart of SkyClient.get_events_many, bounded
+        by ``concurrency`` on top of the client wide max_in_flight.
+        """
+        concurrency = concurrency or self.max_in_flight
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(item):
+            index, object_id = item
+            async with semaphore:
+                start = time.time()
+                try:
+                    events = await self.get_events(table, object_id)
+                    error = None
+                except (
+                    aiohttp.ClientError,
+                    asyncio.TimeoutError,
+                    ValueError
+                ) as e:
+                    events, error = None, e
+                return EventsResult(
+                    index,
+                    object_id,
+                    events,
+                    error,
+                    time.time() - start
+                )
+
+        imap = _imap_bounded if ordered else _imap_unordered_bounded
+        async for result in imap(
+            run,
+            enumerate(object_ids),
+            concurrency * 2
+        ):
+            yield result
+
+    async def iter_events(
+        self,
+        table,
+        object_id,
+        chunk_size=stream.DEFAULT_CHUNK_SIZE,
+        max_buffer=stream.DEFAULT_MAX_BUFFER
+    ):
+        session = self.get_session()
+        url = self.make_url(
+            '/tables/%s/objects/%s/events' % (table.name, object_id)
+        )
+        decoder = stream.JSONArrayDecoder(max_buffer)
+        # A slot is held for the request and for each chunk read, but not
+        # while the caller has an event, so slow consumers don't starve
+        # other requests of max_in_flight
+        async with self._semaphore:
+            response = await session.request(
+                'get',
+                url,
+                data=None,
+                headers={'content-type': 'application/json'}
+            )
+        async with response:
+            response.raise_for_status()
+            chunks = response.content.iter_chunked(chunk_size).__aiter__()
+            while True:
+                async with self._semaphore:
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        break
+                for data in decoder.feed(chunk):
+                    yield resources.Event.from_dict_fast(data)
+        for data in decoder.close():
+            yield resources.Event.from_dict_fast(data)
+
+    async def get_event(self, table, object_id, timestamp):
+        timestamp = ts.dumps(timestamp)
+        response = await self.send(
+            'get',
+            '/tables/%s/objects/%s/events/%s' % (
+                table.name,
+                object_id,
+                timestamp
+            )
+        )
+        return resources.Event.from_dict_fast(response)
+
+    async def create_event(self, table, object_id, event, replace=True):
+        method = 'patch'
+        if replace:
+            method = 'put'
+        timestamp = ts.dumps(event.timestamp)
+        response = await self.send(
+            method,
+            '/tables/%s/objects/%s/events/%s' % (
+                table.name,
+                object_id,
+                timestamp
+            ),
+            event.to_dict()
+        )
+        return resources.Event.from_dict_fast(response)
+
+    async def create_events(
+        self,
+        table,
+        events,
+        replace=True,
+        batch_size=bulk.DEFAULT_BATCH_SIZE,
+        batch_bytes=bulk.DEFAULT_BATCH_BYTES
+    ):
+        method = 'patch'
+        if replace:
+            method = 'put'
+        result = bulk.BulkResult()
+        source = enumerate(events)
+        pending = []
+        while self.bulk_events is not False:
+            batch = bulk.Batch(
+                source,
+                result,
+                batch_size,
+                batch_bytes,
+                self.codec
+            )
+            body = batch.stream()
+            if body is None:
+                return result
+            try:
+                await self.send(
+                    method,
+                    '/tables/%s/events' % table.name,
+                    body=_aiter(body),
+                    content_type=bulk.NDJSON_CONTENT_TYPE
+                )
+            except aiohttp.ClientResponseError as e:
+                if (
+                    self.bulk_events is None and
+                    e.status in bulk.UNSUPPORTED_STATUS_CODES and
+                    (e.status != 404 or await self._table_exists(table))
+                ):
+                    self.bulk_events = False
+                    pending = batch.items
+                    break
+                result.add_batch_failure(batch.items, e)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                result.add_batch_failure(batch.items, e)
+            else:
+                self.bulk_events = True
+                result.written += len(batch.items)
+
+        async def create(item):
+            index, (object_id, event) = item
+            try:
+                await self.create_event(table, object_id, event, replace)
+            except (
+                aiohttp.ClientError,
+                asyncio.TimeoutError,
+                TypeError,
+                ValueError
+            ) as e:
+                result.add_failure(index, object_id, event, e)
+            else:
+                result.written += 1
+
+        # send() bounds the number in flight, gathering per window keeps
+        # the number of waiting coroutines bounded too
+        window = []
+        for item in itertools.chain(pending, source):
+            window.append(create(item))
+            if len(window) >= self.max_in_flight * 2:
+                await asyncio.gather(*window)
+                window = []
+        await asyncio.gather(*window)
+        return result
+
+    async def _table_exists(self, table):
+        """
+        Whether ``table`` exists, telling a 404 for a missing table from
+        one for a missing endpoint; False if the server cannot say
+        """
+        try:
+            await self.send('get', '/tables/%s' % table.name)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+        return True
+
+    async def delete_event(self, table, object_id, event):
+        timestamp = ts.dumps(event.timestamp)
+        await self.send(
+            'delete',
+            '/tables/%s/objects/%s/events/%s' % (
+                table.name,
+                object_id,
+                timestamp
+            ),
+        )
+        return None
+
+    # QUERY API
+
+    async def query(self, table, q):
+        path = '/tables/%s/query' % table.name
+        if isinstance(q, Query):
+            q = q.compile()
+        if isinstance(q, CompiledQuery):
+            return await self.send('get', path, body=q.body)
+        if isinstance(q, list):
+            q = {'steps': q}
+        return await self.send('get', path, q)
+
+    async def query_many(self, queries, concurrency=None, ordered=True):
+        """
+        Async generator counterpart of SkyClient.query_many, bounded by
+        ``concurrency`` on top of the client wide max_in_flight.
+        """
+        concurrency = concurrency or self.max_in_flight
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(item):
+            index, (table, q) = item
+            async with semaphore:
+                start = time.time()
+                try:
+                    result, error = await self.query(table, q), None
+                except (
+                    aiohttp.ClientError,
+                    asyncio.TimeoutError,
+                    ValueError
+                ) as e:
+                    result, error = None, e
+                return QueryResult(
+                    index,
+                    table,
+                    q,
+                    result,
+                    error,
+                    time.time() - start
+                )
+
+        imap = _imap_bounded if ordered else _imap_unordered_bounded
+        async for result in imap(
+            run,
+            enumerate(queries),
+            concurrency * 2
+        ):
+            yield result
+
+    # UTILITY API
+
+    async def ping(self, timeout=policy.PING_TIMEOUT):
+        try:
+            await self.send('get', '/ping', timeout=timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+        except ValueError:
+            # Answered, if not with JSON
+            pass
+        return True
+
+    # CONNECTION MANAGEMENT
+
+    def get_session(self):
+        # The session and semaphore bind to the running loop, so they are
+        # created on first use rather than in __init__
+        if self._session is None or self._session.closed:
+            self._session = self.make_session()
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._session
+
+    def make_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_maxsize,
+            limit_per_host=self.pool_maxsize_per_host,
+            ssl=False if self.use_ssl else None
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            # Like requests, the read timeout bounds each wait for data
+            # rather than the whole response, so long streams still finish
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=self.connect_timeout,
+                sock_read=self.read_timeout
+            )
+        )
+
+    async def close(self):
+        session, self._session = self._session, None
+        if session is not None:
+            await session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    # HTTP METHODS
+
+    async def send(
+        self,
+        method,
+        path,
+        data=None,
+        body=None,
+        content_type='application/json',
+        timeout=None
+    ):
+        """
+        ``timeout``, a (connect, read) pair in seconds, overrides the
+        client's timeouts for this request
+        """
+        if method not in HTTP_METHODS:
+            raise ValueError("%s is not a recognised http method" % method)
+        session = self.get_session()
+
+        headers = {'content-type': content_type}
+        url = self.make_url(path)
+
+        if body is not None:
+            data = body
+        elif data:
+            data = self.codec.dumps(data)
+
+        kwargs = {}
+        if timeout is not None:
+            connect, read = timeout
+            kwargs['timeout'] = aiohttp.ClientTimeout(
+                total=connect + read,
+                sock_connect=connect,
+                sock_read=read
+            )
+
+        # Both context managers unwind on cancellation and on timeout, so
+        # the semaphore slot and pooled connection are always given back
+        async with self._semaphore:
+            async with session.request(
+                method,
+                url,
+                data=data,
+                headers=headers,
+                **kwargs
+            ) as response:
+                response.raise_for_status()
+                content = await response.read()
+        return self.decode_response(content)
+
+    def decode_response(self, content):
+        if not content:
+            return None
+        return self.codec.loads(content)
+
+    def make_url(self, path):
+        protocol = "http"
+        if self.use_ssl:
+            protocol = 'https'
+        return "%s://%s:%d%s" % (
+            protocol,
+            self.host,
+            self.port,
+            path
+        )
+
+
+async def _aiter(iterable):
+    for item in iterable:
+        yield item
+
+
+async def _imap_bounded(func, iterable, window):
+    """
+    Async counterpart of sky.pool.imap_bounded: await ``func(item)`` for
+    each item, yielding results in input order with at most ``window``
+    tasks started and not yet yielded.
+    """
+    pending = deque()
+    try:
+        for item in iterable:
+            pending.append(asyncio.ensure_future(func(item)))
+            if len(pending) >= window:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _imap_unordered_bounded(func, iterable, window):
+    """As _imap_bounded, yielding each result as soon as it completes"""
+    pending = set()
+    try:
+        for item in iterable:
+            pending.add(asyncio.ensure_future(func(item)))
+            if len(pending) >= window:
+                done, pending = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,709 @@
+# -*- coding: utf-8 -*-
+"""
+Local evaluation of Sky queries over events already fetched.
+
+LocalQuery runs the steps SkyClient.query sends (see sky.query) against
+events in memory and gives results shaped as the server's:
+
+    local = LocalQuery(q)
+    state = local.state()
+    for result in client.get_events_many(table, object_ids):
+        state.add_events(result.events)
+    state.result()
+
+As on the server every event of an object is a starting point for the top
+level steps, and a condition moves the steps nested in it to the first
+event matching within its window. Queries with conditions therefore need
+all of an object's events, in timestamp order, in one add_events or
+add_frame call; queries made only of selections take events in batches
+of any size. Session idle time is ignored.
+
+Selections group by their dimensions and aggregate with these fields:
+
+================  =====================================================
+count()           events
+sum(p)            total of p
+min(p), max(p)    smallest and largest p
+distinct(p)       number of distinct values of p
+histogram(p)      events per value of p
+histogram(p, w)   events per bucket of width w, keyed by its lower bound
+================  =====================================================
+
+distinct and histogram are only evaluated locally. Every field keeps a
+partial state until result() is called, so states built per page, per
+object or per shard merge into one exactly, distinct counts included,
+which sky.shard.merge_results cannot do with finished results.
+
+add_frame aggregates an EventFrame a column at a time, grouping on factor
+codes rather than labels, instead of event by event.
+"""
+import abc
+import ast
+import json
+import operator
+import re
+import sys
+
+from collections import Counter
+from functools import partial
+from itertools import compress, repeat
+from operator import eq, is_not
+
+from . import timestamp as ts
+from .frame import EventFrame
+from .query import QueryError
+from .resources import Event, Property
+
+
+# EXPRESSIONS
+
+# Quoted strings are matched first so operators inside them are left alone
+_OPERATOR_RE = re.compile(
+    r'''('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")|(&&|\|\||!(?!=)|\btrue\b|'''
+    r'''\bfalse\b)'''
+)
+_OPERATORS = {
+    '&&': ' and ',
+    '||': ' or ',
+    '!': ' not ',
+    'true': 'True',
+    'false': 'False',
+}
+
+_ALLOWED_NODES = (
+    ast.Expression,
+    ast.BoolOp,
+    ast.And,
+    ast.Or,
+    ast.UnaryOp,
+    ast.Not,
+    ast.USub,
+    ast.UAdd,
+    ast.BinOp,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Mod,
+    ast.Compare,
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+    ast.Name,
+    ast.Load,
+    ast.Constant,
+)
+if sys.version_info < (3, 8):
+    # Literals only parse as Constant from Python 3.8
+    _ALLOWED_NODES += (ast.Num, ast.Str, ast.NameConstant)
+
+
+class _Data(dict):
+    """Event data as expression variables, missing properties being None"""
+
+    def __missing__(self, key):
+        return None
+
+
+_expressions = {}
+
+
+def compile_expression(expression):
+    """Compile a Sky expression to Python code, caching the result"""
+    code = _expressions.get(expression)
+    if code is None:
+        source = _OPERATOR_RE.sub(
+            lambda m: m.group(1) or _OPERATORS[m.group(2)],
+            expression
+        )
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError:
+            raise QueryError('Invalid expression: %s' % expression)
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise QueryError('Unsupported expression: %s' % expression)
+        code = _expressions[expression] = compile(tree, '<query>', 'eval')
+    return code
+
+
+def matches(code, data):
+    try:
+        return bool(eval(code, {'__builtins__': {}}, _Data(data)))
+    except (TypeError, ZeroDivisionError):
+        # Comparing a missing (None) property, say
+        return False
+
+
+def group_key(value):
+    """A group by value as a JSON object key"""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+# AGGREGATES
+
+class Aggregate(abc.ABC):
+    """
+    A selection field. Its partial state starts as empty(), update() folds
+    a batch of values into it, merge() combines two and finish() turns one
+    into the result value (None leaving the field out).
+    """
+
+    def __init__(self, name, prop, argument=None):
+        self.name = name
+        self.prop = prop
+        self.argument = argument
+
+    def empty(self):
+        return None
+
+    @abc.abstractmethod
+    def update(self, state, values, size):
+        """
+        Fold in the ``size`` events of a batch, ``values`` iterating over
+        those of them that have the property
+        """
+
+    @abc.abstractmethod
+    def merge(self, left, right):
+        """Combine two states; ``left`` may be modified, ``right`` not"""
+
+    def finish(self, state):
+        return state
+
+
+class Count(Aggregate):
+
+    def __init__(self, name, prop, argument=None):
+        # The server counts events whatever is in the parentheses
+        super(Count, self).__init__(name, None)
+
+    def empty(self):
+        return 0
+
+    def update(self, state, values, size):
+        return state + size
+
+    def merge(self, left, right):
+        return left + right
+
+
+class _Fold(Aggregate):
+
+    reduce = None
+    combine = None
+
+    def update(self, state, values, size):
+        values = list(values)
+        if not values:
+            return state
+        return self.merge(state, self.reduce(values))
+
+    def merge(self, left, right):
+        if left is None:
+            return right
+        if right is None:
+            return left
+        return self.combine(left, right)
+
+
+class Sum(_Fold):
+    reduce = sum
+    combine = operator.add
+
+
+class Min(_Fold):
+    reduce = min
+    combine = min
+
+
+class Max(_Fold):
+    reduce = max
+    combine = max
+
+
+class Distinct(Aggregate):
+
+    def empty(self):
+        return set()
+
+    def update(self, state, values, size):
+        state.update(values)
+        return state
+
+    def merge(self, left, right):
+        left |= right
+        return left
+
+    def finish(self, state):
+        return len(state)
+
+
+class Histogram(Aggregate):
+
+    def __init__(self, name, prop, argument=None):
+        if argument is not None and (
+            isinstance(argument, bool) or
+            not isinstance(argument, (int, float)) or
+            argument <= 0
+        ):
+            raise QueryError('Invalid histogram width: %r' % argument)
+        super(Histogram, self).__init__(name, prop, argument)
+
+    def empty(self):
+        return Counter()
+
+    def update(self, state, values, size):
+        width = self.argument
+        if width is not None:
+            values = (value // width * width for value in values)
+        state.update(values)
+        return state
+
+    def merge(self, left, right):
+        left.update(right)
+        return left
+
+    def finish(self, state):
+        return dict(
+            (group_key(value), count) for value, count in state.items()
+        )
+
+
+AGGREGATES = {
+    'count': Count,
+    'sum': Sum,
+    'min': Min,
+    'max': Max,
+    'distinct': Distinct,
+    'histogram': Histogram,
+}
+
+_FIELD_RE = re.compile(
+    r'^\s*(\w+)\(\s*(\w*)\s*(?:,\s*([-+0-9.eE]+)\s*)?\)\s*$'
+)
+
+
+def make_aggregate(field):
+    """The Aggregate for a selection field dict"""
+    expression = field.get('expression', '')
+    match = _FIELD_RE.match(expression)
+    if match is None or match.group(1) not in AGGREGATES:
+        raise QueryError('Unsupported field: %s' % expression)
+    func, prop, argument = match.groups()
+    if func != 'count' and not prop:
+        raise QueryError('%s needs a property: %s' % (func, expression))
+    if argument is not None:
+        try:
+            argument = json.loads(argument)
+        except ValueError:
+            raise QueryError('Invalid argument: %s' % expression)
+    return AGGREGATES[func](field.get('name') or func, prop, argument)
+
+
+# STEPS
+
+class _Selection(object):
+
+    def __init__(self, index, step):
+        self.index = index
+        self.name = step.get('name')
+        self.dimensions = tuple(step.get('dimensions') or ())
+        self.fields = [make_aggregate(f) for f in step.get('fields') or []]
+
+    def empty(self):
+        return [field.empty() for field in self.fields]
+
+
+class _Condition(object):
+
+    def __init__(self, step, steps):
+        self.expression = step.get('expression', 'true')
+        # Compiled to check it; the code is looked up again when run so
+        # a LocalQuery stays picklable
+        compile_expression(self.expression)
+        self.low, self.high = step.get('within') or (0, 0)
+        self.seconds = step.get('withinUnits', 'steps') == 'seconds'
+        self.steps = steps
+
+    def find(self, rows, position):
+        """Index of the first row matching within the window, or None"""
+        code = compile_expression(self.expression)
+        if self.seconds:
+            origin = rows[position][0]
+            low = origin + self.low * 1000000
+            high = origin + self.high * 1000000
+            for index in range(position, len(rows)):
+                micros, data = rows[index]
+                if micros > high:
+                    break
+                if micros >= low and matches(code, data):
+                    return index
+        else:
+            for index in range(
+                max(0, position + self.low),
+                min(len(rows), position + self.high + 1)
+            ):
+                if matches(code, rows[index][1]):
+                    return index
+        return None
+
+
+def query_dict(q):
+    """A query as a dict, from a dict, a list of steps or a query object"""
+    if isinstance(q, list):
+        return {'steps': q}
+    if isinstance(q, dict):
+        return q
+    return q.to_dict()
+
+
+class LocalQuery(object):
+
+    def __init__(self, q):
+        self.definition = query_dict(q)
+        self.selections = []
+        self.steps = self._compile(self.definition.get('steps') or [])
+        self.has_conditions = any(
+            isinstance(step, _Condition) for step in self.steps
+        )
+
+    def _compile(self, steps):
+        compiled = []
+        for step in steps:
+            kind = step.get('type')
+            if kind == 'selection':
+                selection = _Selection(len(self.selections), step)
+                self.selections.append(selection)
+                compiled.append(selection)
+            elif kind == 'condition':
+                compiled.append(
+                    _Condition(step, self._compile(step.get('steps') or []))
+                )
+            else:
+                raise QueryError('Unsupported step type: %s' % kind)
+        return compiled
+
+    def run_steps(self, steps, rows, position, hits):
+        """
+        Run ``steps`` from ``rows[position]``, adding the data of each
+        event a selection is reached at to ``hits[selection.index]``
+        """
+        for step in steps:
+            if isinstance(step, _Selection):
+                hits[step.index].append(rows[position][1])
+            else:
+                index = step.find(rows, position)
+                if index is not None:
+                    self.run_steps(step.steps, rows, index, hits)
+
+    def state(self):
+        return QueryState(self)
+
+    def run(self, objects):
+        """The result over ``objects``, each an object's events or frame"""
+        state = self.state()
+        for events in objects:
+            state.add(events)
+        return state.result()
+
+
+# STATE
+
+def event_row(event):
+    """(epoch micros, data) for an Event, event dict or such a pair"""
+    if isinstance(event, Event):
+        if event._timestamp is None:
+            return ts.loads_micros(event._raw_timestamp), event.data
+        return ts.to_micros(event._timestamp), event.data
+    if isinstance(event, dict):
+        return ts.loads_micros(event['timestamp']), event.get('data') or {}
+    return event
+
+
+def event_data(event):
+    if isinstance(event, Event):
+        return event.data
+    if isinstance(event, dict):
+        return event.get('data') or {}
+    return event[1]
+
+
+def frame_rows(frame):
+    """(epoch micros, data) for each event of a frame, in order"""
+    columns = [frame.column(name) for name in frame.columns]
+    rows = []
+    for index, micros in enumerate(frame.timestamps):
+        data = {}
+        for column in columns:
+            value = column[index]
+            if value is not None:
+                data[column.name] = value
+        rows.append((micros, data))
+    return rows
+
+
+def _frame_column(frame, name):
+    try:
+        return frame.column(name)
+    except KeyError:
+        return None
+
+
+# Up to this many groups, each is picked out with a C level scan over the
+# keys; past it, with lists of positions built in one Python level pass
+SCAN_GROUPS = 32
+
+_present = partial(is_not, None)
+
+
+def groups(dimensions):
+    """
+    (key, size, select) for each distinct key, given one sequence of
+    values per dimension, where ``select(items)`` picks out the items at
+    that key's positions from a sequence aligned with the values
+    """
+    if len(dimensions) == 1:
+        # Grouped on the values themselves, saving a tuple per event
+        keys = dimensions[0]
+    else:
+        keys = list(zip(*dimensions))
+    distinct = set(keys)
+    if len(distinct) <= SCAN_GROUPS:
+        for key in distinct:
+            selector = bytes(map(eq, keys, repeat(key)))
+            yield (
+                key if len(dimensions) > 1 else (key,),
+                selector.count(1),
+                lambda items, selector=selector: compress(items, selector)
+            )
+        return
+    positions = {}
+    for index, key in enumerate(keys):
+        rows = positions.get(key)
+        if rows is None:
+            rows = positions[key] = []
+        rows.append(index)
+    for key, rows in positions.items():
+        yield (
+            key if len(dimensions) > 1 else (key,),
+            len(rows),
+            lambda items, rows=rows: map(items.__getitem__, rows)
+        )
+
+
+def _decode(column):
+    if column.labels is not None:
+        return column.labels.__getitem__
+    if column.data_type == Property.DATA_TYPE_BOOLEAN:
+        return bool
+    return None
+
+
+def _column_values(column, complete, select=None):
+    """
+    Values of ``column`` that are present, all or as ``select`` picks;
+    ``complete`` says none are missing, so the mask can be skipped
+    """
+    present = column.values
+    if select is not None:
+        present = select(present)
+    if not complete:
+        mask = column.mask
+        present = compress(present, mask if select is None else select(mask))
+    decode = _decode(column)
+    if decode is not None:
+        return map(decode, present)
+    return present
+
+
+def _dimension_keys(column, size):
+    """Stored values of a dimension column, None where missing"""
+    if column is None:
+        return [None] * size
+    values = column.values
+    mask = column.mask
+    if all(mask):
+        return values
+    return [value if present else None for value, present in zip(
+        values,
+        mask
+    )]
+
+
+class QueryState(object):
+    """
+    Partial results of a LocalQuery: the field states of every group each
+    selection has reached, by (selection index, dimension values)
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.groups = {}
+
+    def _update(self, selection, key, size, values):
+        states = self.groups.get((selection.index, key))
+        if states is None:
+            states = self.groups[(selection.index, key)] = selection.empty()
+        for index, field in enumerate(selection.fields):
+            states[index] = field.update(
+                states[index],
+                None if field.prop is None else values(field.prop),
+                size
+            )
+
+    def _select(self, selection, datas):
+        if not selection.dimensions:
+            self._update(
+                selection,
+                (),
+                len(datas),
+                lambda prop: filter(
+                    _present,
+                    map(dict.get, datas, repeat(prop))
+                )
+            )
+            return
+        keys = [
+            list(map(dict.get, datas, repeat(name)))
+            for name in selection.dimensions
+        ]
+        for key, size, select in groups(keys):
+            self._update(
+                selection,
+                key,
+                size,
+                lambda prop, select=select: filter(
+                    _present,
+                    map(dict.get, select(datas), repeat(prop))
+                )
+            )
+
+    def _select_frame(self, selection, frame):
+        size = len(frame)
+        if not size:
+            return
+        columns = {}
+        for field in selection.fields:
+            if field.prop is not None and field.prop not in columns:
+                column = _frame_column(frame, field.prop)
+                if column is not None:
+                    columns[field.prop] = (column, all(column.mask))
+
+        def values(prop, select=None):
+            if prop not in columns:
+                return ()
+            column, complete = columns[prop]
+            return _column_values(column, complete, select)
+
+        if not selection.dimensions:
+            self._update(selection, (), size, values)
+            return
+        # Factors are grouped by code and only the distinct keys decoded
+        dimensions = [
+            _frame_column(frame, name) for name in selection.dimensions
+        ]
+        keys = [_dimension_keys(column, size) for column in dimensions]
+        decoders = [
+            None if column is None else _decode(column)
+            for column in dimensions
+        ]
+        for key, count, select in groups(keys):
+            key = tuple(
+                value if value is None or decode is None else decode(value)
+                for value, decode in zip(key, decoders)
+            )
+            self._update(
+                selection,
+                key,
+                count,
+                lambda prop, select=select: values(prop, select)
+            )
+
+    def add_events(self, events):
+        """
+        Add events, as Events, event dicts or (epoch micros, data) pairs.
+        With conditions in the query they must be all of one object's
+        events in timestamp order.
+        """
+        query = self.query
+        if not query.has_conditions:
+            datas = [event_data(event) for event in events]
+            for selection in query.selections:
+                self._select(selection, datas)
+            return self
+        return self._add_rows([event_row(event) for event in events])
+
+    def _add_rows(self, rows):
+        query = self.query
+        hits = [[] for _ in query.selections]
+        for position in range(len(rows)):
+            query.run_steps(query.steps, rows, position, hits)
+        for selection, datas in zip(query.selections, hits):
+            if datas:
+                self._select(selection, datas)
+        return self
+
+    def add_frame(self, frame):
+        """
+        Add an EventFrame, column by column when the query has no
+        conditions, and as one object's events otherwise
+        """
+        if self.query.has_conditions:
+            return self._add_rows(frame_rows(frame))
+        for selection in self.query.selections:
+            self._select_frame(selection, frame)
+        return self
+
+    def add(self, events):
+        if isinstance(events, EventFrame):
+            return self.add_frame(events)
+        return self.add_events(events)
+
+    def merge(self, other):
+        """Fold in the state of another run of the same query"""
+        if other.query.definition != self.query.definition:
+            raise QueryError('Cannot merge states of different queries')
+        selections = self.query.selections
+        for key, states in other.groups.items():
+            fields = selections[key[0]].fields
+            mine = self.groups.get(key)
+            if mine is None:
+                mine = self.groups[key] = selections[key[0]].empty()
+            for index, field in enumerate(fields):
+                mine[index] = field.merge(mine[index], states[index])
+        return self
+
+    def result(self):
+        result = {}
+        selections = self.query.selections
+        for (index, key), states in self.groups.items():
+            selection = selections[index]
+            target = result
+            if selection.name:
+                target = target.setdefault(selection.name, {})
+            for dimension, value in zip(selection.dimensions, key):
+                target = target.setdefault(dimension, {}).setdefault(
+                    group_key(value),
+                    {}
+                )
+            for field, state in zip(selection.fields, states):
+                value = field.finish(state)
+                if value is not None:
+                    target[field.name] = value
+        return result
+
+
+def merge_states(states):
+    """Merge QueryStates of one query into a new one"""
+    merged = None
+    for state in states:
+        if merged is None:
+            merged = QueryState(state.query)
+        merged.merge(state)
+    return merged
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_BATCH_BYTES = 1024 * 1024
+DEFAULT_CONCURRENCY = 8
+
+# Responses meaning the server has no bulk event endpoint, or for 404 that
+# the table does not exist
+UNSUPPORTED_STATUS_CODES = (404, 405, 501)
+
+
+Failure = namedtuple('Failure', ('index', 'object_id', 'event', 'error'))
+
+
+class BulkResult(object):
+
+    def __init__(self):
+        self.written = 0
+        self.failures = []
+
+    @property
+    def failed(self):
+        return len(self.failures)
+
+    def add_failure(self, index, object_id, event, error):
+        self.failures.append(Failure(index, object_id, event, error))
+
+    def add_batch_failure(self, items, error):
+        for index, (object_id, event) in items:
+            self.add_failure(index, object_id, event, error)
+
+    def __repr__(self):
+        return '<BulkResult written=%d failed=%d>' % (
+            self.written,
+            self.failed
+        )
+
+
+def encode_event(codec, object_id, event):
+    obj = event.to_dict()
+    obj['id'] = object_id
+    return codec.dumps(obj) + b'\n'
+
+
+class Batch(object):
+    """
+    A count and size bounded run of events pulled lazily from a shared
+    ``(index, (object_id, event))`` iterator and streamed as newline
+    delimited JSON. Only references to the events are kept, so failed
+    batches can be reported or replayed without holding the encoded body.
+    """
+
+    def __init__(
+        self,
+        source,
+        result,
+        max_count,
+        max_bytes,
+        codec,
+        encode=None
+    ):
+        self.source = source
+        self.result = result
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.codec = codec
+        # Optionally (object_id, event) -> bytes in place of NDJSON lines,
+        # such as sky.wire.EventEncoder.encode
+        self.encode = encode
+        self.items = []
+
+    def lines(self):
+        size = 0
+        encode = self.encode
+        for index, (object_id, event) in self.source:
+            try:
+                if encode is None:
+                    line = encode_event(self.codec, object_id, event)
+                else:
+                    line = encode(object_id, event)
+            except (TypeError, ValueError) as e:
+                self.result.add_failure(index, object_id, event, e)
+                continue
+            self.items.append((index, (object_id, event)))
+            yield line
+            size += len(line)
+            if len(self.items) >= self.max_count or size >= self.max_bytes:
+                return
+
+    def stream(self):
+        """
+        Return an iterator over the encoded batch body, or None when the
+        source has no more encodable events.
+        """
+        lines = self.lines()
+        for first in lines:
+            return _prepend(first, lines)
+        return None
+
+
+def _prepend(first, rest):
+    yield first
+    for item in rest:
+        yield item
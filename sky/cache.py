@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+
+from collections import OrderedDict
+
+
+DEFAULT_MAXSIZE = 256
+DEFAULT_TTL = 30
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def json_size(value):
+    return len(json.dumps(value))
+
+
+class _Call(object):
+    """A load in progress that concurrent callers for the same key share"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def set_result(self, result):
+        self.result = result
+        self.event.set()
+
+    def set_error(self, error):
+        self.error = error
+        self.event.set()
+
+
+class QueryCache(object):
+    """
+    Thread safe LRU + TTL cache for query results, keyed on
+    ``(host, port, table, canonical query json)``.
+
+    Concurrent misses for the same key are coalesced into a single load.
+    Cached results are shared between callers and must be treated as read
+    only.
+    """
+
+    def __init__(
+        self,
+        maxsize=DEFAULT_MAXSIZE,
+        ttl=DEFAULT_TTL,
+        max_bytes=DEFAULT_MAX_BYTES,
+        sizeof=json_size,
+        clock=time.time
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+        self._calls = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_load(self, key, load):
+        with self._lock:
+            generation = self._generations.get(key[:3], 0)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, size, entry_generation, value = entry
+                if entry_generation != generation:
+                    self._remove(key)
+                elif expires > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                else:
+                    self._remove(key)
+                    self.expirations += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                call = self._calls[key] = _Call()
+                leader = True
+        if not leader:
+            return call.wait()
+        return self._load(key, load, call, generation)
+
+    def _load(self, key, load, call, generation):
+        try:
+            value = load()
+        except Exception as e:
+            with self._lock:
+                del self._calls[key]
+            call.set_error(e)
+            raise
+        size = self.sizeof(value)
+        with self._lock:
+            del self._calls[key]
+            # Skip storing results that an invalidation raced with
+            if self._generations.get(key[:3], 0) == generation:
+                self._store(key, value, size, generation)
+        call.set_result(value)
+        return value
+
+    def _store(self, key, value, size, generation):
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (
+            self.clock() + self.ttl,
+            size,
+            generation,
+            value
+        )
+        self.size_bytes += size
+        while len(self._entries) > self.maxsize or (
+            self.max_bytes is not None and self.size_bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        expires, size, generation, value = self._entries.pop(key)
+        self.size_bytes -= size
+
+    def invalidate(self, host, port, table_name):
+        """
+        Bump the table's generation, dropping its cached results lazily
+        and discarding any load already in flight. This is O(1) so it is
+        cheap enough to call on every write.
+        """
+        prefix = (host, port, table_name)
+        with self._lock:
+            self._generations[prefix] = self._generations.get(prefix, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'entries': len(self._entries),
+                'size_bytes': self.size_bytes,
+            }
+
+
+DEFAULT_SCHEMA_TTL = 300
+
+
+class SchemaCache(object):
+    """
+    TTL cache of table and property metadata for a client. Entries are
+    keyed ``('tables',)``, ``('table', table)``, ``('properties', table)``
+    and ``('property', table, name)``; the client keeps it coherent with
+    its own schema changes, refresh covers changes made elsewhere.
+    """
+
+    def __init__(self, ttl=DEFAULT_SCHEMA_TTL, clock=time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > self.clock():
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self, table_name=None):
+        with self._lock:
+            if table_name is None:
+                self._entries.clear()
+                return
+            self._entries.pop(('tables',), None)
+            for key in [k for k in self._entries if k[1:2] == (table_name,)]:
+                del self._entries[key]
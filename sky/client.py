@@ -1,59 +1,220 @@
 # -*- coding: utf-8 -*-
 import requests
-import json
+import itertools
+import threading
+import time
 
+from collections import namedtuple
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlencode
+
+from . import bulk
+from . import codec as codecs
+from . import metrics
+from . import policy
 from . import resources
+from . import stream
 from . import timestamp as ts
+from . import wire
+from .frame import EventFrame
+from .pool import imap_bounded, imap_unordered_bounded
+from .query import CompiledQuery, Query
+
+
+HTTP_METHODS = ('get', 'post', 'put', 'patch', 'delete')
+
+DEFAULT_QUERY_CONCURRENCY = 8
+DEFAULT_FETCH_CONCURRENCY = 8
+DEFAULT_FRAME_SIZE = 100000
+DEFAULT_PAGE_SIZE = 1000
+
+# Marks the end of a stream whose items may be None
+_END = object()
+
+
+def bound_micros(bound):
+    """Epoch microseconds of a window bound, a datetime or Sky timestamp"""
+    if isinstance(bound, str):
+        return ts.loads_micros(bound)
+    return ts.to_micros(bound)
+
+
+def bound_param(bound):
+    if isinstance(bound, str):
+        return bound
+    return ts.dumps(bound)
+
+
+def window_params(start=None, end=None, limit=None, cursor=None):
+    """Query parameters for a window of events, in a stable order"""
+    params = []
+    if cursor is not None:
+        params.append(('cursor', bound_param(cursor)))
+    if end is not None:
+        params.append(('end', bound_param(end)))
+    if limit is not None:
+        params.append(('limit', limit))
+    if start is not None:
+        params.append(('start', bound_param(start)))
+    return params
+
+
+QueryResult = namedtuple(
+    'QueryResult',
+    ('index', 'table', 'query', 'result', 'error', 'elapsed')
+)
+
+EventsResult = namedtuple(
+    'EventsResult',
+    ('index', 'object_id', 'events', 'error', 'elapsed')
+)
 
 
 class SkyClient(object):
 
-    def __init__(self, host='127.0.0.1', port=8585, use_ssl=False):
+    def __init__(
+        self,
+        host='127.0.0.1',
+        port=8585,
+        use_ssl=False,
+        pool_connections=1,
+        pool_maxsize=10,
+        pool_block=False,
+        max_retries=0,
+        backoff_factor=0,
+        bulk_events=None,
+        query_cache=None,
+        schema_cache=None,
+        codec=None,
+        connect_timeout=policy.DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=policy.DEFAULT_READ_TIMEOUT,
+        timeouts=None,
+        retry=None,
+        circuit_breaker=None,
+        pre_hooks=None,
+        post_hooks=None,
+        event_encoding='json',
+        factor_cache=None
+    ):
         self.host = host
         self.port = port
         self.use_ssl = use_ssl
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        # None means detect bulk endpoint support on first use
+        self.bulk_events = bulk_events
+        # An opt-in sky.cache.QueryCache, which may be shared by clients
+        self.query_cache = query_cache
+        # An opt-in sky.cache.SchemaCache of table and property metadata
+        self.schema_cache = schema_cache
+        # None picks the fastest installed JSON codec, see sky.codec
+        self.codec = codecs.get_codec(codec)
+        # (connect, read) seconds by method, overridden by ``timeouts``
+        self.timeouts = dict(
+            (method, (connect_timeout, read_timeout))
+            for method in HTTP_METHODS
+        )
+        self.timeouts.update(timeouts or {})
+        # A sky.policy.RetryPolicy, by default made from max_retries
+        self.retry = retry or self.make_retry()
+        # Opt-in: True shares a sky.policy.CircuitBreaker with every other
+        # client of the same host, or pass a CircuitBreaker
+        if circuit_breaker is True:
+            circuit_breaker = policy.get_circuit_breaker(host, port)
+        self.circuit_breaker = circuit_breaker or None
+        # Callables given a sky.metrics.RequestInfo before and after send
+        self.pre_hooks = list(pre_hooks or ())
+        self.post_hooks = list(post_hooks or ())
+        # 'msgpack' sends bulk events in the compact sky.wire encoding when
+        # the server takes it, see compact_events
+        if event_encoding not in ('json', 'msgpack'):
+            raise ValueError(
+                '%s is not a recognised event encoding' % event_encoding
+            )
+        if event_encoding == 'msgpack' and wire.msgpack is None:
+            raise ImportError('msgpack is not installed')
+        self.event_encoding = event_encoding
+        # None means detect compact encoding support on first use
+        self.compact_events = None
+        # An opt-in sky.factors.FactorCache. Decoded factor values are
+        # interned in it and frames share its codes, across calls
+        self.factor_cache = factor_cache
+        self._session = None
+        self._session_lock = threading.Lock()
 
     # TABLE API
 
     def __getattr__(self, name):
+        if name.startswith('_'):
+            # Never turn private/dunder lookups (copy, pickle, half
+            # initialised instances) into HTTP requests
+            raise AttributeError(name)
         return self.get_table(name)
 
     def get_tables(self):
-        tables = []
-        response = self.send('get', '/tables')
-        for data in response:
-            tables.append(resources.Table().from_dict(data))
-        return tables
-
+        tables = self.schema_get(('tables',))
+        if tables is None:
+            tables = []
+            response = self.send('get', '/tables')
+            for data in response:
+                tables.append(resources.Table(client=self).from_dict(data))
+            self.schema_set(('tables',), tables)
+            for table in tables:
+                self.schema_set(('table', table.name), table)
+        return list(tables)
 
     def get_table(self, name):
-        response = self.send('get', '/tables/%s' % name)
-        return resources.Table().from_dict(response)
+        table = self.schema_get(('table', name))
+        if table is None:
+            response = self.send('get', '/tables/%s' % name)
+            table = resources.Table(client=self).from_dict(response)
+            self.schema_set(('table', name), table)
+        return table
 
     def create_table(self, table):
         response = self.send('post', '/tables', table.to_dict())
         table.client = self
-        return table.from_dict(response)
+        table.from_dict(response)
+        self.refresh_schema(table.name)
+        self.schema_set(('table', table.name), table)
+        return table
 
     def delete_table(self, table):
         self.send('delete', '/tables/%s' % table.name)
+        self.refresh_schema(table.name)
+        self.invalidate_query_cache(table)
+        self.invalidate_factors(table)
         return None
 
     # PROPERTIES API
 
     def get_properties(self, table):
-        properties = []
-        response = self.send('get', '/tables/%s/properties' % table.name)
-        for data in response:
-            properties.append(resources.Property().from_dict(data))
-        return properties
+        properties = self.schema_get(('properties', table.name))
+        if properties is None:
+            properties = []
+            response = self.send('get', '/tables/%s/properties' % table.name)
+            for data in response:
+                properties.append(resources.Property().from_dict(data))
+            self.schema_set(('properties', table.name), properties)
+            for prop in properties:
+                self.schema_set(('property', table.name, prop.name), prop)
+        return list(properties)
 
     def get_property(self, table, name):
-        response = self.send(
-            'get',
-            '/tables/%s/properties/%s' % (table.name, name)
-        )
-        return resources.Property().from_dict(response)
+        prop = self.schema_get(('property', table.name, name))
+        if prop is None:
+            response = self.send(
+                'get',
+                '/tables/%s/properties/%s' % (table.name, name)
+            )
+            prop = resources.Property().from_dict(response)
+            self.schema_set(('property', table.name, name), prop)
+        return prop
 
     def create_property(self, table, prop):
         response = self.send(
@@ -61,7 +222,12 @@ class SkyClient(object):
             '/tables/%s/properties' % table.name,
             prop.to_dict()
         )
-        return prop.from_dict(response)
+        prop.from_dict(response)
+        self.schema_discard(('properties', table.name))
+        self.schema_set(('property', table.name, prop.name), prop)
+        if self.factor_cache is not None:
+            self.factor_cache.forget_properties(table.name)
+        return prop
 
     def update_property(self, table, property_name, prop):
         response = self.send(
@@ -69,27 +235,422 @@ class SkyClient(object):
             '/tables/%s/properties/%s' % (table.name, property_name),
             prop.to_dict()
         )
-        return prop.from_dict(response)
+        prop.from_dict(response)
+        self.schema_discard(('properties', table.name))
+        self.schema_discard(('property', table.name, property_name))
+        self.schema_set(('property', table.name, prop.name), prop)
+        self.invalidate_factors(table, property_name)
+        return prop
 
     def delete_property(self, table, prop):
         self.send(
             'delete',
             '/tables/%s/properties/%s' % (table.name, prop.name)
         )
+        self.schema_discard(('properties', table.name))
+        self.schema_discard(('property', table.name, prop.name))
+        self.invalidate_factors(table, prop.name)
         return None
 
+    # SCHEMA CACHE
+
+    def schema_get(self, key):
+        if self.schema_cache is None:
+            return None
+        return self.schema_cache.get(key)
+
+    def schema_set(self, key, value):
+        if self.schema_cache is not None:
+            self.schema_cache.set(key, value)
+
+    def schema_discard(self, key):
+        if self.schema_cache is not None:
+            self.schema_cache.discard(key)
+
+    def refresh_schema(self, table_name=None):
+        """
+        Forget cached metadata for one table, or all of them, so the next
+        lookup goes back to the server.
+        """
+        if self.schema_cache is not None:
+            self.schema_cache.invalidate(table_name)
+        if self.factor_cache is not None:
+            self.factor_cache.forget_properties(table_name)
+
+    # FACTORS
+
+    def factor_interner(self, table):
+        """
+        A function interning an event data dict's factor values in place,
+        or None without a factor_cache or factor properties
+        """
+        if self.factor_cache is None:
+            return None
+        return self.factor_cache.interner(
+            table.name,
+            lambda: self.get_properties(table)
+        )
+
+    def invalidate_factors(self, table, property_name=None):
+        if self.factor_cache is not None:
+            self.factor_cache.invalidate(table.name, property_name)
+
     # EVENT API
 
-    def get_events(self, table, object_id):
+    def get_events(
+        self,
+        table,
+        object_id,
+        as_frame=False,
+        properties=None,
+        start=None,
+        end=None,
+        limit=None,
+        cursor=None
+    ):
+        """
+        An object's events, or only those from ``start`` up to but not
+        including ``end``. ``limit`` caps how many are returned and
+        ``cursor``, the timestamp of the last event of a previous page,
+        skips everything up to and including it.
+        """
+        window = (start, end, limit, cursor)
+        if as_frame:
+            frames = self.iter_frames(
+                table,
+                object_id,
+                frame_size=None,
+                properties=properties,
+                start=start,
+                end=end,
+                limit=limit,
+                cursor=cursor
+            )
+            try:
+                return next(frames)
+            finally:
+                frames.close()
+        if window != (None, None, None, None):
+            return list(self.iter_events(
+                table,
+                object_id,
+                start=start,
+                end=end,
+                limit=limit,
+                cursor=cursor
+            ))
         events = []
+        intern = self.factor_interner(table)
         response = self.send(
             'get',
             '/tables/%s/objects/%s/events' % (table.name, object_id)
         )
         for data in response:
-            events.append(resources.Event().from_dict(data))
+            if intern is not None:
+                intern(data.get('data') or {})
+            events.append(resources.Event.from_dict_fast(data))
         return events
 
+    def iter_events(
+        self,
+        table,
+        object_id,
+        chunk_size=stream.DEFAULT_CHUNK_SIZE,
+        max_buffer=stream.DEFAULT_MAX_BUFFER,
+        start=None,
+        end=None,
+        limit=None,
+        cursor=None
+    ):
+        """
+        Yield an object's events one at a time while the response is still
+        being read, holding at most about ``chunk_size`` bytes plus one
+        event (capped by ``max_buffer``) rather than the whole history.
+        """
+        intern = self.factor_interner(table)
+        for data in self.iter_event_dicts(
+            table,
+            object_id,
+            start,
+            end,
+            limit,
+            cursor,
+            chunk_size,
+            max_buffer
+        ):
+            if intern is not None:
+                intern(data.get('data') or {})
+            yield resources.Event.from_dict_fast(data)
+
+    def iter_frames(
+        self,
+        table,
+        object_id,
+        frame_size=DEFAULT_FRAME_SIZE,
+        properties=None,
+        chunk_size=stream.DEFAULT_CHUNK_SIZE,
+        max_buffer=stream.DEFAULT_MAX_BUFFER,
+        start=None,
+        end=None,
+        limit=None,
+        cursor=None
+    ):
+        """
+        Stream an object's events into EventFrames of up to ``frame_size``
+        events (all of them in one frame when None), typed by the table's
+        properties unless ``properties`` are given. With a factor_cache,
+        factor codes are shared by every frame of the table.
+        """
+        if properties is None:
+            properties = self.get_properties(table)
+        dictionaries = None
+        if self.factor_cache is not None:
+            dictionaries = self.factor_cache.dictionaries(
+                table.name,
+                properties
+            )
+        objs = self.iter_event_dicts(
+            table,
+            object_id,
+            start,
+            end,
+            limit,
+            cursor,
+            chunk_size,
+            max_buffer
+        )
+        try:
+            while True:
+                frame = EventFrame.from_dicts(
+                    itertools.islice(objs, frame_size),
+                    properties,
+                    dictionaries
+                )
+                if frame_size is None or len(frame):
+                    yield frame
+                if frame_size is None or len(frame) < frame_size:
+                    break
+        finally:
+            objs.close()
+
+    def iter_event_dicts(
+        self,
+        table,
+        object_id,
+        start=None,
+        end=None,
+        limit=None,
+        cursor=None,
+        chunk_size=stream.DEFAULT_CHUNK_SIZE,
+        max_buffer=stream.DEFAULT_MAX_BUFFER
+    ):
+        """
+        Stream an object's events as decoded JSON, limited to a window.
+
+        The window is sent as query parameters, but it is applied here as
+        well in case the server ignores them. Events arrive in timestamp
+        order, so the response is closed as soon as one at or after
+        ``end`` turns up, or ``limit`` events have been yielded, and the
+        rest of the history is never read.
+        """
+        path = '/tables/%s/objects/%s/events' % (table.name, object_id)
+        params = window_params(start, end, limit, cursor)
+        if params:
+            path = '%s?%s' % (path, urlencode(params))
+        if limit is not None and limit <= 0:
+            return
+        low = None if start is None else bound_micros(start)
+        after = None if cursor is None else bound_micros(cursor)
+        high = None if end is None else bound_micros(end)
+        loads_micros = ts.loads_micros
+        objs = self._stream_array(path, chunk_size, max_buffer)
+        try:
+            count = 0
+            for data in objs:
+                if low is not None or after is not None or high is not None:
+                    micros = loads_micros(data['timestamp'])
+                    if high is not None and micros >= high:
+                        break
+                    if low is not None and micros < low:
+                        continue
+                    if after is not None and micros <= after:
+                        continue
+                yield data
+                count += 1
+                if count == limit:
+                    break
+        finally:
+            objs.close()
+
+    def _stream_array(self, path, chunk_size, max_buffer):
+        """
+        Yield the items of the JSON array at ``path`` while it is read. Any
+        hooks hear about the request once the response is closed, so its
+        ``total`` includes the time spent between items.
+        """
+        if not (self.pre_hooks or self.post_hooks):
+            response = self.request('get', path, stream=True)
+            try:
+                for data in stream.iter_json_array(
+                    response.iter_content(chunk_size),
+                    max_buffer
+                ):
+                    yield data
+            finally:
+                response.close()
+            return
+        clock = metrics.clock
+        info = metrics.RequestInfo('get', path)
+        info.response_bytes = 0
+        for hook in self.pre_hooks:
+            hook(info)
+        start = clock()
+        response = None
+
+        def read(chunks):
+            chunks = iter(chunks)
+            while True:
+                began = clock()
+                chunk = next(chunks, None)
+                info.network += clock() - began
+                if chunk is None:
+                    return
+                info.response_bytes += len(chunk)
+                yield chunk
+
+        try:
+            try:
+                response = self.request('get', path, stream=True)
+            finally:
+                info.network = clock() - start
+            info.status = response.status_code
+            elapsed = getattr(response, 'elapsed', None)
+            if isinstance(elapsed, timedelta):
+                info.server = elapsed.total_seconds()
+            objs = stream.iter_json_array(
+                read(response.iter_content(chunk_size)),
+                max_buffer
+            )
+            while True:
+                began = clock()
+                network = info.network
+                data = next(objs, _END)
+                # Reading is counted as network time, the rest is decoding
+                info.decode += clock() - began - (info.network - network)
+                if data is _END:
+                    return
+                yield data
+        except Exception as e:
+            info.error = e
+            if info.status is None:
+                info.status = getattr(
+                    getattr(e, 'response', None),
+                    'status_code',
+                    None
+                )
+            raise
+        finally:
+            if response is not None:
+                response.close()
+            info.total = clock() - start
+            for hook in self.post_hooks:
+                hook(info)
+
+    def iter_pages(
+        self,
+        table,
+        object_id,
+        start=None,
+        end=None,
+        page_size=DEFAULT_PAGE_SIZE,
+        prefetch=True
+    ):
+        """
+        Yield an object's events in lists of up to ``page_size``, each page
+        carrying on from the timestamp of the last event of the one before.
+        With ``prefetch`` the next page is fetched on a background thread
+        while the caller works through the current one.
+        """
+        intern = self.factor_interner(table)
+
+        def fetch(cursor):
+            page = list(self.iter_event_dicts(
+                table,
+                object_id,
+                start,
+                end,
+                page_size,
+                cursor
+            ))
+            if intern is not None:
+                for data in page:
+                    intern(data.get('data') or {})
+            return page
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            page = fetch(None)
+            while True:
+                full = len(page) == page_size
+                if full and executor is not None:
+                    following = executor.submit(fetch, page[-1]['timestamp'])
+                if page:
+                    yield [
+                        resources.Event.from_dict_fast(data) for data in page
+                    ]
+                if not full:
+                    break
+                if executor is not None:
+                    page = following.result()
+                else:
+                    page = fetch(page[-1]['timestamp'])
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def get_events_many(
+        self,
+        table,
+        object_ids,
+        concurrency=DEFAULT_FETCH_CONCURRENCY,
+        ordered=True,
+        **kwargs
+    ):
+        """
+        Fetch the events of many objects on at most ``concurrency``
+        threads, yielding an EventsResult per object either in input order
+        or as each one completes. Other arguments go to get_events. A
+        failed fetch is reported on its result rather than raised.
+
+        Connections are pooled, so ``concurrency`` above ``pool_maxsize``
+        opens connections that are thrown away after each request.
+        """
+        def run(item):
+            index, object_id = item
+            start = time.time()
+            try:
+                events = self.get_events(table, object_id, **kwargs)
+                error = None
+            except (requests.RequestException, ValueError) as e:
+                events, error = None, e
+            return EventsResult(
+                index,
+                object_id,
+                events,
+                error,
+                time.time() - start
+            )
+
+        imap = imap_bounded if ordered else imap_unordered_bounded
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for result in imap(
+                executor,
+                run,
+                enumerate(object_ids),
+                concurrency * 2
+            ):
+                yield result
+
     def get_event(self, table, object_id, timestamp):
         timestamp = ts.dumps(timestamp)
         response = self.send(
@@ -100,7 +661,7 @@ class SkyClient(object):
                 timestamp
             )
         )
-        return resources.Event().from_dict(response)
+        return resources.Event.from_dict_fast(response)
 
     def create_event(self, table, object_id, event, replace=True):
         method = 'patch'
@@ -116,7 +677,140 @@ class SkyClient(object):
             ),
             event.to_dict()
         )
-        return resources.Event().from_dict(response)
+        self.invalidate_query_cache(table)
+        return resources.Event.from_dict_fast(response)
+
+    def create_events(
+        self,
+        table,
+        events,
+        replace=True,
+        batch_size=bulk.DEFAULT_BATCH_SIZE,
+        batch_bytes=bulk.DEFAULT_BATCH_BYTES,
+        concurrency=bulk.DEFAULT_CONCURRENCY
+    ):
+        method = 'patch'
+        if replace:
+            method = 'put'
+        result = bulk.BulkResult()
+        source = enumerate(events)
+        compact = None
+        if (
+            self.event_encoding == 'msgpack' and
+            self.compact_events is not False and
+            self.bulk_events is not False
+        ):
+            compact = wire.EventEncoder(self.get_properties(table)).encode
+        # Whether the next batch is one msgpack failed on, resent as NDJSON
+        # to find out whether it was the encoding or the batch refused
+        resend = False
+        while self.bulk_events is not False:
+            encode = None
+            content_type = bulk.NDJSON_CONTENT_TYPE
+            if compact is not None and self.compact_events is not False:
+                if not resend:
+                    encode = compact
+                    content_type = wire.MSGPACK_CONTENT_TYPE
+            resent, resend = resend, False
+            batch = bulk.Batch(
+                source,
+                result,
+                batch_size,
+                batch_bytes,
+                self.codec,
+                encode
+            )
+            body = batch.stream()
+            if body is None:
+                return result
+            try:
+                self.send(
+                    method,
+                    '/tables/%s/events' % table.name,
+                    body=body,
+                    content_type=content_type
+                )
+            except requests.HTTPError as e:
+                status = getattr(e.response, 'status_code', None)
+                if encode is not None and self.compact_events is None:
+                    if status in wire.UNSUPPORTED_STATUS_CODES:
+                        # Not understood, so send this batch and the rest
+                        # as NDJSON instead
+                        self.compact_events = False
+                        source = itertools.chain(batch.items, source)
+                        continue
+                    if status in wire.AMBIGUOUS_STATUS_CODES:
+                        resend = True
+                        source = itertools.chain(batch.items, source)
+                        continue
+                if (
+                    self.bulk_events is None and
+                    status in bulk.UNSUPPORTED_STATUS_CODES and
+                    (status != 404 or self._table_exists(table))
+                ):
+                    self.bulk_events = False
+                    source = itertools.chain(batch.items, source)
+                    break
+                result.add_batch_failure(batch.items, e)
+            except requests.RequestException as e:
+                result.add_batch_failure(batch.items, e)
+            else:
+                self.bulk_events = True
+                if encode is not None:
+                    self.compact_events = True
+                elif resent:
+                    # Taken as NDJSON, so it was msgpack that was refused
+                    self.compact_events = False
+                result.written += len(batch.items)
+                self.invalidate_query_cache(table)
+        self._create_events_individually(
+            table,
+            source,
+            replace,
+            concurrency,
+            result
+        )
+        return result
+
+    def _table_exists(self, table):
+        """
+        Whether ``table`` exists, telling a 404 for a missing table from
+        one for a missing endpoint; False if the server cannot say
+        """
+        try:
+            self.send('get', '/tables/%s' % table.name)
+        except requests.RequestException:
+            return False
+        return True
+
+    def _create_events_individually(
+        self,
+        table,
+        source,
+        replace,
+        concurrency,
+        result
+    ):
+        def create(item):
+            index, (object_id, event) = item
+            try:
+                self.create_event(table, object_id, event, replace)
+            except (requests.RequestException, TypeError, ValueError) as e:
+                return item, e
+            return item, None
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for item, error in imap_bounded(
+                executor,
+                create,
+                source,
+                concurrency * 2
+            ):
+                if error is None:
+                    result.written += 1
+                else:
+                    index, (object_id, event) = item
+                    result.add_failure(index, object_id, event, error)
 
     def delete_event(self, table, object_id, event):
         timestamp = ts.dumps(event.timestamp)
@@ -128,59 +822,304 @@ class SkyClient(object):
                 timestamp
             ),
         )
+        self.invalidate_query_cache(table)
         return None
 
     # QUERY API
 
     def query(self, table, q):
-        if isinstance(q, list):
-            q = {'steps': q}
-        return self.send(
-            'get',
-            '/tables/%s/query' % table.name,
-            q
+        path = '/tables/%s/query' % table.name
+        if isinstance(q, CompiledQuery):
+            # Already canonical, so it serves as body and cache key as is
+            body = q.body
+        elif isinstance(q, Query):
+            body = q.compile().body
+        else:
+            if isinstance(q, list):
+                q = {'steps': q}
+            if self.query_cache is None:
+                return self.send('get', path, q)
+            # Sorted so equal queries make equal cache keys
+            body = self.codec.dumps(q, sort_keys=True)
+        if self.query_cache is None:
+            return self.send('get', path, body=body)
+        return self.query_cache.get_or_load(
+            (self.host, self.port, table.name, body),
+            lambda: self.send('get', path, body=body)
         )
 
+    def compile_query(self, table, q):
+        """Compile a query.Query, checking it against the table's properties"""
+        return q.compile(self.get_properties(table))
+
+    def invalidate_query_cache(self, table):
+        if self.query_cache is not None:
+            self.query_cache.invalidate(self.host, self.port, table.name)
+
+    def query_many(
+        self,
+        queries,
+        concurrency=DEFAULT_QUERY_CONCURRENCY,
+        ordered=True
+    ):
+        """
+        Run (table, query) pairs concurrently on at most ``concurrency``
+        threads, yielding a QueryResult per pair either in input order or
+        as each one completes. Failures are reported on the result rather
+        than raised so one bad table does not lose the others.
+        """
+        def run(item):
+            index, (table, q) = item
+            start = time.time()
+            try:
+                result, error = self.query(table, q), None
+            except (requests.RequestException, ValueError) as e:
+                result, error = None, e
+            return QueryResult(
+                index,
+                table,
+                q,
+                result,
+                error,
+                time.time() - start
+            )
+
+        imap = imap_bounded if ordered else imap_unordered_bounded
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for result in imap(
+                executor,
+                run,
+                enumerate(queries),
+                concurrency * 2
+            ):
+                yield result
+
     # UTILITY API
 
-    def ping(self):
+    def ping(self, timeout=policy.PING_TIMEOUT):
         try:
-            self.send('get', '/ping')
-        except Exception:
+            self.send('get', '/ping', timeout=timeout, retry=False)
+        except requests.RequestException:
             return False
-        else:
-            return True
+        except ValueError:
+            # Answered, if not with JSON
+            pass
+        return True
+
+    # CONNECTION MANAGEMENT
+
+    def get_session(self):
+        session = self._session
+        if session is None:
+            with self._session_lock:
+                session = self._session
+                if session is None:
+                    session = self._session = self.make_session()
+        return session
+
+    def make_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def make_retry(self):
+        return policy.RetryPolicy(
+            max_retries=self.max_retries,
+            backoff_factor=self.backoff_factor
+        )
+
+    def close(self):
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     # HTTP METHODS
 
-    def send(self, method, path, data=None):
-        methods = {
-            'get': requests.get,
-            'post': requests.post,
-            'put': requests.put,
-            'patch': requests.patch,
-            'delete': requests.delete
-        }
-        func = methods.get(method, None)
-        if func is None:
+    def send(
+        self,
+        method,
+        path,
+        data=None,
+        body=None,
+        content_type='application/json',
+        timeout=None,
+        retry=True
+    ):
+        if self.pre_hooks or self.post_hooks:
+            return self.send_instrumented(
+                method,
+                path,
+                data,
+                body,
+                content_type,
+                timeout,
+                retry
+            )
+        response = self.request(
+            method,
+            path,
+            data,
+            body,
+            content_type,
+            timeout=timeout,
+            retry=retry
+        )
+        return self.decode_response(response)
+
+    def send_instrumented(
+        self,
+        method,
+        path,
+        data,
+        body,
+        content_type,
+        timeout,
+        retry
+    ):
+        clock = metrics.clock
+        info = metrics.RequestInfo(method, path)
+        start = clock()
+        if body is None and data:
+            body = self.codec.dumps(data)
+        if isinstance(body, bytes):
+            info.request_bytes = len(body)
+        info.encode = clock() - start
+        for hook in self.pre_hooks:
+            hook(info)
+        try:
+            sent = clock()
+            try:
+                response = self.request(
+                    method,
+                    path,
+                    body=body,
+                    content_type=content_type,
+                    timeout=timeout,
+                    retry=retry
+                )
+            finally:
+                info.network = clock() - sent
+            info.status = response.status_code
+            elapsed = getattr(response, 'elapsed', None)
+            if isinstance(elapsed, timedelta):
+                info.server = elapsed.total_seconds()
+            decoding = clock()
+            info.response_bytes = len(response.content)
+            result = self.decode_response(response)
+            info.decode = clock() - decoding
+            return result
+        except Exception as e:
+            info.error = e
+            info.status = getattr(
+                getattr(e, 'response', None),
+                'status_code',
+                None
+            )
+            raise
+        finally:
+            info.total = clock() - start
+            for hook in self.post_hooks:
+                hook(info)
+
+    def request(
+        self,
+        method,
+        path,
+        data=None,
+        body=None,
+        content_type='application/json',
+        stream=False,
+        timeout=None,
+        retry=True
+    ):
+        """
+        Make a request under the client's policies: ``timeout`` (connect,
+        read) defaults to the method's entry in ``timeouts``, transient
+        failures are retried per ``self.retry`` unless ``retry`` is False,
+        and an open circuit breaker fails fast with CircuitOpenError.
+        """
+        if method not in HTTP_METHODS:
             raise ValueError("%s is not a recognised http method" % method)
+        func = getattr(self.get_session(), method)
 
-        headers = {'content-type': 'application/json'}
+        headers = {'content-type': content_type}
         url = self.make_url(path)
 
-        if data:
-            data = json.dumps(data, sort_keys=True)
+        if body is not None:
+            # Already encoded, possibly an iterator streamed chunk by chunk
+            data = body
+        elif data:
+            data = self.codec.dumps(data)
 
         kwargs = {
             'data': data,
-            'headers': headers
+            'headers': headers,
+            'timeout': timeout or self.timeouts[method]
         }
         if self.use_ssl:
-            kwargs['verify'] = False # Bad! but currently needed
+            kwargs['verify'] = False  # Bad! but currently needed
+        if stream:
+            kwargs['stream'] = True
+
+        # A streamed body is used up by the first attempt
+        if data is not None and not isinstance(data, (bytes, str)):
+            retry = False
+        attempt = 0
+        while True:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.allow()
+            try:
+                response = func(url, **kwargs)
+            except policy.TRANSIENT_ERRORS:
+                self.record_outcome(None)
+                if not (retry and self.retry.should_retry(method, attempt)):
+                    raise
+            except BaseException:
+                # Anything else still has to settle a half open breaker
+                self.record_outcome(None)
+                raise
+            else:
+                status = getattr(response, 'status_code', None)
+                self.record_outcome(status)
+                if not (
+                    retry and
+                    policy.is_server_failure(status) and
+                    self.retry.should_retry(method, attempt, status)
+                ):
+                    response.raise_for_status()
+                    return response
+                response.close()
+            self.retry.wait(attempt)
+            attempt += 1
+
+    def record_outcome(self, status):
+        """Count a response ``status``, None for no response, per host"""
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return
+        if status is None or policy.is_server_failure(status):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
 
-        response = func(url, **kwargs)
-        response.raise_for_status()
-        return response.json
+    def decode_response(self, response):
+        content = response.content
+        if not content:
+            return None
+        return self.codec.loads(content)
 
     def make_url(self, path):
 
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+JSON codecs for request and response bodies.
+
+Every codec encodes straight to compact UTF-8 bytes and decodes bytes or
+text. Keys are only sorted when asked, which the client does for bodies
+that double as cache keys.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JSONCodec(object):
+
+    name = 'json'
+
+    def dumps(self, obj, sort_keys=False):
+        return json.dumps(
+            obj,
+            sort_keys=sort_keys,
+            separators=(',', ':'),
+            ensure_ascii=False
+        ).encode('utf-8')
+
+    def loads(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class OrjsonCodec(object):
+
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError('orjson is not installed')
+
+    def dumps(self, obj, sort_keys=False):
+        option = orjson.OPT_SORT_KEYS if sort_keys else 0
+        return orjson.dumps(obj, option=option)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class UjsonCodec(object):
+
+    name = 'ujson'
+
+    def __init__(self):
+        if ujson is None:
+            raise ImportError('ujson is not installed')
+
+    def dumps(self, obj, sort_keys=False):
+        return ujson.dumps(
+            obj,
+            sort_keys=sort_keys,
+            ensure_ascii=False
+        ).encode('utf-8')
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+# In order of preference when picking automatically
+CODECS = (OrjsonCodec, UjsonCodec, JSONCodec)
+
+
+def get_codec(codec=None):
+    """
+    Resolve a codec instance from None (the fastest one installed), a
+    codec name ('orjson', 'ujson' or 'json') or a codec instance.
+    """
+    if codec is None:
+        for cls in CODECS:
+            try:
+                return cls()
+            except ImportError:
+                continue
+    if isinstance(codec, str):
+        for cls in CODECS:
+            if cls.name == codec:
+                return cls()
+        raise ValueError('%s is not a recognised codec' % codec)
+    return codec
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Dictionary encoding for factor properties.
+
+A factor takes a few distinct values across millions of events, so each
+(table, property) gets a FactorDictionary assigning the values integer
+codes in order of first appearance. Decoding events through it keeps one
+string object per distinct value rather than one per event, and
+EventFrame factor columns hold its codes with its label list as the
+lookup table, so codes mean the same thing in every frame.
+
+A FactorCache holds the dictionaries. Given to SkyClient as
+``factor_cache`` it keeps them across calls; to_dict and from_dict let
+the mapping outlive the process too. It also remembers which properties
+of each table are factors, so interning does not fetch the table's
+properties on every read.
+
+Dictionaries are bounded by ``max_size``. Once one is full, values it has
+not seen are left as they are when interning, and frames code them in a
+frame-local copy of the dictionary.
+"""
+import threading
+
+from .resources import Property
+
+
+DEFAULT_MAX_FACTORS = 65536
+
+
+class FactorDictionary(object):
+
+    def __init__(self, max_size=DEFAULT_MAX_FACTORS, labels=()):
+        self.max_size = max_size
+        self.labels = list(labels)
+        self.codes = dict(
+            (label, code) for code, label in enumerate(self.labels)
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def full(self):
+        return self.max_size is not None and len(self.labels) >= self.max_size
+
+    def code(self, value):
+        """The code for ``value``, assigned if need be, or None when full"""
+        code = self.codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self.codes.get(value)
+                if code is None:
+                    if self.full:
+                        return None
+                    code = len(self.labels)
+                    # Label first, so a code is never seen without it
+                    self.labels.append(value)
+                    self.codes[value] = code
+        return code
+
+    def intern(self, value):
+        """The dictionary's own copy of ``value``, when it has room"""
+        code = self.code(value)
+        if code is None:
+            return value
+        return self.labels[code]
+
+    def copy(self, max_size=None):
+        """An unshared copy, unbounded unless ``max_size`` is given"""
+        return FactorDictionary(max_size, self.labels)
+
+
+class FactorCache(object):
+    """Thread safe FactorDictionary per (table, property)"""
+
+    def __init__(self, max_size=DEFAULT_MAX_FACTORS):
+        self.max_size = max_size
+        self._dictionaries = {}
+        self._factors = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._dictionaries)
+
+    def dictionary(self, table_name, property_name):
+        key = (table_name, property_name)
+        dictionary = self._dictionaries.get(key)
+        if dictionary is None:
+            with self._lock:
+                dictionary = self._dictionaries.setdefault(
+                    key,
+                    FactorDictionary(self.max_size)
+                )
+        return dictionary
+
+    def dictionaries(self, table_name, properties):
+        """FactorDictionary by property name for the factor ``properties``"""
+        return dict(
+            (prop.name, self.dictionary(table_name, prop.name))
+            for prop in properties
+            if prop.data_type == Property.DATA_TYPE_FACTOR
+        )
+
+    def factor_names(self, table_name, properties):
+        """
+        Names of the table's factor properties. ``properties`` may be a
+        function returning them, called only when the names are not
+        already remembered.
+        """
+        if callable(properties):
+            names = self._factors.get(table_name)
+            if names is not None:
+                return names
+            properties = properties()
+        names = tuple(
+            prop.name for prop in properties
+            if prop.data_type == Property.DATA_TYPE_FACTOR
+        )
+        self._factors[table_name] = names
+        return names
+
+    def interner(self, table_name, properties):
+        """
+        A function interning the factor values of an event data dict in
+        place, or None when the table has no factor properties.
+        ``properties`` are as for factor_names.
+        """
+        dictionaries = [
+            (name, self.dictionary(table_name, name))
+            for name in self.factor_names(table_name, properties)
+        ]
+        if not dictionaries:
+            return None
+
+        def intern(data):
+            for name, dictionary in dictionaries:
+                value = data.get(name)
+                if value is not None:
+                    data[name] = dictionary.intern(value)
+        return intern
+
+    def invalidate(self, table_name=None, property_name=None):
+        """
+        Forget the dictionaries of one property, one table or everything,
+        along with which of the table's properties are factors. Frames
+        already built keep the labels they were given.
+        """
+        self.forget_properties(table_name)
+        with self._lock:
+            for key in list(self._dictionaries):
+                if table_name is not None and key[0] != table_name:
+                    continue
+                if property_name is not None and key[1] != property_name:
+                    continue
+                del self._dictionaries[key]
+
+    def forget_properties(self, table_name=None):
+        """Forget which properties of one table, or any, are factors"""
+        if table_name is None:
+            self._factors.clear()
+        else:
+            self._factors.pop(table_name, None)
+
+    def to_dict(self):
+        """The labels of every dictionary, as {table: {property: labels}}"""
+        obj = {}
+        for (table_name, property_name), dictionary in list(
+            self._dictionaries.items()
+        ):
+            obj.setdefault(table_name, {})[property_name] = list(
+                dictionary.labels
+            )
+        return obj
+
+    @classmethod
+    def from_dict(cls, obj, max_size=DEFAULT_MAX_FACTORS):
+        cache = cls(max_size)
+        for table_name, properties in obj.items():
+            for property_name, labels in properties.items():
+                cache._dictionaries[(table_name, property_name)] = (
+                    FactorDictionary(max_size, labels)
+                )
+        return cache
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar containers for events.
+
+An EventFrame holds timestamps as int64 epoch microseconds and one typed
+column per property, chosen from the property's ``data_type``:
+
+==========  ===========================================================
+integer     ``array('q')`` (int64)
+float       ``array('d')`` (float64)
+boolean     ``array('b')``
+factor      ``array('i')`` codes into a label list (dictionary encoded,
+            see sky.factors)
+string      a list of python strings, as are properties with no declared
+            type
+==========  ===========================================================
+
+Every column carries a byte mask marking which events have a value. Frames
+are immutable once built; slicing and time range filtering return views
+sharing the same buffers. ``to_numpy`` exposes the buffers as NumPy arrays
+without copying when NumPy is installed.
+"""
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+from . import resources
+from . import timestamp as ts
+from .factors import FactorDictionary
+
+
+_TYPECODES = {
+    resources.Property.DATA_TYPE_INTEGER: 'q',
+    resources.Property.DATA_TYPE_FLOAT: 'd',
+    resources.Property.DATA_TYPE_BOOLEAN: 'b',
+    resources.Property.DATA_TYPE_FACTOR: 'i',
+}
+
+_CASTS = {
+    resources.Property.DATA_TYPE_INTEGER: int,
+    resources.Property.DATA_TYPE_FLOAT: float,
+    resources.Property.DATA_TYPE_BOOLEAN: bool,
+}
+
+_NUMPY_DTYPES = {
+    'q': 'int64',
+    'd': 'float64',
+    'b': 'bool',
+    'i': 'int32',
+}
+
+
+class Column(object):
+
+    def __init__(
+        self,
+        name,
+        data_type,
+        values,
+        mask,
+        labels=None,
+        start=0,
+        stop=None
+    ):
+        self.name = name
+        self.data_type = data_type
+        self._values = values
+        self._mask = mask
+        self.labels = labels
+        self.start = start
+        self.stop = len(mask) if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    @property
+    def is_factor(self):
+        return self.labels is not None
+
+    @property
+    def values(self):
+        """
+        The raw stored values; factor codes for factors, and placeholder
+        zeros/None where ``mask`` says the value is missing
+        """
+        if isinstance(self._values, array):
+            return memoryview(self._values)[self.start:self.stop]
+        return self._values[self.start:self.stop]
+
+    @property
+    def codes(self):
+        return self.values
+
+    @property
+    def mask(self):
+        return memoryview(self._mask)[self.start:self.stop]
+
+    def view(self, start, stop):
+        return Column(
+            self.name,
+            self.data_type,
+            self._values,
+            self._mask,
+            self.labels,
+            self.start + start,
+            self.start + stop
+        )
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        index += self.start
+        if not self._mask[index]:
+            return None
+        value = self._values[index]
+        if self.labels is not None:
+            return self.labels[value]
+        if self.data_type == resources.Property.DATA_TYPE_BOOLEAN:
+            return bool(value)
+        return value
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def value_counts(self):
+        """
+        Events per value, missing values aside. Factors are counted by
+        code and only then turned into labels.
+        """
+        values = self.values
+        mask = self.mask
+        if self.labels is None:
+            counts = {}
+            for index, value in enumerate(values):
+                if mask[index]:
+                    if self.data_type == resources.Property.DATA_TYPE_BOOLEAN:
+                        value = bool(value)
+                    counts[value] = counts.get(value, 0) + 1
+            return counts
+        tally = [0] * len(self.labels)
+        for index, code in enumerate(values):
+            if mask[index]:
+                tally[code] += 1
+        labels = self.labels
+        return dict(
+            (labels[code], count)
+            for code, count in enumerate(tally)
+            if count
+        )
+
+    def to_numpy(self):
+        import numpy
+        typecode = getattr(self._values, 'typecode', None)
+        if typecode is None:
+            return numpy.array(self.values, dtype=object)
+        values = numpy.frombuffer(self._values, dtype=_NUMPY_DTYPES[typecode])
+        return values[self.start:self.stop]
+
+
+class _ColumnBuilder(object):
+
+    def __init__(self, name, data_type, rows=0, dictionary=None):
+        self.name = name
+        self.data_type = data_type
+        self.cast = _CASTS.get(data_type)
+        typecode = _TYPECODES.get(data_type)
+        if typecode is None:
+            self.missing = None
+            self.values = [None] * rows
+        else:
+            self.missing = 0
+            self.values = array(typecode, [0] * rows)
+        self.mask = bytearray(rows)
+        self.dictionary = None
+        if data_type == resources.Property.DATA_TYPE_FACTOR:
+            if dictionary is None:
+                dictionary = FactorDictionary(max_size=None)
+            self.dictionary = dictionary
+            self.codes = dictionary.codes
+
+    def append(self, value):
+        if value is None:
+            self.values.append(self.missing)
+            self.mask.append(0)
+            return
+        if self.dictionary is not None:
+            code = self.codes.get(value)
+            if code is None:
+                code = self.dictionary.code(value)
+                if code is None:
+                    # The shared dictionary is full, carry on in a copy
+                    self.dictionary = self.dictionary.copy()
+                    self.codes = self.dictionary.codes
+                    code = self.dictionary.code(value)
+            value = code
+        elif self.cast is not None:
+            value = self.cast(value)
+        self.values.append(value)
+        self.mask.append(1)
+
+    def build(self):
+        labels = None
+        if self.dictionary is not None:
+            labels = self.dictionary.labels
+        return Column(
+            self.name,
+            self.data_type,
+            self.values,
+            self.mask,
+            labels
+        )
+
+
+class EventFrame(object):
+
+    def __init__(self, timestamps, columns, start=0, stop=None):
+        self._timestamps = timestamps
+        self._columns = columns
+        self.start = start
+        self.stop = len(timestamps) if stop is None else stop
+
+    # CONSTRUCTION
+
+    @classmethod
+    def from_dicts(cls, objs, properties=(), dictionaries=None):
+        """
+        Build a frame from event dicts as Sky sends them, without creating
+        Event or datetime objects along the way.
+        """
+        loads_micros = ts.loads_micros
+        return cls.from_rows(
+            (
+                (loads_micros(obj['timestamp']), obj.get('data') or {})
+                for obj in objs
+            ),
+            properties,
+            dictionaries
+        )
+
+    @classmethod
+    def from_events(cls, events, properties=(), dictionaries=None):
+        to_micros = ts.to_micros
+        return cls.from_rows(
+            ((to_micros(event.timestamp), event.data) for event in events),
+            properties,
+            dictionaries
+        )
+
+    @classmethod
+    def from_rows(cls, rows, properties=(), dictionaries=None):
+        """
+        Build a frame from (epoch microseconds, data dict) pairs. Factor
+        columns are coded by ``dictionaries``, FactorDictionary by property
+        name, where given, and by a dictionary of their own otherwise.
+        """
+        timestamps = array('q')
+        builders = {}
+        dictionaries = dictionaries or {}
+        for prop in properties:
+            builders[prop.name] = _ColumnBuilder(
+                prop.name,
+                prop.data_type,
+                dictionary=dictionaries.get(prop.name)
+            )
+        for micros, data in rows:
+            for name in data:
+                if name not in builders:
+                    # Undeclared properties are kept as plain values
+                    builders[name] = _ColumnBuilder(
+                        name,
+                        None,
+                        len(timestamps)
+                    )
+            for name, builder in builders.items():
+                builder.append(data.get(name))
+            timestamps.append(micros)
+        return cls(
+            timestamps,
+            dict((name, b.build()) for name, b in builders.items())
+        )
+
+    # ACCESS
+
+    def __len__(self):
+        return self.stop - self.start
+
+    @property
+    def timestamps(self):
+        return memoryview(self._timestamps)[self.start:self.stop]
+
+    @property
+    def columns(self):
+        return sorted(self._columns)
+
+    def column(self, name):
+        return self._columns[name].view(self.start, self.stop)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError('EventFrame slices must be contiguous')
+            return self.view(start, max(start, stop))
+        if isinstance(key, int):
+            return self.event(key)
+        return self.column(key)
+
+    def view(self, start, stop):
+        return EventFrame(
+            self._timestamps,
+            self._columns,
+            self.start + start,
+            self.start + stop
+        )
+
+    def between(self, start=None, end=None):
+        """
+        Events with start <= timestamp < end, found by binary search, so
+        the frame must be in timestamp order (as Sky returns events).
+        Bounds may be datetimes or epoch microseconds.
+        """
+        timestamps = self.timestamps
+        lo = 0
+        hi = len(timestamps)
+        if start is not None:
+            lo = bisect_left(timestamps, _as_micros(start))
+        if end is not None:
+            hi = bisect_left(timestamps, _as_micros(end), lo)
+        return self.view(lo, hi)
+
+    # CONVERSION
+
+    def event(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        position = self.start + index
+        data = {}
+        for name, column in self._columns.items():
+            if column._mask[position]:
+                data[name] = column[position - column.start]
+        return resources.Event(
+            data=data,
+            timestamp=ts.from_micros(self._timestamps[position])
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.event(index)
+
+    def to_events(self):
+        return list(self)
+
+    def to_numpy(self):
+        """Timestamps and columns as NumPy arrays sharing the frame buffers"""
+        import numpy
+        arrays = {
+            'timestamp': numpy.frombuffer(
+                self._timestamps,
+                dtype='int64'
+            )[self.start:self.stop]
+        }
+        for name in self._columns:
+            arrays[name] = self.column(name).to_numpy()
+        return arrays
+
+    def __repr__(self):
+        return '<EventFrame events=%d columns=%d>' % (
+            len(self),
+            len(self._columns)
+        )
+
+
+def _as_micros(value):
+    if isinstance(value, datetime):
+        return ts.to_micros(value)
+    return value
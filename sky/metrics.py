@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Request instrumentation.
+
+SkyClient calls each of its ``pre_hooks`` with a RequestInfo before a
+request is sent and each of its ``post_hooks`` once it has finished, or
+failed. With no hooks registered, send skips all of this.
+
+    recorder = LatencyRecorder()
+    client = SkyClient(post_hooks=[recorder])
+    ...
+    recorder.percentile('get', '/tables/{table}/query', 99)
+    print(to_prometheus(recorder))
+
+LatencyHistogram is an HDR style histogram. Values are bucketed on a log
+linear scale that keeps 7 significant bits, so quantiles are within 1% of
+the true value. Recording costs the same however many samples have been
+taken.
+"""
+import threading
+import time
+
+
+# Path segments following these names are identifiers, not structure
+_PLACEHOLDERS = {
+    'tables': '{table}',
+    'properties': '{property}',
+    'objects': '{object_id}',
+    'events': '{timestamp}',
+}
+
+_QUANTILES = (0.5, 0.9, 0.99)
+
+# The clock used for RequestInfo timings
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def path_template(path):
+    """
+    The request path with identifiers replaced and any query string
+    dropped, e.g. /tables/users/query becomes /tables/{table}/query
+    """
+    parts = path.split('?', 1)[0].split('/')
+    for index in range(1, len(parts) - 1):
+        placeholder = _PLACEHOLDERS.get(parts[index])
+        if placeholder is not None:
+            parts[index + 1] = placeholder
+    return '/'.join(parts)
+
+
+class RequestInfo(object):
+    """
+    What hooks are told about a request. Timings are seconds:
+
+    ``encode``   serialising the body
+    ``network``  from sending the request until the response was read,
+                 including any connection setup and retries
+    ``server``   until the response headers arrived, as measured by
+                 requests (connection, server time and first byte)
+    ``decode``   parsing the response body
+    ``total``    all of the above
+
+    ``request_bytes`` is None for streamed bodies. Streamed event reads
+    are reported once the response is closed, so their ``total`` includes
+    time the caller spent between events.
+    """
+
+    __slots__ = (
+        'method',
+        'path',
+        'request_bytes',
+        'response_bytes',
+        'status',
+        'error',
+        'encode',
+        'network',
+        'server',
+        'decode',
+        'total',
+    )
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.request_bytes = None
+        self.response_bytes = None
+        self.status = None
+        self.error = None
+        self.encode = 0.0
+        self.network = 0.0
+        self.server = None
+        self.decode = 0.0
+        self.total = 0.0
+
+    @property
+    def template(self):
+        return path_template(self.path)
+
+
+class LatencyHistogram(object):
+
+    def __init__(self, significant_bits=7, unit=1e-6):
+        """``unit`` is the resolution in seconds, microseconds by default"""
+        self.significant_bits = significant_bits
+        self.unit = unit
+        self._half = 1 << (significant_bits - 1)
+        self.counts = []
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def _index(self, value):
+        shift = value.bit_length() - self.significant_bits
+        if shift <= 0:
+            return value
+        return (shift * self._half) + (value >> shift)
+
+    def _value(self, index):
+        """Midpoint of the bucket at ``index``, in units"""
+        if index < 2 * self._half:
+            return index
+        shift = index // self._half - 1
+        low = (index - shift * self._half) << shift
+        return low + ((1 << shift) - 1) / 2.0
+
+    def record(self, seconds):
+        value = max(0, int(seconds / self.unit))
+        index = self._index(value)
+        with self._lock:
+            counts = self.counts
+            if index >= len(counts):
+                counts.extend([0] * (index + 1 - len(counts)))
+            counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, percent):
+        """The value in seconds that ``percent`` of samples are at or below"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, int(round(self.count * percent / 100.0)))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    value = self._value(index) * self.unit
+                    return min(max(value, self.min), self.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class LatencyRecorder(object):
+    """A post hook keeping a LatencyHistogram per (method, path template)"""
+
+    def __init__(self, significant_bits=7):
+        self.significant_bits = significant_bits
+        self.histograms = {}
+        self.statuses = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, info):
+        key = (info.method, info.template)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(
+                    key,
+                    LatencyHistogram(self.significant_bits)
+                )
+        histogram.record(info.total)
+        status_key = key + (info.status,)
+        with self._lock:
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+
+    def histogram(self, method, template):
+        return self.histograms.get((method, template))
+
+    def percentile(self, method, template, percent):
+        histogram = self.histogram(method, template)
+        if histogram is None:
+            return None
+        return histogram.percentile(percent)
+
+    def snapshot(self):
+        return dict(
+            (
+                key,
+                {
+                    'count': histogram.count,
+                    'mean': histogram.mean,
+                    'p50': histogram.percentile(50),
+                    'p99': histogram.percentile(99),
+                    'max': histogram.max,
+                }
+            )
+            for key, histogram in list(self.histograms.items())
+        )
+
+
+def _labels(**labels):
+    return ','.join(
+        '%s="%s"' % (
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in sorted(labels.items())
+    )
+
+
+def to_prometheus(recorder, prefix='sky_client'):
+    """Render a LatencyRecorder in the Prometheus text exposition format"""
+    name = '%s_request_seconds' % prefix
+    total = '%s_responses_total' % prefix
+    lines = [
+        '# HELP %s Sky HTTP request latency.' % name,
+        '# TYPE %s summary' % name,
+    ]
+    for (method, template), histogram in sorted(recorder.histograms.items()):
+        for quantile in _QUANTILES:
+            lines.append('%s{%s} %.9g' % (
+                name,
+                _labels(method=method, path=template, quantile=quantile),
+                histogram.percentile(quantile * 100)
+            ))
+        labels = _labels(method=method, path=template)
+        lines.append('%s_sum{%s} %.9g' % (name, labels, histogram.total))
+        lines.append('%s_count{%s} %d' % (name, labels, histogram.count))
+    lines.append('# HELP %s Sky HTTP responses by status.' % total)
+    lines.append('# TYPE %s counter' % total)
+    for (method, template, status), count in sorted(
+        recorder.statuses.items(),
+        key=lambda item: tuple(str(part) for part in item[0])
+    ):
+        lines.append('%s{%s} %d' % (
+            total,
+            _labels(method=method, path=template, status=status or 'error'),
+            count
+        ))
+    return '\n'.join(lines) + '\n'
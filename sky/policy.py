@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Retry and circuit breaker policies applied by SkyClient.request.
+
+Retries back off exponentially with full jitter, sleeping a random time
+between 0 and ``backoff_factor * 2 ** attempt`` (capped at
+``max_backoff``) so that clients failing together do not retry together.
+Only idempotent methods are retried by default; a retried PATCH could
+merge the same data twice into a newer version of an event.
+
+A CircuitBreaker is shared per host. After ``failure_threshold``
+consecutive failures it opens and requests fail straight away with
+CircuitOpenError. After ``reset_timeout`` seconds one trial request is let
+through, and its outcome closes the breaker or opens it again; if it
+never reports one, another is let through after ``reset_timeout`` more.
+"""
+import random
+import threading
+import time
+
+import requests
+
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 60
+PING_TIMEOUT = (1, 1)
+
+DEFAULT_MAX_BACKOFF = 10
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30
+
+IDEMPOTENT_METHODS = ('get', 'put', 'delete')
+RETRY_STATUSES = (502, 503, 504)
+
+# Errors meaning the request may never have reached the server
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    pass
+
+
+def is_server_failure(status):
+    return isinstance(status, int) and status >= 500
+
+
+def is_unreachable(error):
+    """Whether a write failed because the server could not take it"""
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    if isinstance(error, requests.HTTPError):
+        return is_server_failure(getattr(error.response, 'status_code', None))
+    return False
+
+
+class RetryPolicy(object):
+
+    def __init__(
+        self,
+        max_retries=0,
+        backoff_factor=0,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+        methods=IDEMPOTENT_METHODS,
+        statuses=RETRY_STATUSES,
+        jitter=True,
+        sleep=time.sleep
+    ):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.methods = methods
+        self.statuses = statuses
+        self.jitter = jitter
+        self.sleep = sleep
+
+    def should_retry(self, method, attempt, status=None):
+        """
+        Whether attempt number ``attempt`` (from 0) of ``method`` should be
+        retried after a transient error, or the response ``status``
+        """
+        if attempt >= self.max_retries or method not in self.methods:
+            return False
+        return status is None or status in self.statuses
+
+    def backoff(self, attempt):
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def wait(self, attempt):
+        delay = self.backoff(attempt)
+        if delay > 0:
+            self.sleep(delay)
+
+
+class CircuitBreaker(object):
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+        self,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout=DEFAULT_RESET_TIMEOUT,
+        clock=time.time
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpenError if a request should not be made now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.clock() - self.opened_at >= self.reset_timeout:
+                # Let this one request through to see if the host is back.
+                # Should a trial never report back, another goes after
+                # reset_timeout more seconds.
+                self.state = self.HALF_OPEN
+                self.opened_at = self.clock()
+                return
+        raise CircuitOpenError('Circuit open, not sending request')
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if (
+                self.state == self.HALF_OPEN or
+                self.failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(host, port, **kwargs):
+    """The CircuitBreaker shared by every client of ``host:port``"""
+    with _breakers_lock:
+        breaker = _breakers.get((host, port))
+        if breaker is None:
+            breaker = _breakers[(host, port)] = CircuitBreaker(**kwargs)
+        return breaker
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+def imap_bounded(executor, func, iterable, window):
+    """
+    Map func over iterable on executor, yielding results in input order
+    while keeping at most ``window`` calls queued or in flight, so very
+    large (or endless) iterables are never submitted all at once.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def imap_unordered_bounded(executor, func, iterable, window):
+    """
+    As imap_bounded, but yield each result as soon as it completes so one
+    slow call does not hold back the ones queued behind it.
+    """
+    pending = set()
+    for item in iterable:
+        pending.add(executor.submit(func, item))
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
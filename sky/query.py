@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Builders for Sky query JSON.
+
+    q = Query(
+        Condition("action == 'signup'", within=(1, 7)).then(
+            Selection().group_by('country').count()
+        )
+    ).compile(table.get_properties())
+    client.query(table, q)
+
+Compiling validates property references and produces an immutable,
+hashable CompiledQuery holding the canonical JSON body, so running it
+again never re-serialises anything. Param slots make a QueryTemplate whose
+bind() only encodes the parameter values.
+"""
+import abc
+import copy
+import re
+
+from .codec import JSONCodec
+
+
+class QueryError(ValueError):
+    pass
+
+
+class Param(object):
+    """A named slot standing in for any JSON value in a template"""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return 'Param(%r)' % self.name
+
+
+# Canonical bodies always use the stdlib codec so they are identical
+# whatever codec a client is configured with
+_CANONICAL = JSONCodec()
+
+_STRINGS = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'')
+_IDENTIFIERS = re.compile(r'([A-Za-z_@$][A-Za-z0-9_.@$]*)(\s*\()?')
+_KEYWORDS = frozenset((
+    'true', 'false', 'null', 'and', 'or', 'not', 'in',
+    'AND', 'OR', 'NOT', 'IN', 'TRUE', 'FALSE', 'NULL',
+))
+
+
+def expression_identifiers(expression):
+    """Names an expression refers to, ignoring literals and functions"""
+    expression = _STRINGS.sub('', expression)
+    names = set(
+        name for name, call in _IDENTIFIERS.findall(expression) if not call
+    )
+    return names - _KEYWORDS
+
+
+class Step(abc.ABC):
+
+    @abc.abstractmethod
+    def to_dict(self):
+        """The step as query JSON"""
+
+    def references(self):
+        """Property names the step depends on"""
+        return set()
+
+
+class Selection(Step):
+
+    def __init__(self, name=None):
+        self.name = name
+        self.dimensions = []
+        self.fields = []
+
+    def group_by(self, *dimensions):
+        self.dimensions.extend(dimensions)
+        return self
+
+    def field(self, name, expression):
+        self.fields.append((name, expression))
+        return self
+
+    def count(self, name='count'):
+        return self.field(name, 'count()')
+
+    def sum(self, prop, name=None):
+        return self.field(name or 'sum_%s' % prop, 'sum(%s)' % prop)
+
+    def min(self, prop, name=None):
+        return self.field(name or 'min_%s' % prop, 'min(%s)' % prop)
+
+    def max(self, prop, name=None):
+        return self.field(name or 'max_%s' % prop, 'max(%s)' % prop)
+
+    # distinct and histogram are evaluated by sky.analytics, not the server
+
+    def distinct(self, prop, name=None):
+        return self.field(
+            name or 'distinct_%s' % prop,
+            'distinct(%s)' % prop
+        )
+
+    def histogram(self, prop, width=None, name=None):
+        expression = 'histogram(%s)' % prop
+        if width is not None:
+            expression = 'histogram(%s, %r)' % (prop, width)
+        return self.field(name or 'histogram_%s' % prop, expression)
+
+    def to_dict(self):
+        obj = {
+            'type': 'selection',
+            'dimensions': list(self.dimensions),
+            'fields': [
+                {'name': name, 'expression': expression}
+                for name, expression in self.fields
+            ],
+        }
+        if self.name is not None:
+            obj['name'] = self.name
+        return obj
+
+    def references(self):
+        names = set(d for d in self.dimensions if not isinstance(d, Param))
+        for name, expression in self.fields:
+            if not isinstance(expression, Param):
+                names |= expression_identifiers(expression)
+        return names
+
+
+class Condition(Step):
+
+    def __init__(self, expression, within=(0, 0), within_units='steps'):
+        self.expression = expression
+        self.within = within
+        self.within_units = within_units
+        self.steps = []
+
+    def then(self, *steps):
+        self.steps.extend(steps)
+        return self
+
+    def to_dict(self):
+        within = self.within
+        if not isinstance(within, Param):
+            within = list(within)
+        return {
+            'type': 'condition',
+            'expression': self.expression,
+            'within': within,
+            'withinUnits': self.within_units,
+            'steps': [step.to_dict() for step in self.steps],
+        }
+
+    def references(self):
+        names = set()
+        if not isinstance(self.expression, Param):
+            names = expression_identifiers(self.expression)
+        for step in self.steps:
+            names |= step.references()
+        return names
+
+
+def funnel(expressions, within=(1, 1), within_units='steps', selection=None):
+    """
+    Nest one Condition per expression, each within ``within`` of the one
+    before, ending in ``selection`` (a plain count by default). The first
+    expression matches anywhere.
+    """
+    if not expressions:
+        raise QueryError('A funnel needs at least one step')
+    if selection is None:
+        selection = Selection().count()
+    root = step = Condition(expressions[0])
+    for expression in expressions[1:]:
+        child = Condition(expression, within, within_units)
+        step.then(child)
+        step = child
+    step.then(selection)
+    return root
+
+
+class Query(object):
+
+    def __init__(self, *steps, **kwargs):
+        self.steps = list(steps)
+        self.session_idle_time = kwargs.pop('session_idle_time', None)
+        if kwargs:
+            raise TypeError('Unexpected arguments: %s' % ', '.join(kwargs))
+
+    def step(self, *steps):
+        self.steps.extend(steps)
+        return self
+
+    def to_dict(self):
+        obj = {'steps': [step.to_dict() for step in self.steps]}
+        if self.session_idle_time is not None:
+            obj['sessionIdleTime'] = self.session_idle_time
+        return obj
+
+    def references(self):
+        names = set()
+        for step in self.steps:
+            names |= step.references()
+        return names
+
+    def validate(self, properties):
+        known = set(prop.name for prop in properties)
+        unknown = self.references() - known
+        if unknown:
+            raise QueryError(
+                'Unknown properties: %s' % ', '.join(sorted(unknown))
+            )
+
+    def compile(self, properties=None):
+        if properties is not None:
+            self.validate(properties)
+        template = QueryTemplate(self.to_dict())
+        if template.params:
+            raise QueryError(
+                'Query has parameters, use template() and bind() instead'
+            )
+        return template.bind()
+
+    def template(self, properties=None):
+        if properties is not None:
+            self.validate(properties)
+        return QueryTemplate(self.to_dict())
+
+
+class CompiledQuery(object):
+    """Immutable canonical JSON body of a query"""
+
+    __slots__ = ('body', '_hash')
+
+    def __init__(self, body):
+        object.__setattr__(self, 'body', body)
+        object.__setattr__(self, '_hash', hash(body))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CompiledQuery is immutable')
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        return isinstance(other, CompiledQuery) and self.body == other.body
+
+    def __ne__(self, other):
+        return not self == other
+
+    def to_dict(self):
+        return _CANONICAL.loads(self.body)
+
+    def __repr__(self):
+        return 'CompiledQuery(%r)' % self.body
+
+
+def _same(a, b):
+    """Equal and of the same types throughout, so 1, 1.0 and True differ"""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict):
+        return (
+            len(a) == len(b) and
+            all(k in b and _same(v, b[k]) for k, v in a.items())
+        )
+    return a == b
+
+
+class QueryTemplate(object):
+    """
+    A query body serialised once with Param slots cut out. bind() splices
+    the encoded parameter values in between the fixed byte segments,
+    re-encoding a parameter only when its value changes.
+    """
+
+    def __init__(self, obj):
+        params = []
+        markers = {}
+
+        def mark(value):
+            if isinstance(value, Param):
+                # NUL never appears in a real query, so the encoded marker
+                # cannot collide with query text
+                marker = '\x00sky-param:%d\x00' % len(params)
+                params.append(value.name)
+                markers[_CANONICAL.dumps(marker)] = len(params) - 1
+                return marker
+            if isinstance(value, dict):
+                return dict((k, mark(v)) for k, v in value.items())
+            if isinstance(value, (list, tuple)):
+                return [mark(v) for v in value]
+            return value
+
+        body = _CANONICAL.dumps(mark(obj), sort_keys=True)
+        self.segments = []
+        self.params = []
+        if markers:
+            pattern = re.compile(b'|'.join(re.escape(m) for m in markers))
+            position = 0
+            for match in pattern.finditer(body):
+                self.segments.append(body[position:match.start()])
+                self.params.append(params[markers[match.group(0)]])
+                position = match.end()
+            body = body[position:]
+        self.segments.append(body)
+        self._encoded = {}
+
+    def encode(self, name, value):
+        cached = self._encoded.get(name)
+        if cached is not None and _same(cached[0], value):
+            return cached[1]
+        encoded = _CANONICAL.dumps(value, sort_keys=True)
+        # A copy, so that changing a list or dict in place is noticed
+        self._encoded[name] = (copy.deepcopy(value), encoded)
+        return encoded
+
+    def bind(self, **params):
+        missing = set(self.params) - set(params)
+        if missing:
+            raise QueryError(
+                'Missing parameters: %s' % ', '.join(sorted(missing))
+            )
+        parts = [self.segments[0]]
+        for name, segment in zip(self.params, self.segments[1:]):
+            parts.append(self.encode(name, params[name]))
+            parts.append(segment)
+        return CompiledQuery(b''.join(parts))
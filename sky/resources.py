@@ -6,6 +6,8 @@ from . import timestamp as ts
 
 class Resource(object):
 
+    __slots__ = ()
+
     def to_dict(self):
         return {}
 
@@ -15,31 +17,70 @@ class Resource(object):
 
 class Event(Resource):
 
-    def __init__(self, data={}, timestamp=None):
+    # The raw timestamp string from the server is kept until .timestamp is
+    # first read, so decoding events never parses timestamps nobody uses
+    __slots__ = ('_timestamp', '_raw_timestamp', 'data')
+
+    def __init__(self, data=None, timestamp=None):
         super(Event, self).__init__()
         if timestamp is None:
             timestamp = datetime.utcnow()
-        self.timestamp = timestamp
+        if data is None:
+            data = {}
+        self._timestamp = timestamp
+        self._raw_timestamp = None
         self.data = data
 
+    @classmethod
+    def from_dict_fast(cls, obj):
+        """
+        Build an Event straight from a decoded dict, skipping the defaults
+        __init__ would compute only for from_dict to replace them
+        """
+        event = cls.__new__(cls)
+        event._timestamp = None
+        event._raw_timestamp = obj.get('timestamp')
+        if event._raw_timestamp is None:
+            event._timestamp = datetime.utcnow()
+        event.data = obj.get('data', {})
+        return event
+
+    @property
+    def timestamp(self):
+        if self._timestamp is None:
+            self._timestamp = ts.loads(self._raw_timestamp)
+            self._raw_timestamp = None
+        return self._timestamp
+
+    @timestamp.setter
+    def timestamp(self, timestamp):
+        self._timestamp = timestamp
+        self._raw_timestamp = None
+
     def to_dict(self):
         obj = super(Event, self).to_dict()
-        obj['timestamp'] = ts.dumps(self.timestamp)
+        if self._timestamp is None:
+            obj['timestamp'] = self._raw_timestamp
+        else:
+            obj['timestamp'] = ts.dumps(self._timestamp)
         obj['data'] = self.data
         return obj
 
     def from_dict(self, obj):
         super(Event, self).from_dict(obj)
         if 'timestamp' in obj:
-            self.timestamp = ts.loads(obj['timestamp'])
+            self._timestamp = None
+            self._raw_timestamp = obj['timestamp']
         else:
-            self.timestamp = datetime.utcnow(),
+            self.timestamp = datetime.utcnow()
         self.data = obj.get('data', {})
         return self
 
 
 class Property(Resource):
 
+    __slots__ = ('object_id', 'name', 'transient', 'data_type')
+
     DATA_TYPE_STRING = 'string'
     DATA_TYPE_INTEGER = 'integer'
     DATA_TYPE_FLOAT = 'float'
@@ -86,8 +127,11 @@ class Property(Resource):
         self.data_type = obj.get('data_type', '')
         return self
 
+
 class Table(Resource):
 
+    __slots__ = ('client', 'name')
+
     def __init__(self, name=None, client=None):
         self.client = client
         self.name = name
@@ -111,14 +155,29 @@ class Table(Resource):
 
     # EVENTS API
 
-    def get_events(self, object_id):
-        return self.client.get_events(self, object_id)
+    def get_events(self, object_id, **kwargs):
+        return self.client.get_events(self, object_id, **kwargs)
+
+    def get_events_many(self, object_ids, **kwargs):
+        return self.client.get_events_many(self, object_ids, **kwargs)
+
+    def iter_events(self, object_id, **kwargs):
+        return self.client.iter_events(self, object_id, **kwargs)
+
+    def iter_frames(self, object_id, **kwargs):
+        return self.client.iter_frames(self, object_id, **kwargs)
+
+    def iter_pages(self, object_id, **kwargs):
+        return self.client.iter_pages(self, object_id, **kwargs)
 
     def get_event(self, object_id, timestamp):
         return self.client.get_event(self, object_id, timestamp)
 
-    def add_event(self, object_id, event):
-        return self.client.add_event(self, object_id, event)
+    def add_event(self, object_id, event, replace=True):
+        return self.client.create_event(self, object_id, event, replace)
+
+    def create_events(self, events, **kwargs):
+        return self.client.create_events(self, events, **kwargs)
 
     def delete_event(self, object_id, event):
         return self.client.delete_event(self, object_id, event)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Funnels and sessions over each object's time ordered events.
+
+A Funnel follows objects through a sequence of conditions, each matched
+within ``within`` of the one before, and aggregates the events completing
+it with a selection, just as the query sky.query.funnel builds does on the
+server. Given the same events, Funnel.run and client.query(table,
+funnel.query()) return the same result, so either can check the other:
+
+    f = Funnel(["action == 'view'", "action == 'buy'"], within=(1, 3))
+    f.run(r.events for r in client.get_events_many(table, object_ids))
+
+Rather than searching forward from every event, a funnel reads each
+object's events once. Starts that reach a step at the same event go the
+same way from there on, so they are kept as one partial match with a
+count, and only matches still inside their window are kept: at most one
+per step for windows of a single step, as funnel() makes by default.
+
+Sessions splits each object's events where they are more than
+``idle_time`` seconds apart and aggregates a row per session: the data of
+its first event along with its ``events`` and ``duration`` in seconds. A
+Funnel given ``session_idle_time`` does not follow objects from one
+session into the next.
+
+Both aggregate with sky.analytics, so their states merge, and run() can
+spread the objects over a pool of ``processes``.
+"""
+import abc
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from .analytics import (
+    LocalQuery,
+    compile_expression,
+    event_row,
+    frame_rows,
+    matches,
+    merge_states,
+)
+from .frame import EventFrame
+from .pool import imap_unordered_bounded
+from .query import Query, QueryError, Selection, funnel
+
+
+DEFAULT_CHUNK_SIZE = 100
+
+
+def iter_sessions(events, idle_time):
+    """
+    Split one object's time ordered events into sessions, yielding lists
+    of the events, or views when given an EventFrame
+    """
+    idle = idle_time * 1000000
+    if isinstance(events, EventFrame):
+        timestamps = events.timestamps
+        start = 0
+        for index in range(1, len(timestamps)):
+            if timestamps[index] - timestamps[index - 1] > idle:
+                yield events[start:index]
+                start = index
+        if len(events):
+            yield events[start:]
+        return
+    session = []
+    last = None
+    for event in events:
+        micros = event_row(event)[0]
+        if session and micros - last > idle:
+            yield session
+            session = []
+        session.append(event)
+        last = micros
+    if session:
+        yield session
+
+
+def _chunks(objects, size):
+    objects = iter(objects)
+    while True:
+        chunk = list(islice(objects, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_chunk(item):
+    sequence, chunk = item
+    state = sequence.state()
+    for events in chunk:
+        sequence.add(state, events)
+    return state
+
+
+class SequenceQuery(abc.ABC):
+    """
+    Turns each object's events into rows for ``selection``, a LocalQuery
+    made of a single selection
+    """
+
+    def __init__(self, selection):
+        self.selection_step = selection
+        self.selection = LocalQuery([selection.to_dict()])
+
+    @abc.abstractmethod
+    def rows(self, events):
+        """(epoch micros, data) rows to select from one object's events"""
+
+    def state(self):
+        return self.selection.state()
+
+    def add(self, state, events):
+        rows = list(self.rows(events))
+        # Objects without rows add nothing, as they do on the server
+        if rows:
+            state.add_events(rows)
+        return state
+
+    def run(self, objects, processes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        The result over ``objects``, each an object's events or frame. With
+        ``processes`` the objects are sent to that many worker processes
+        ``chunk_size`` at a time, and their states merged.
+        """
+        if processes is None:
+            return _run_chunk((self, objects)).result()
+        with ProcessPoolExecutor(processes) as executor:
+            states = imap_unordered_bounded(
+                executor,
+                _run_chunk,
+                ((self, chunk) for chunk in _chunks(objects, chunk_size)),
+                processes * 2
+            )
+            merged = merge_states(states)
+        if merged is None:
+            return {}
+        return merged.result()
+
+
+class Funnel(SequenceQuery):
+
+    def __init__(
+        self,
+        expressions,
+        within=(1, 1),
+        within_units='steps',
+        selection=None,
+        session_idle_time=None
+    ):
+        if not expressions:
+            raise QueryError('A funnel needs at least one step')
+        if within_units not in ('steps', 'seconds'):
+            raise QueryError('Unknown within units: %s' % within_units)
+        low, high = within
+        if within_units == 'steps' and low < 0:
+            raise QueryError('Funnel steps cannot look back: %r' % (within,))
+        for expression in expressions:
+            compile_expression(expression)
+        if selection is None:
+            selection = Selection().count()
+        super(Funnel, self).__init__(selection)
+        self.expressions = list(expressions)
+        self.within = (low, high)
+        self.within_units = within_units
+        self.session_idle_time = session_idle_time
+
+    def query(self):
+        """The same funnel as a query for the server"""
+        return Query(
+            funnel(
+                self.expressions,
+                self.within,
+                self.within_units,
+                self.selection_step
+            ),
+            session_idle_time=self.session_idle_time
+        )
+
+    def rows(self, events):
+        """
+        The row of the event completing the funnel, once for every start
+        that gets there
+        """
+        if isinstance(events, EventFrame):
+            events = frame_rows(events)
+        codes = [compile_expression(e) for e in self.expressions]
+        seconds = self.within_units == 'seconds'
+        low, high = self.within
+        if seconds:
+            low, high = low * 1000000, high * 1000000
+        idle = None
+        if self.session_idle_time is not None:
+            idle = self.session_idle_time * 1000000
+        # Partial matches waiting on each step after the first, as
+        # (where the previous step matched, starts). Being in order of
+        # where they matched, those out of their window come first and
+        # those already in it next.
+        waiting = [deque() for _ in codes]
+        last = None
+        for position, event in enumerate(events):
+            micros, data = event_row(event)
+            if idle is not None and last is not None and micros - last > idle:
+                waiting = [deque() for _ in codes]
+            last = micros
+            here = micros if seconds else position
+            arrived = 1 if matches(codes[0], data) else 0
+            for step in range(1, len(codes)):
+                entries = waiting[step]
+                if arrived:
+                    entries.append((here, arrived))
+                    arrived = 0
+                while entries and here > entries[0][0] + high:
+                    entries.popleft()
+                ready = 0
+                for origin, starts in entries:
+                    if here < origin + low:
+                        break
+                    ready += 1
+                if ready and matches(codes[step], data):
+                    for _ in range(ready):
+                        arrived += entries.popleft()[1]
+            for _ in range(arrived):
+                yield micros, data
+
+
+class Sessions(SequenceQuery):
+
+    def __init__(self, idle_time, selection=None):
+        if idle_time < 0:
+            raise QueryError('Invalid session idle time: %r' % idle_time)
+        if selection is None:
+            selection = (
+                Selection()
+                .count('sessions')
+                .sum('events')
+                .sum('duration')
+                .max('duration')
+            )
+        super(Sessions, self).__init__(selection)
+        self.idle_time = idle_time
+
+    def rows(self, events):
+        """A row per session, at its first event"""
+        for session in iter_sessions(events, self.idle_time):
+            if isinstance(session, EventFrame):
+                first = session.timestamps[0]
+                last = session.timestamps[-1]
+                data = session.event(0).data
+            else:
+                first, data = event_row(session[0])
+                last = event_row(session[-1])[0]
+            data = dict(data)
+            data['events'] = len(session)
+            data['duration'] = (last - first) / 1000000.0
+            yield first, data
@@ -0,0 +1,467 @@
+# -*- coding: utf-8 -*-
+"""
+Spread one logical Sky table over several servers, each holding a subset
+of the objects.
+
+    client = ShardedSkyClient(['10.0.0.1:8585', '10.0.0.2:8585'])
+    client.create_event(table, 'user-1', event)   # to user-1's shard only
+    client.query(table, q)                        # every shard, merged
+
+Objects are placed by consistent hashing of their id, so adding a node
+only moves about 1/n of them. Queries run on every shard in parallel and
+the partial results are merged: counts and sums add up, min and max keep
+the extreme, and group-by buckets are combined key by key. Aggregates that
+cannot be merged from partial results (avg, for one) raise ValueError.
+"""
+import hashlib
+import re
+import threading
+import time
+
+import requests
+
+from bisect import bisect
+from concurrent.futures import ThreadPoolExecutor
+
+from . import bulk
+from .client import (
+    DEFAULT_FETCH_CONCURRENCY,
+    DEFAULT_QUERY_CONCURRENCY,
+    EventsResult,
+    QueryResult,
+    SkyClient,
+)
+from .pool import imap_bounded, imap_unordered_bounded
+from .query import Query
+
+
+DEFAULT_REPLICAS = 100
+
+_FUNCTION = re.compile(r'\s*([A-Za-z_][A-Za-z0-9_]*)\s*\(')
+
+_MERGES = {
+    'count': lambda a, b: a + b,
+    'sum': lambda a, b: a + b,
+    'min': min,
+    'max': max,
+}
+
+
+def _hash(key):
+    return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+
+class HashRing(object):
+    """
+    Consistent hash ring mapping keys onto node indexes, with ``replicas``
+    points per node to even out the share each one gets.
+    """
+
+    def __init__(self, nodes, replicas=DEFAULT_REPLICAS):
+        if not nodes:
+            raise ValueError('A hash ring needs at least one node')
+        points = sorted(
+            (_hash('%s-%d' % (node, replica)), index)
+            for index, node in enumerate(nodes)
+            for replica in range(replicas)
+        )
+        self.points = [point for point, index in points]
+        self.indexes = [index for point, index in points]
+
+    def get(self, key):
+        position = bisect(self.points, _hash(str(key)))
+        return self.indexes[position % len(self.points)]
+
+    __call__ = get
+
+
+def query_aggregates(q):
+    """Map each selection field name in a query to its aggregate function"""
+    if isinstance(q, list):
+        q = {'steps': q}
+    elif not isinstance(q, dict):
+        q = q.to_dict()
+    aggregates = {}
+    steps = list(q.get('steps', []))
+    while steps:
+        step = steps.pop()
+        steps.extend(step.get('steps', []))
+        for field in step.get('fields', []):
+            match = _FUNCTION.match(field.get('expression', ''))
+            aggregates[field['name']] = match.group(1) if match else None
+    return aggregates
+
+
+def merge_results(results, aggregates=None):
+    """Combine per-shard query results into one, without modifying them"""
+    merged = None
+    for result in results:
+        merged = _merge(merged, result, aggregates or {}, None)
+    return merged
+
+
+def _merge(left, right, aggregates, name):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if isinstance(left, dict) and isinstance(right, dict):
+        merged = dict(left)
+        for key, value in right.items():
+            if key in left:
+                value = _merge(left[key], value, aggregates, key)
+            merged[key] = value
+        return merged
+    if (
+        isinstance(left, (int, float)) and
+        isinstance(right, (int, float)) and
+        not isinstance(left, bool) and
+        not isinstance(right, bool)
+    ):
+        function = aggregates.get(name, 'sum')
+        if function not in _MERGES:
+            raise ValueError(
+                'Cannot merge %s results across shards' % (function or name)
+            )
+        return _MERGES[function](left, right)
+    raise ValueError('Cannot merge %r and %r across shards' % (left, right))
+
+
+class ShardedSkyClient(object):
+
+    def __init__(
+        self,
+        nodes,
+        shard_func=None,
+        replicas=DEFAULT_REPLICAS,
+        concurrency=None,
+        **kwargs
+    ):
+        """
+        ``nodes`` are SkyClient instances, ``(host, port)`` pairs or
+        ``'host:port'`` strings; the rest of ``kwargs`` configure the
+        clients made for the latter two. ``shard_func`` maps an object id
+        to an index into ``nodes`` and defaults to a HashRing.
+        """
+        self.clients = [self.make_client(node, kwargs) for node in nodes]
+        if shard_func is None:
+            shard_func = HashRing(
+                ['%s:%s' % (c.host, c.port) for c in self.clients],
+                replicas
+            )
+        self.shard_func = shard_func
+        self.concurrency = concurrency or len(self.clients)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def make_client(self, node, kwargs):
+        if isinstance(node, SkyClient):
+            return node
+        if isinstance(node, str):
+            host, port = node.rsplit(':', 1)
+            node = (host, int(port))
+        return SkyClient(node[0], node[1], **kwargs)
+
+    def client_for(self, object_id):
+        return self.clients[self.shard_func(object_id)]
+
+    def map_shards(self, func, clients=None):
+        """Call ``func(client)`` for every shard in parallel"""
+        return list(self.get_executor().map(func, clients or self.clients))
+
+    # TABLE API
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self.get_table(name)
+
+    def get_tables(self):
+        tables = self.clients[0].get_tables()
+        for table in tables:
+            table.client = self
+        return tables
+
+    def get_table(self, name):
+        table = self.clients[0].get_table(name)
+        table.client = self
+        return table
+
+    def create_table(self, table):
+        for client in self.clients:
+            client.create_table(table)
+        table.client = self
+        return table
+
+    def delete_table(self, table):
+        for client in self.clients:
+            client.delete_table(table)
+        return None
+
+    # PROPERTIES API
+    #
+    # Every shard holds the same schema, so reads come from the first and
+    # changes go to all of them
+
+    def get_properties(self, table):
+        return self.clients[0].get_properties(table)
+
+    def get_property(self, table, name):
+        return self.clients[0].get_property(table, name)
+
+    def create_property(self, table, prop):
+        for client in self.clients:
+            client.create_property(table, prop)
+        return prop
+
+    def update_property(self, table, property_name, prop):
+        for client in self.clients:
+            client.update_property(table, property_name, prop)
+        return prop
+
+    def delete_property(self, table, prop):
+        for client in self.clients:
+            client.delete_property(table, prop)
+        return None
+
+    def refresh_schema(self, table_name=None):
+        for client in self.clients:
+            client.refresh_schema(table_name)
+
+    def invalidate_factors(self, table, property_name=None):
+        for client in self.clients:
+            client.invalidate_factors(table, property_name)
+
+    # EVENT API
+
+    def get_events(self, table, object_id, **kwargs):
+        return self.client_for(object_id).get_events(
+            table,
+            object_id,
+            **kwargs
+        )
+
+    def iter_events(self, table, object_id, **kwargs):
+        return self.client_for(object_id).iter_events(
+            table,
+            object_id,
+            **kwargs
+        )
+
+    def iter_event_dicts(self, table, object_id, **kwargs):
+        return self.client_for(object_id).iter_event_dicts(
+            table,
+            object_id,
+            **kwargs
+        )
+
+    def iter_frames(self, table, object_id, **kwargs):
+        return self.client_for(object_id).iter_frames(
+            table,
+            object_id,
+            **kwargs
+        )
+
+    def iter_pages(self, table, object_id, **kwargs):
+        return self.client_for(object_id).iter_pages(
+            table,
+            object_id,
+            **kwargs
+        )
+
+    def get_events_many(
+        self,
+        table,
+        object_ids,
+        concurrency=DEFAULT_FETCH_CONCURRENCY,
+        ordered=True,
+        **kwargs
+    ):
+        """
+        SkyClient.get_events_many, fetching each object from its own shard
+        """
+        def run(item):
+            index, object_id = item
+            start = time.time()
+            try:
+                events = self.get_events(table, object_id, **kwargs)
+                error = None
+            except (requests.RequestException, ValueError) as e:
+                events, error = None, e
+            return EventsResult(
+                index,
+                object_id,
+                events,
+                error,
+                time.time() - start
+            )
+
+        imap = imap_bounded if ordered else imap_unordered_bounded
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for result in imap(
+                executor,
+                run,
+                enumerate(object_ids),
+                concurrency * 2
+            ):
+                yield result
+
+    def get_event(self, table, object_id, timestamp):
+        return self.client_for(object_id).get_event(
+            table,
+            object_id,
+            timestamp
+        )
+
+    def create_event(self, table, object_id, event, replace=True):
+        return self.client_for(object_id).create_event(
+            table,
+            object_id,
+            event,
+            replace
+        )
+
+    def create_events(self, table, events, **kwargs):
+        """
+        Route ``(object_id, event)`` pairs to their shards as they are
+        read, writing each shard's events once ``batch_size`` of them are
+        buffered. A shard has at most one write under way, so no more
+        than two batches per shard are held at once. Failure indexes refer
+        to positions in ``events``, as they do for SkyClient.create_events.
+        """
+        batch_size = kwargs.get('batch_size', bulk.DEFAULT_BATCH_SIZE)
+        executor = self.get_executor()
+        result = bulk.BulkResult()
+        buffers = [[] for _ in self.clients]
+        writes = [None for _ in self.clients]
+
+        def write(shard, items):
+            return items, self.clients[shard].create_events(
+                table,
+                [item for index, item in items],
+                **kwargs
+            )
+
+        def wait(shard):
+            future, writes[shard] = writes[shard], None
+            if future is None:
+                return
+            items, share = future.result()
+            result.written += share.written
+            for failure in share.failures:
+                result.failures.append(
+                    failure._replace(index=items[failure.index][0])
+                )
+
+        def flush(shard):
+            wait(shard)
+            writes[shard] = executor.submit(write, shard, buffers[shard])
+            buffers[shard] = []
+
+        try:
+            for index, (object_id, event) in enumerate(events):
+                shard = self.shard_func(object_id)
+                buffers[shard].append((index, (object_id, event)))
+                if len(buffers[shard]) >= batch_size:
+                    flush(shard)
+            for shard, items in enumerate(buffers):
+                if items:
+                    flush(shard)
+        finally:
+            # Writes already started are seen through even if ``events``
+            # raised, so none are left running behind the caller's back
+            for shard in range(len(self.clients)):
+                wait(shard)
+        result.failures.sort(key=lambda failure: failure.index)
+        return result
+
+    def delete_event(self, table, object_id, event):
+        return self.client_for(object_id).delete_event(
+            table,
+            object_id,
+            event
+        )
+
+    # QUERY API
+
+    def query(self, table, q):
+        if isinstance(q, Query):
+            q = q.compile()
+        results = self.map_shards(lambda client: client.query(table, q))
+        return merge_results(results, query_aggregates(q))
+
+    def query_many(
+        self,
+        queries,
+        concurrency=DEFAULT_QUERY_CONCURRENCY,
+        ordered=True
+    ):
+        """
+        SkyClient.query_many, each query run on every shard and merged.
+        The shards of one query are already queried in parallel, so
+        ``concurrency`` bounds how many queries are under way at once.
+        """
+        def run(item):
+            index, (table, q) = item
+            start = time.time()
+            try:
+                result, error = self.query(table, q), None
+            except (requests.RequestException, ValueError) as e:
+                result, error = None, e
+            return QueryResult(
+                index,
+                table,
+                q,
+                result,
+                error,
+                time.time() - start
+            )
+
+        imap = imap_bounded if ordered else imap_unordered_bounded
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for result in imap(
+                executor,
+                run,
+                enumerate(queries),
+                concurrency * 2
+            ):
+                yield result
+
+    def compile_query(self, table, q):
+        return q.compile(self.get_properties(table))
+
+    def invalidate_query_cache(self, table):
+        for client in self.clients:
+            client.invalidate_query_cache(table)
+
+    # UTILITY API
+
+    def ping(self):
+        return all(self.map_shards(lambda client: client.ping()))
+
+    # CONNECTION MANAGEMENT
+
+    def get_executor(self):
+        executor = self._executor
+        if executor is None:
+            with self._executor_lock:
+                executor = self._executor
+                if executor is None:
+                    executor = self._executor = ThreadPoolExecutor(
+                        max_workers=self.concurrency
+                    )
+        return executor
+
+    def close(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+        for client in self.clients:
+            client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
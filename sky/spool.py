@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+A durable on-disk spool of events waiting to be written to Sky.
+
+The spool is a directory of fixed size segment files, each preallocated
+and memory mapped, holding records appended one after another::
+
+    >II length, crc32 of the payload
+    payload   JSON {"table", "id", "timestamp", "data", "replace"}
+
+A zero length marks the end of a segment's records. Appends are made
+durable in batches: the mapping is flushed every ``sync_every`` records
+or ``sync_interval`` seconds, and whenever a segment fills up. A record
+torn by a crash fails its checksum, and the segment is cut off there when
+the spool is next opened.
+
+``replay`` writes segments back oldest first with bulk writes and deletes
+each one once all of its events are in or rejected. A replay that stops
+part way through a segment, the server being unreachable, starts that
+segment again next time. This is safe
+because a PUT of an (object_id, timestamp) event is idempotent, and so is
+merging the same data twice.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from . import bulk
+from . import codec as codecs
+from . import resources
+from .policy import is_unreachable
+
+
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024
+DEFAULT_SYNC_EVERY = 1000
+DEFAULT_SYNC_INTERVAL = 1.0
+
+DEFAULT_MAX_ATTEMPTS = 10
+
+SEGMENT_SUFFIX = '.seg'
+# Events replay gave up on, one JSON record per line
+DEAD_LETTER_NAME = 'rejected.ndjson'
+
+_HEADER = struct.Struct('>II')
+
+
+class Segment(object):
+
+    def __init__(self, path, size=None):
+        """Open the segment at ``path``, creating it with ``size`` bytes"""
+        self.path = path
+        if size is not None:
+            _create(path, size)
+        self.fd = os.open(path, os.O_RDWR)
+        self.size = os.fstat(self.fd).st_size
+        self.map = mmap.mmap(self.fd, self.size)
+        self.offset, self.count = self.scan()
+
+    def scan(self):
+        """Find the end of the valid records"""
+        offset = count = 0
+        for offset, payload in self.iter_records():
+            count += 1
+        end = offset
+        if count:
+            end = offset + _HEADER.size + len(payload)
+        if end < self.size:
+            # Clear whatever a crash left behind the last good record
+            self.map[end:end + _HEADER.size] = b'\0' * min(
+                _HEADER.size,
+                self.size - end
+            )
+        return end, count
+
+    def iter_records(self):
+        offset = 0
+        while offset + _HEADER.size <= self.size:
+            length, crc = _HEADER.unpack_from(self.map, offset)
+            start = offset + _HEADER.size
+            if not length or start + length > self.size:
+                return
+            payload = self.map[start:start + length]
+            if zlib.crc32(payload) & 0xffffffff != crc:
+                return
+            yield offset, payload
+            offset = start + length
+
+    def fits(self, payload):
+        return self.offset + _HEADER.size + len(payload) <= self.size
+
+    def append(self, payload):
+        start = self.offset + _HEADER.size
+        end = start + len(payload)
+        self.map[start:end] = payload
+        # The header goes last, so a record is never valid before its
+        # payload is in place
+        _HEADER.pack_into(
+            self.map,
+            self.offset,
+            len(payload),
+            zlib.crc32(payload) & 0xffffffff
+        )
+        self.offset = end
+        self.count += 1
+
+    def sync(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        os.close(self.fd)
+
+
+def _create(path, size):
+    # Fully sized before it gets its real name, so a crash mid rollover
+    # leaves a stray .tmp file rather than a short segment
+    tmp = path + '.tmp'
+    fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, size)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.rename(tmp, path)
+    _sync_directory(os.path.dirname(path))
+
+
+def _sync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:  # Windows cannot open directories
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Spool(object):
+
+    def __init__(
+        self,
+        directory,
+        segment_bytes=DEFAULT_SEGMENT_BYTES,
+        sync_every=DEFAULT_SYNC_EVERY,
+        sync_interval=DEFAULT_SYNC_INTERVAL,
+        codec=None,
+        clock=time.time
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.codec = codecs.get_codec(codec)
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._unsynced = 0
+        self._synced_at = clock()
+        # Replays in a row stopped on the oldest segment
+        self._attempts = 0
+        self.rejected = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for name in os.listdir(directory):
+            if name.endswith(SEGMENT_SUFFIX + '.tmp'):
+                os.remove(os.path.join(directory, name))
+        self._sealed = self.segment_paths()
+        self._active = None
+        self._next = 0
+        if self._sealed:
+            self._next = _segment_number(self._sealed[-1]) + 1
+            # Carry on appending to the newest segment
+            self._active = Segment(self._sealed.pop())
+        self.pending = sum(
+            self._count(path) for path in self._sealed
+        ) + (self._active.count if self._active else 0)
+
+    def segment_paths(self):
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _count(self, path):
+        segment = Segment(path)
+        try:
+            return segment.count
+        finally:
+            segment.close()
+
+    # WRITING
+
+    def append(self, table, object_id, event, replace=True):
+        self.extend(table, [(object_id, event)], replace)
+
+    def extend(self, table, events, replace=True):
+        """Spool ``(object_id, event)`` pairs for ``table``"""
+        with self._lock:
+            for object_id, event in events:
+                obj = event.to_dict()
+                obj['id'] = object_id
+                obj['table'] = table.name
+                obj['replace'] = replace
+                self._append(self.codec.dumps(obj))
+            if (
+                self._unsynced >= self.sync_every or
+                self.clock() - self._synced_at >= self.sync_interval
+            ):
+                self.sync()
+
+    def _append(self, payload):
+        segment = self._active
+        if segment is None or not segment.fits(payload):
+            if _HEADER.size + len(payload) > self.segment_bytes:
+                raise ValueError(
+                    'Event of %d bytes does not fit in a %d byte segment' % (
+                        len(payload),
+                        self.segment_bytes
+                    )
+                )
+            self.roll()
+            segment = self._active = Segment(
+                os.path.join(
+                    self.directory,
+                    '%020d%s' % (self._next, SEGMENT_SUFFIX)
+                ),
+                self.segment_bytes
+            )
+            self._next += 1
+        segment.append(payload)
+        self.pending += 1
+        self._unsynced += 1
+
+    def roll(self):
+        """Seal the active segment; the next append starts a new one"""
+        with self._lock:
+            segment, self._active = self._active, None
+            if segment is not None:
+                segment.close()
+                self._sealed.append(segment.path)
+                self._unsynced = 0
+                self._synced_at = self.clock()
+
+    def sync(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.sync()
+            self._unsynced = 0
+            self._synced_at = self.clock()
+
+    # REPLAY
+
+    def records(self, path):
+        """Yield (table name, replace, object_id, event) from a segment"""
+        segment = Segment(path)
+        try:
+            for offset, payload in segment.iter_records():
+                obj = self.codec.loads(payload)
+                yield (
+                    obj['table'],
+                    obj.get('replace', True),
+                    obj['id'],
+                    resources.Event.from_dict_fast(obj)
+                )
+        finally:
+            segment.close()
+
+    def replay(
+        self,
+        client,
+        batch_size=bulk.DEFAULT_BATCH_SIZE,
+        on_failure=None,
+        max_attempts=DEFAULT_MAX_ATTEMPTS
+    ):
+        """
+        Write spooled events to ``client`` oldest first, deleting each
+        segment once it is fully written, and return the number of events
+        written.
+
+        A batch the server could not take (see policy.is_unreachable)
+        stops the replay, leaving that segment for the next one. Events
+        the server rejects outright are passed over: to ``on_failure`` as
+        (table, failures) when given, and to the dead letter file in the
+        spool directory otherwise. So are events still failing after
+        ``max_attempts`` replays in a row have stopped on their segment,
+        so that one event the server always fails cannot hold back the
+        rest for good.
+        """
+        with self._lock:
+            self.roll()
+            written = 0
+            while self._sealed:
+                path = self._sealed[0]
+                count = 0
+                batches = self._batches(path, batch_size)
+                try:
+                    for (name, replace), events in batches:
+                        table = resources.Table(name=name, client=client)
+                        result = client.create_events(
+                            table,
+                            events,
+                            replace=replace,
+                            batch_size=batch_size
+                        )
+                        written += result.written
+                        failures = result.failures
+                        if any(is_unreachable(f.error) for f in failures):
+                            self._attempts += 1
+                            if self._attempts < max_attempts:
+                                return written
+                        if failures:
+                            self._reject(table, replace, failures, on_failure)
+                        count += len(events)
+                finally:
+                    batches.close()
+                os.remove(path)
+                _sync_directory(self.directory)
+                self._sealed.pop(0)
+                self.pending -= count
+                self._attempts = 0
+            return written
+
+    def _reject(self, table, replace, failures, on_failure):
+        self.rejected += len(failures)
+        if on_failure is not None:
+            on_failure(table, failures)
+            return
+        with open(os.path.join(self.directory, DEAD_LETTER_NAME), 'ab') as f:
+            for failure in failures:
+                obj = failure.event.to_dict()
+                obj['id'] = failure.object_id
+                obj['table'] = table.name
+                obj['replace'] = replace
+                obj['error'] = str(failure.error)
+                f.write(self.codec.dumps(obj) + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _batches(self, path, batch_size):
+        key = None
+        events = []
+        for name, replace, object_id, event in self.records(path):
+            if (name, replace) != key or len(events) >= batch_size:
+                if events:
+                    yield key, events
+                key = (name, replace)
+                events = []
+            events.append((object_id, event))
+        if events:
+            yield key, events
+
+    def close(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.close()
+                self._sealed.append(self._active.path)
+                self._active = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _segment_number(path):
+    return int(os.path.basename(path)[:-len(SEGMENT_SUFFIX)])
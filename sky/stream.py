@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import codecs
+import json
+import re
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_BUFFER = 16 * 1024 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_CHARS = re.compile(r'[0-9.eE+-]*')
+
+_START, _FIRST_ITEM, _ITEM, _SEPARATOR, _END = range(5)
+
+
+class JSONArrayDecoder(object):
+    """
+    Incrementally decode a top level JSON array fed in arbitrary byte
+    chunks, returning each element as soon as it is complete.
+
+    Only the undecoded tail is kept, so memory is bounded by the chunk size
+    plus the largest single element; ``max_buffer`` caps that so malformed
+    input cannot make the buffer grow without limit.
+    """
+
+    def __init__(self, max_buffer=DEFAULT_MAX_BUFFER, decoder=None):
+        self.max_buffer = max_buffer
+        self.decoder = decoder or json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._state = _START
+
+    def feed(self, chunk):
+        buf = self._buffer + self._text.decode(chunk)
+        items = []
+        pos = 0
+        end = len(buf)
+        state = self._state
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos == end:
+                break
+            char = buf[pos]
+            if state == _START:
+                if char != '[':
+                    raise ValueError('Expected a JSON array')
+                state = _FIRST_ITEM
+                pos += 1
+            elif state == _SEPARATOR or (state == _FIRST_ITEM and char == ']'):
+                if char == ']':
+                    state = _END
+                elif char == ',' and state == _SEPARATOR:
+                    state = _ITEM
+                else:
+                    raise ValueError('Unexpected %r at %d' % (char, pos))
+                pos += 1
+            elif state == _END:
+                raise ValueError('Unexpected data after JSON array')
+            else:
+                try:
+                    item, item_end = self.decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # Most likely an element split across chunks
+                    break
+                if (
+                    buf[item_end - 1] in '0123456789' and
+                    _NUMBER_CHARS.match(buf, item_end).end() == end
+                ):
+                    # A number ending the buffer may be missing digits
+                    break
+                items.append(item)
+                pos = item_end
+                state = _SEPARATOR
+        self._buffer = buf[pos:]
+        self._state = state
+        if len(self._buffer) > self.max_buffer:
+            raise ValueError(
+                'JSON array element exceeds max_buffer of %d characters' % (
+                    self.max_buffer
+                )
+            )
+        return items
+
+    def close(self):
+        # Raises on a multi-byte character cut short by the end of input
+        self._text.decode(b'', final=True)
+        items = self.feed(b'')
+        if self._state != _END or self._buffer:
+            raise ValueError('Truncated or malformed JSON array')
+        return items
+
+
+def iter_json_array(chunks, max_buffer=DEFAULT_MAX_BUFFER):
+    decoder = JSONArrayDecoder(max_buffer)
+    for chunk in chunks:
+        for item in decoder.feed(chunk):
+            yield item
+    for item in decoder.close():
+        yield item
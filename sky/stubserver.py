@@ -0,0 +1,546 @@
+# -*- coding: utf-8 -*-
+"""
+An in-process server speaking enough of the Sky HTTP API for SkyClient:
+tables, properties, events (one at a time, in bulk and windowed), queries
+and ping. Everything is kept in memory. It is meant for tests and
+benchmarks, not for data anyone wants to keep.
+
+    with SkyStubServer() as server:
+        client = SkyClient(server.host, server.port)
+        ...
+
+Faults can be injected, and changed while it runs:
+
+``latency``       seconds added to every request
+``jitter``        up to this many more seconds, uniformly at random
+``error_rate``    fraction of requests answered with ``error_status``
+``slow_rate``     fraction of requests delayed a further ``slow_latency``
+                  seconds, giving a latency tail
+
+Queries are run with sky.analytics.LocalQuery, less the distinct and
+histogram fields the server does not have. Session idle time is ignored.
+"""
+import json
+import random
+import re
+import threading
+import time
+
+from collections import namedtuple
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from . import analytics
+from . import timestamp as ts
+from . import wire
+from .query import QueryError
+from .resources import Property
+
+
+StubRequest = namedtuple('StubRequest', ('body', 'params', 'content_type'))
+
+
+class StubError(Exception):
+
+    def __init__(self, status, message):
+        super(StubError, self).__init__(message)
+        self.status = status
+
+
+# QUERIES
+
+# The server's aggregates; LocalQuery has distinct and histogram as well
+_SERVER_FUNCTIONS = ('count', 'sum', 'min', 'max')
+
+_FUNCTION_RE = re.compile(r'^\s*(\w+)\s*\(')
+
+
+def check_steps(steps):
+    """Raise StubError for fields the server has no aggregate for"""
+    for step in steps:
+        for field in step.get('fields') or []:
+            expression = field.get('expression', '')
+            match = _FUNCTION_RE.match(expression)
+            if match is not None and match.group(1) not in _SERVER_FUNCTIONS:
+                raise StubError(400, 'Unsupported field: %s' % expression)
+        check_steps(step.get('steps') or [])
+
+
+def run_query(query, objects):
+    """
+    Evaluate ``query`` over ``objects``, each a list of (micros, data)
+    pairs in timestamp order, with sky.analytics.LocalQuery
+    """
+    check_steps(query.get('steps') or [])
+    try:
+        return analytics.LocalQuery(query).run(objects)
+    except QueryError as e:
+        raise StubError(400, str(e))
+
+
+# STORAGE
+
+class StubTable(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.properties = {}
+        self.objects = {}
+        self._next_id = 1
+        self._next_transient_id = -1
+
+    def to_dict(self):
+        return {'name': self.name}
+
+    def create_property(self, obj):
+        name = obj.get('name')
+        if not name:
+            raise StubError(400, 'Property name required')
+        if name in self.properties:
+            raise StubError(400, 'Property already exists: %s' % name)
+        data_type = obj.get('data_type', Property.DATA_TYPE_STRING)
+        if data_type not in Property.DATA_TYPES:
+            raise StubError(400, 'Invalid data type: %s' % data_type)
+        transient = bool(obj.get('transient', False))
+        if transient:
+            property_id = self._next_transient_id
+            self._next_transient_id -= 1
+        else:
+            property_id = self._next_id
+            self._next_id += 1
+        prop = self.properties[name] = {
+            'id': property_id,
+            'name': name,
+            'transient': transient,
+            'data_type': data_type,
+        }
+        return prop
+
+    def get_property(self, name):
+        try:
+            return self.properties[name]
+        except KeyError:
+            raise StubError(404, 'Property not found: %s' % name)
+
+    def rename_property(self, name, obj):
+        prop = self.get_property(name)
+        new_name = obj.get('name') or name
+        if new_name != name:
+            if new_name in self.properties:
+                raise StubError(400, 'Property already exists: %s' % new_name)
+            del self.properties[name]
+            self.properties[new_name] = prop
+            prop['name'] = new_name
+            for events in self.objects.values():
+                for event in events.values():
+                    if name in event['data']:
+                        event['data'][new_name] = event['data'].pop(name)
+        return prop
+
+    def delete_property(self, name):
+        self.get_property(name)
+        del self.properties[name]
+        for events in self.objects.values():
+            for event in events.values():
+                event['data'].pop(name, None)
+
+    def check_data(self, data):
+        if not isinstance(data, dict):
+            raise StubError(400, 'Event data must be an object')
+        for name in data:
+            if name not in self.properties:
+                raise StubError(400, 'Property not found: %s' % name)
+
+    def put_event(self, object_id, timestamp, data, replace):
+        self.check_data(data)
+        micros = _micros(timestamp)
+        events = self.objects.setdefault(object_id, {})
+        event = events.get(micros)
+        if event is None or replace:
+            event = events[micros] = {
+                'timestamp': ts.dumps_micros(micros),
+                'data': dict(data),
+            }
+        else:
+            event['data'].update(data)
+        return event
+
+    def get_event(self, object_id, timestamp):
+        event = self.objects.get(object_id, {}).get(_micros(timestamp))
+        if event is None:
+            raise StubError(404, 'Event not found')
+        return event
+
+    def delete_event(self, object_id, timestamp):
+        self.get_event(object_id, timestamp)
+        del self.objects[object_id][_micros(timestamp)]
+
+    def events(self, object_id):
+        """An object's (micros, event) pairs in timestamp order"""
+        return sorted(self.objects.get(object_id, {}).items())
+
+
+def _micros(timestamp):
+    try:
+        return ts.loads_micros(timestamp)
+    except (TypeError, ValueError):
+        raise StubError(400, 'Invalid timestamp: %s' % timestamp)
+
+
+# HTTP
+
+_ROUTES = [
+    (re.compile(pattern), methods)
+    for pattern, methods in (
+        (r'^/ping$', {'get': 'ping'}),
+        (r'^/tables$', {'get': 'get_tables', 'post': 'create_table'}),
+        (
+            r'^/tables/([^/]+)$',
+            {'get': 'get_table', 'delete': 'delete_table'}
+        ),
+        (
+            r'^/tables/([^/]+)/properties$',
+            {'get': 'get_properties', 'post': 'create_property'}
+        ),
+        (
+            r'^/tables/([^/]+)/properties/([^/]+)$',
+            {
+                'get': 'get_property',
+                'patch': 'update_property',
+                'delete': 'delete_property',
+            }
+        ),
+        (
+            r'^/tables/([^/]+)/events$',
+            {'put': 'put_events', 'patch': 'patch_events'}
+        ),
+        (
+            r'^/tables/([^/]+)/objects/([^/]+)/events$',
+            {'get': 'get_events'}
+        ),
+        (
+            r'^/tables/([^/]+)/objects/([^/]+)/events/([^/]+)$',
+            {
+                'get': 'get_event',
+                'put': 'put_event',
+                'patch': 'patch_event',
+                'delete': 'delete_event',
+            }
+        ),
+        (r'^/tables/([^/]+)/query$', {'get': 'query', 'post': 'query'}),
+    )
+]
+
+
+class SkyStubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, so without this keep-alive
+    # connections stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def read_body(self):
+        if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+                if not size:
+                    return b''.join(chunks)
+        length = int(self.headers.get('content-length') or 0)
+        return self.rfile.read(length)
+
+    def handle_any(self):
+        body = self.read_body()
+        server = self.server
+        status = server.inject_faults()
+        if status is not None:
+            obj = {'message': 'Injected failure'}
+        else:
+            try:
+                status, obj = 200, server.dispatch(
+                    self.command.lower(),
+                    self.path,
+                    body,
+                    self.headers.get('content-type', '')
+                )
+            except StubError as e:
+                status, obj = e.status, {'message': str(e)}
+        content = json.dumps(obj, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = handle_any
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SkyStubServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host='127.0.0.1',
+        port=0,
+        latency=0,
+        jitter=0,
+        error_rate=0,
+        error_status=503,
+        slow_rate=0,
+        slow_latency=1.0,
+        supports_windows=True,
+        compact_events=True,
+        seed=None
+    ):
+        HTTPServer.__init__(self, (host, port), SkyStubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        # When False the start, end, limit and cursor parameters of event
+        # reads are ignored, as an older server would
+        self.supports_windows = supports_windows
+        # Whether bulk writes take the sky.wire encoding, when msgpack is
+        # installed
+        self.compact_events = compact_events
+        self.random = random.Random(seed)
+        self.tables = {}
+        self.requests = 0
+        self.lock = threading.RLock()
+        self.thread = None
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        # A short poll interval so that stop does not wait half a second
+        self.thread = threading.Thread(
+            target=self.serve_forever,
+            kwargs={'poll_interval': 0.05}
+        )
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def reset(self):
+        """Forget every table"""
+        with self.lock:
+            self.tables.clear()
+
+    def inject_faults(self):
+        """Sleep as configured, returning an error status to fail with"""
+        with self.lock:
+            self.requests += 1
+            delay = self.latency
+            if self.jitter:
+                delay += self.random.uniform(0, self.jitter)
+            if self.slow_rate and self.random.random() < self.slow_rate:
+                delay += self.slow_latency
+            failed = self.error_rate and self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return self.error_status
+        return None
+
+    def dispatch(self, method, path, body, content_type=''):
+        parts = urlsplit(path)
+        for pattern, methods in _ROUTES:
+            match = pattern.match(parts.path)
+            if match is None:
+                continue
+            if method not in methods:
+                raise StubError(405, 'Method not allowed')
+            request = StubRequest(
+                body,
+                dict(parse_qsl(parts.query)),
+                content_type.split(';')[0].strip().lower()
+            )
+            args = [unquote(arg) for arg in match.groups()]
+            with self.lock:
+                return getattr(self, 'handle_' + methods[method])(
+                    request,
+                    *args
+                )
+        raise StubError(404, 'Not found')
+
+    def table(self, name):
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise StubError(404, 'Table not found: %s' % name)
+
+    # HANDLERS
+
+    def handle_ping(self, request):
+        return {'message': 'ok'}
+
+    def handle_get_tables(self, request):
+        return [self.tables[name].to_dict() for name in sorted(self.tables)]
+
+    def handle_create_table(self, request):
+        name = _loads(request.body).get('name')
+        if not name:
+            raise StubError(400, 'Table name required')
+        if name in self.tables:
+            raise StubError(400, 'Table already exists: %s' % name)
+        self.tables[name] = StubTable(name)
+        return self.tables[name].to_dict()
+
+    def handle_get_table(self, request, name):
+        return self.table(name).to_dict()
+
+    def handle_delete_table(self, request, name):
+        self.table(name)
+        del self.tables[name]
+        return {}
+
+    def handle_get_properties(self, request, name):
+        table = self.table(name)
+        return sorted(table.properties.values(), key=lambda p: p['id'])
+
+    def handle_create_property(self, request, name):
+        return self.table(name).create_property(_loads(request.body))
+
+    def handle_get_property(self, request, name, prop):
+        return self.table(name).get_property(prop)
+
+    def handle_update_property(self, request, name, prop):
+        return self.table(name).rename_property(prop, _loads(request.body))
+
+    def handle_delete_property(self, request, name, prop):
+        self.table(name).delete_property(prop)
+        return {}
+
+    def handle_get_events(self, request, name, object_id):
+        events = self.table(name).events(object_id)
+        if self.supports_windows:
+            events = _window(events, request.params)
+        return [event for _, event in events]
+
+    def handle_get_event(self, request, name, object_id, timestamp):
+        return self.table(name).get_event(object_id, timestamp)
+
+    def handle_put_event(self, request, name, object_id, timestamp):
+        data = _loads(request.body).get('data', {})
+        return self.table(name).put_event(object_id, timestamp, data, True)
+
+    def handle_patch_event(self, request, name, object_id, timestamp):
+        data = _loads(request.body).get('data', {})
+        return self.table(name).put_event(object_id, timestamp, data, False)
+
+    def handle_delete_event(self, request, name, object_id, timestamp):
+        self.table(name).delete_event(object_id, timestamp)
+        return {}
+
+    def handle_put_events(self, request, name):
+        return self.put_events(name, request, True)
+
+    def handle_patch_events(self, request, name):
+        return self.put_events(name, request, False)
+
+    def put_events(self, name, request, replace):
+        table = self.table(name)
+        if request.content_type == wire.MSGPACK_CONTENT_TYPE:
+            if not self.compact_events or wire.msgpack is None:
+                raise StubError(415, 'Unsupported content type')
+            props = [
+                Property(p['id'], p['name'], p['transient'], p['data_type'])
+                for p in table.properties.values()
+            ]
+            try:
+                objs = [
+                    dict(obj, id=object_id)
+                    for object_id, obj in wire.decode_events(
+                        request.body,
+                        props
+                    )
+                ]
+            except (ValueError, TypeError) as e:
+                raise StubError(400, 'Invalid body: %s' % e)
+        else:
+            objs = [
+                _loads(line)
+                for line in request.body.splitlines()
+                if line.strip()
+            ]
+        # All or nothing, so check everything before writing anything
+        for obj in objs:
+            if obj.get('id') is None:
+                raise StubError(400, 'Event object id required')
+            table.check_data(obj.get('data', {}))
+            _micros(obj.get('timestamp'))
+        for obj in objs:
+            table.put_event(
+                str(obj['id']),
+                obj['timestamp'],
+                obj.get('data', {}),
+                replace
+            )
+        return {'count': len(objs)}
+
+    def handle_query(self, request, name):
+        table = self.table(name)
+        query = _loads(request.body)
+        objects = [
+            [(micros, event['data']) for micros, event in table.events(o)]
+            for o in sorted(table.objects)
+        ]
+        return run_query(query, objects)
+
+
+def _loads(body):
+    if not body:
+        return {}
+    try:
+        obj = json.loads(body.decode('utf-8'))
+    except ValueError:
+        raise StubError(400, 'Invalid JSON')
+    if not isinstance(obj, dict):
+        raise StubError(400, 'Expected a JSON object')
+    return obj
+
+
+def _window(events, params):
+    """Apply the start, end, cursor and limit parameters of an event read"""
+    if 'start' in params:
+        start = _micros(params['start'])
+        events = [item for item in events if item[0] >= start]
+    if 'cursor' in params:
+        cursor = _micros(params['cursor'])
+        events = [item for item in events if item[0] > cursor]
+    if 'end' in params:
+        end = _micros(params['end'])
+        events = [item for item in events if item[0] < end]
+    if 'limit' in params:
+        try:
+            events = events[:int(params['limit'])]
+        except ValueError:
+            raise StubError(400, 'Invalid limit: %s' % params['limit'])
+    return events
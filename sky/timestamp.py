@@ -1,19 +1,119 @@
 # -*- coding: utf-8 -*-
 import pytz
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
 
+UTC = pytz.utc
+
+# Every timestamp Sky sends matches TIMESTAMP_FORMAT with all six
+# fractional digits, e.g. 2014-02-21T10:10:23.000203Z, so those are parsed
+# by position and anything else goes through strptime
+_FIXED_LENGTH = 27
+_DUMPS_FORMAT = '%04d-%02d-%02dT%02d:%02d:%02d.%06dZ'
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = _EPOCH.replace(tzinfo=UTC)
+_ONE_MICRO = timedelta(microseconds=1)
+
+
+def _is_fixed(s):
+    return (
+        len(s) == _FIXED_LENGTH and
+        s[26] == 'Z' and
+        s[19] == '.' and
+        s[10] == 'T'
+    )
+
+
+_fromisoformat = datetime.fromisoformat
+
+
+def _strptime_loads(s, timezone):
+    return datetime.strptime(s, TIMESTAMP_FORMAT).replace(tzinfo=timezone)
+
 
 def loads(s, timezone=None):
     if timezone is None:
-        timezone = pytz.utc
-    return datetime.strptime(s, TIMESTAMP_FORMAT).replace(tzinfo=timezone)
+        timezone = UTC
+    if _is_fixed(s):
+        return _fromisoformat(s[:26]).replace(tzinfo=timezone)
+    return _strptime_loads(s, timezone)
 
 
 def dumps(timestamp):
-    if timestamp.tzinfo:
-        timestamp = timestamp.astimezone(pytz.utc)
-    return timestamp.strftime(TIMESTAMP_FORMAT)
+    tzinfo = timestamp.tzinfo
+    if tzinfo is not None and tzinfo is not UTC:
+        timestamp = timestamp.astimezone(UTC)
+    return _DUMPS_FORMAT % (
+        timestamp.year,
+        timestamp.month,
+        timestamp.day,
+        timestamp.hour,
+        timestamp.minute,
+        timestamp.second,
+        timestamp.microsecond
+    )
+
+
+def loads_many(strings, timezone=None):
+    if timezone is None:
+        timezone = UTC
+    is_fixed = _is_fixed
+    fromisoformat = _fromisoformat
+    return [
+        fromisoformat(s[:26]).replace(tzinfo=timezone) if is_fixed(s)
+        else _strptime_loads(s, timezone)
+        for s in strings
+    ]
+
+
+def dumps_many(timestamps):
+    return [dumps(timestamp) for timestamp in timestamps]
+
+
+# EPOCH MICROSECONDS
+#
+# Integer microseconds since 1970-01-01T00:00:00Z, for callers that only
+# compare, sort or bucket timestamps and have no use for datetime objects.
+# The conversions lean on datetime/timedelta arithmetic, which is C code.
+
+def loads_micros(s):
+    if _is_fixed(s):
+        return (_fromisoformat(s[:26]) - _EPOCH) // _ONE_MICRO
+    return to_micros(_strptime_loads(s, None))
+
+
+def dumps_micros(micros):
+    return dumps(_EPOCH + timedelta(microseconds=micros))
+
+
+def loads_micros_many(strings):
+    is_fixed = _is_fixed
+    fromisoformat = _fromisoformat
+    return [
+        (fromisoformat(s[:26]) - _EPOCH) // _ONE_MICRO if is_fixed(s)
+        else loads_micros(s)
+        for s in strings
+    ]
+
+
+def dumps_micros_many(values):
+    return [
+        dumps(_EPOCH + timedelta(microseconds=micros)) for micros in values
+    ]
+
+
+def to_micros(timestamp):
+    """Epoch microseconds of a datetime, naive datetimes being UTC"""
+    if timestamp.tzinfo is not None:
+        return (timestamp - _EPOCH_UTC) // _ONE_MICRO
+    return (timestamp - _EPOCH) // _ONE_MICRO
+
+
+def from_micros(micros, timezone=None):
+    if timezone is None:
+        timezone = UTC
+    return (_EPOCH + timedelta(microseconds=micros)).replace(tzinfo=timezone)
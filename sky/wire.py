@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Compact binary encoding for bulk event writes.
+
+Each event is a MessagePack array of ``[object_id, timestamp, data]``,
+where the timestamp is integer microseconds since the epoch and ``data``
+maps property ids to values, which must be of the property's declared
+type, so integers, floats and booleans take a few bytes rather than their
+JSON text; a value of another type fails its event with TypeError. A
+body is just the records one after another, as NDJSON has lines.
+
+Requires msgpack. SkyClient(event_encoding='msgpack') tries it on the
+first bulk batch and falls back to NDJSON if the server does not accept
+it.
+"""
+from . import timestamp as ts
+from .resources import Property
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+
+# Responses to a compact batch meaning the server cannot read it
+UNSUPPORTED_STATUS_CODES = (415,)
+# Responses meaning it may not read it, or that it rejected this batch;
+# whether the same batch goes in as NDJSON tells which
+AMBIGUOUS_STATUS_CODES = (400, 404, 405, 501)
+
+
+def _string(value):
+    if not isinstance(value, str):
+        raise TypeError()
+    return value
+
+
+def _integer(value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError()
+    return value
+
+
+def _float(value):
+    # Integers are widened, as JSON would read them
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise TypeError()
+    return float(value)
+
+
+def _boolean(value):
+    if not isinstance(value, bool):
+        raise TypeError()
+    return value
+
+
+# Check each value against its property's type rather than convert it, so
+# that a value JSON would send as it is never changes on the way
+_PACKERS = {
+    Property.DATA_TYPE_STRING: _string,
+    Property.DATA_TYPE_FACTOR: _string,
+    Property.DATA_TYPE_INTEGER: _integer,
+    Property.DATA_TYPE_FLOAT: _float,
+    Property.DATA_TYPE_BOOLEAN: _boolean,
+}
+
+
+class EventEncoder(object):
+    """Encodes events for one table, given its properties"""
+
+    def __init__(self, properties):
+        if msgpack is None:
+            raise ImportError('msgpack is not installed')
+        self.properties = dict(
+            (prop.name, (prop.object_id, _PACKERS[prop.data_type]))
+            for prop in properties
+        )
+        self._packer = msgpack.Packer(use_bin_type=True)
+
+    def pack_data(self, data):
+        packed = {}
+        properties = self.properties
+        for name, value in data.items():
+            try:
+                property_id, pack = properties[name]
+            except KeyError:
+                raise ValueError('Unknown property: %s' % name)
+            if value is None:
+                packed[property_id] = None
+                continue
+            try:
+                packed[property_id] = pack(value)
+            except TypeError:
+                raise TypeError('%s cannot hold %r' % (name, value))
+        return packed
+
+    def encode(self, object_id, event):
+        timestamp = event._timestamp
+        if timestamp is None:
+            micros = ts.loads_micros(event._raw_timestamp)
+        else:
+            micros = ts.to_micros(timestamp)
+        return self._packer.pack(
+            [object_id, micros, self.pack_data(event.data)]
+        )
+
+
+def decode_events(body, properties):
+    """
+    Decode a compact body back into (object_id, event dict) pairs, the
+    dicts shaped as Event.to_dict makes them
+    """
+    if msgpack is None:
+        raise ImportError('msgpack is not installed')
+    names = dict((prop.object_id, prop.name) for prop in properties)
+    unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+    unpacker.feed(body)
+    for object_id, micros, data in unpacker:
+        try:
+            data = dict(
+                (names[property_id], value)
+                for property_id, value in data.items()
+            )
+        except KeyError as e:
+            raise ValueError('Unknown property id: %s' % e.args[0])
+        yield object_id, {
+            'timestamp': ts.dumps_micros(micros),
+            'data': data,
+        }
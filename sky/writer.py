@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+Write-behind event buffering.
+
+    writer = BufferedEventWriter(client)
+    writer.add_event(table, 'user-1', event)   # returns straight away
+    ...
+    writer.close()                             # writes whatever is left
+
+Events go into a bounded in-memory queue that a background thread drains
+into bulk ``create_events`` calls once ``flush_size`` events are waiting or
+the oldest has waited ``flush_interval`` seconds. Events for the same
+object and timestamp within one flush are coalesced into a single write.
+Events still queued when the process dies are lost. Errors in the
+background thread, ``on_failure`` callbacks included, are logged and the
+thread carries on; should it stop all the same, add_event raises.
+
+Given a sky.spool.Spool, events the server could not be reached for are
+spooled to disk instead of being reported as failures. Once anything is
+spooled, later flushes go to the spool too so writes stay in order, and
+every ``retry_interval`` seconds the writer pings the server and replays
+the spool when it answers.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from collections import OrderedDict, deque
+
+from . import bulk
+from . import resources
+from .policy import is_unreachable
+
+
+DEFAULT_MAX_QUEUE = 10000
+DEFAULT_FLUSH_SIZE = bulk.DEFAULT_BATCH_SIZE
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_RETRY_INTERVAL = 5.0
+
+# What add_event does when the queue is full
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+RAISE = 'raise'
+
+BACKPRESSURE = (BLOCK, DROP_OLDEST, RAISE)
+
+log = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    pass
+
+
+class BufferedEventWriter(object):
+
+    def __init__(
+        self,
+        client,
+        max_queue=DEFAULT_MAX_QUEUE,
+        flush_size=DEFAULT_FLUSH_SIZE,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        backpressure=BLOCK,
+        block_timeout=None,
+        replace=True,
+        on_failure=None,
+        spool=None,
+        retry_interval=DEFAULT_RETRY_INTERVAL,
+        clock=time.time
+    ):
+        if backpressure not in BACKPRESSURE:
+            raise ValueError(
+                '%s is not a recognised backpressure mode' % backpressure
+            )
+        self.client = client
+        self.max_queue = max_queue
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.backpressure = backpressure
+        # How long BLOCK waits for room before raising BufferFull
+        self.block_timeout = block_timeout
+        self.replace = replace
+        # Called with (table, failures) for events the server rejected
+        self.on_failure = on_failure
+        self.spool = spool
+        self.retry_interval = retry_interval
+        self.clock = clock
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.written = 0
+        self.failed = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.flushes = 0
+        self.flush_seconds = 0.0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._oldest = None
+        self._next_retry = 0
+        # Sequence numbers: everything up to _done has been written (or
+        # dropped), flush() asks for everything up to _flush_to
+        self._done = 0
+        self._flush_to = 0
+        self._closed = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add_event(self, table, object_id, event):
+        with self._cond:
+            if self._closed:
+                raise ValueError('add_event on a closed writer')
+            self._check_thread()
+            if len(self._queue) >= self.max_queue:
+                self._make_room()
+            if not self._queue:
+                # Start the flush_interval clock
+                self._oldest = self.clock()
+                self._cond.notify_all()
+            self._queue.append((table, object_id, event))
+            self.enqueued += 1
+            if len(self._queue) >= self.flush_size:
+                self._cond.notify_all()
+
+    def _make_room(self):
+        if self.backpressure == DROP_OLDEST:
+            self._queue.popleft()
+            self.dropped += 1
+            return
+        if self.backpressure == BLOCK:
+            deadline = None
+            if self.block_timeout is not None:
+                deadline = time.time() + self.block_timeout
+            while len(self._queue) >= self.max_queue and not self._closed:
+                self._check_thread()
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                # Writing now is the quickest way to make room
+                self._flush_to = max(self._flush_to, self.enqueued)
+                self._cond.notify_all()
+                self._cond.wait(remaining)
+            if self._closed:
+                raise ValueError('add_event on a closed writer')
+            if len(self._queue) < self.max_queue:
+                return
+        raise BufferFull(
+            'Event queue is full (%d events)' % self.max_queue
+        )
+
+    def _check_thread(self):
+        if self._stopped:
+            raise RuntimeError('The writer thread has stopped')
+
+    def flush(self, timeout=None):
+        """
+        Wait until every event added before the call has been written,
+        returning False if ``timeout`` seconds pass first
+        """
+        with self._cond:
+            target = self.enqueued
+            self._flush_to = max(self._flush_to, target)
+            self._cond.notify_all()
+            return self._wait_for(target, timeout)
+
+    def close(self, timeout=None):
+        """Stop accepting events and write out the ones still queued"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queue_depth': len(self._queue),
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'written': self.written,
+                'failed': self.failed,
+                'spooled': self.spooled,
+                'replayed': self.replayed,
+                'spool_pending': self._spool_pending(),
+                'flushes': self.flushes,
+                'last_flush_seconds': self.last_flush_seconds,
+                'max_flush_seconds': self.max_flush_seconds,
+                'mean_flush_seconds': (
+                    self.flush_seconds / self.flushes if self.flushes else 0.0
+                ),
+            }
+
+    # BACKGROUND FLUSHING
+
+    def _wait_for(self, target, timeout):
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while self._done < target and not self._stopped:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+            self._cond.wait(remaining)
+        return self._done >= target
+
+    def _spool_pending(self):
+        return self.spool is not None and self.spool.pending > 0
+
+    def _due(self):
+        """Seconds until the queue should be written, 0 meaning now"""
+        if self._closed or self._flush_to > self._done:
+            return 0
+        due = None
+        if self._queue:
+            if len(self._queue) >= self.flush_size:
+                return 0
+            due = self._oldest + self.flush_interval - self.clock()
+        if self._spool_pending():
+            retry = self._next_retry - self.clock()
+            due = retry if due is None else min(due, retry)
+        return None if due is None else max(0, due)
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            # Wake producers waiting for room so they see the thread is gone.
+            # The thread is still alive while it does, hence the flag.
+            with self._cond:
+                self._stopped = True
+                self._cond.notify_all()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                due = self._due()
+                while due != 0:
+                    self._cond.wait(due)
+                    due = self._due()
+                items = list(self._queue)
+                self._queue.clear()
+                target = self.enqueued
+                closed = self._closed
+                # Blocked producers can go on while this batch is written
+                self._cond.notify_all()
+            try:
+                if self._spool_pending():
+                    self._replay()
+                if items:
+                    self._write(items)
+            except Exception:
+                # Keep flushing; these events are lost but not silently
+                log.exception('Writing %d events failed', len(items))
+            with self._cond:
+                self._done = target
+                self._cond.notify_all()
+            if closed:
+                return
+
+    def _write(self, items):
+        start = time.time()
+        written = failed = spooled = 0
+        groups, coalesced = self._coalesce(items)
+        for table, events in groups:
+            if self._spool_pending():
+                failures = self._spool(table, events)
+                spooled += len(events) - len(failures)
+                failed += len(failures)
+                self._report(table, failures)
+                continue
+            try:
+                result = self.client.create_events(
+                    table,
+                    events,
+                    replace=self.replace,
+                    batch_size=self.flush_size
+                )
+            except Exception as e:
+                result = bulk.BulkResult()
+                result.add_batch_failure(list(enumerate(events)), e)
+            written += result.written
+            failures = result.failures
+            if self.spool is not None and failures:
+                unreachable = [
+                    (f.object_id, f.event)
+                    for f in failures
+                    if is_unreachable(f.error)
+                ]
+                failures = [f for f in failures if not is_unreachable(f.error)]
+                if unreachable:
+                    unspooled = self._spool(table, unreachable)
+                    spooled += len(unreachable) - len(unspooled)
+                    failures.extend(unspooled)
+            failed += len(failures)
+            self._report(table, failures)
+        elapsed = time.time() - start
+        with self._cond:
+            self.coalesced += coalesced
+            self.written += written
+            self.failed += failed
+            self.spooled += spooled
+            self.flushes += 1
+            self.flush_seconds += elapsed
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+
+    def _replay(self):
+        now = self.clock()
+        if now < self._next_retry:
+            return
+        self._next_retry = now + self.retry_interval
+        if not self.client.ping():
+            return
+        try:
+            replayed = self.spool.replay(
+                self.client,
+                self.flush_size,
+                on_failure=self._replay_failed
+            )
+        except Exception:
+            # Still unreachable or failing, try again later
+            return
+        with self._cond:
+            self.replayed += replayed
+
+    def _spool(self, table, events):
+        """Spool events, returning Failures for them if that fails"""
+        try:
+            self.spool.extend(table, events, self.replace)
+        except Exception as e:
+            log.exception('Spooling %d events failed', len(events))
+            result = bulk.BulkResult()
+            result.add_batch_failure(list(enumerate(events)), e)
+            return result.failures
+        return []
+
+    def _report(self, table, failures):
+        if not failures or self.on_failure is None:
+            return
+        try:
+            self.on_failure(table, failures)
+        except Exception:
+            log.exception('on_failure raised for %d events', len(failures))
+
+    def _replay_failed(self, table, failures):
+        """Spooled events the server rejected are failures like any other"""
+        with self._cond:
+            self.failed += len(failures)
+        self._report(table, failures)
+
+    def _coalesce(self, items):
+        """
+        Group queued events by table, folding events for the same object
+        and timestamp into one: the last wins when replacing, otherwise
+        their data is merged in order, as successive PATCHes would be.
+        """
+        tables = OrderedDict()
+        coalesced = 0
+        for table, object_id, event in items:
+            events = tables.setdefault(table.name, (table, OrderedDict()))[1]
+            key = (object_id, event.timestamp)
+            previous = events.get(key)
+            if previous is not None:
+                coalesced += 1
+                if not self.replace:
+                    data = dict(previous.data)
+                    data.update(event.data)
+                    event = resources.Event(data, event.timestamp)
+            events[key] = event
+        groups = [
+            (table, [
+                (object_id, event)
+                for (object_id, timestamp), event in events.items()
+            ])
+            for table, events in tables.values()
+        ]
+        return groups, coalesced
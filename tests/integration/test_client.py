@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import pytz
+
+from unittest import skipIf, TestCase
+from datetime import datetime, timedelta
+from requests import HTTPError, Timeout
+
+from sky.client import SkyClient
+from sky.metrics import LatencyRecorder
+from sky.policy import RetryPolicy
+from sky.query import Query, Selection, funnel
+from sky.stubserver import SkyStubServer
+from sky import resources
+from sky import wire
+
+try:
+    from sky.aio import AsyncSkyClient
+except ImportError:
+    AsyncSkyClient = None
+
+
+START = datetime(2014, 2, 21, 10, tzinfo=pytz.utc)
+
+
+class StubServerTestCase(TestCase):
+
+    server_options = {}
+
+    def setUp(self):
+        self.server = SkyStubServer(**self.server_options).start()
+        self.addCleanup(self.server.stop)
+        self.client = SkyClient(
+            self.server.host,
+            self.server.port,
+            codec='json',
+            schema_cache=None
+        )
+        self.addCleanup(self.client.close)
+        self.table = self.client.create_table(resources.Table(name='users'))
+        for name, data_type in (
+            ('action', 'factor'),
+            ('price', 'integer'),
+        ):
+            self.table.create_property(
+                resources.Property(name=name, data_type=data_type)
+            )
+
+    def add_history(self, object_id, actions):
+        result = self.client.create_events(self.table, [
+            (
+                object_id,
+                resources.Event(
+                    {'action': action, 'price': n},
+                    START + timedelta(minutes=n)
+                )
+            )
+            for n, action in enumerate(actions)
+        ])
+        self.assertEquals(result.failed, 0)
+
+
+class TestSchema(StubServerTestCase):
+
+    def test_tables(self):
+        self.assertEquals(
+            [table.name for table in self.client.get_tables()],
+            ['users']
+        )
+        self.assertEquals(self.client.get_table('users').name, 'users')
+        self.client.delete_table(self.table)
+        self.assertEquals(self.client.get_tables(), [])
+        with self.assertRaises(HTTPError) as context:
+            self.client.get_table('users')
+        self.assertEquals(context.exception.response.status_code, 404)
+
+    def test_properties(self):
+        props = self.client.get_properties(self.table)
+        self.assertEquals(
+            [(p.object_id, p.name, p.data_type) for p in props],
+            [(1, 'action', 'factor'), (2, 'price', 'integer')]
+        )
+        transient = self.table.create_property(
+            resources.Property(name='page', transient=True)
+        )
+        self.assertEquals(transient.object_id, -1)
+
+        price = self.client.get_property(self.table, 'price')
+        price.name = 'amount'
+        self.client.update_property(self.table, 'price', price)
+        self.assertEquals(
+            self.client.get_property(self.table, 'amount').object_id,
+            2
+        )
+        self.client.delete_property(self.table, price)
+        self.assertEquals(
+            sorted(p.name for p in self.client.get_properties(self.table)),
+            ['action', 'page']
+        )
+
+
+class TestEvents(StubServerTestCase):
+
+    def test_create_get_and_delete(self):
+        event = resources.Event({'action': 'view'}, START)
+        self.client.create_event(self.table, 'u1', event)
+        self.client.create_event(
+            self.table,
+            'u1',
+            resources.Event({'price': 5}, START),
+            replace=False
+        )
+        fetched = self.client.get_event(self.table, 'u1', START)
+        self.assertEquals(fetched.data, {'action': 'view', 'price': 5})
+        self.assertEquals(fetched.timestamp, START)
+
+        self.client.delete_event(self.table, 'u1', event)
+        self.assertEquals(self.client.get_events(self.table, 'u1'), [])
+
+    def test_unknown_property_is_rejected(self):
+        with self.assertRaises(HTTPError) as context:
+            self.client.create_event(
+                self.table,
+                'u1',
+                resources.Event({'colour': 'red'}, START)
+            )
+        self.assertEquals(context.exception.response.status_code, 400)
+
+    def test_bulk_events(self):
+        self.add_history('u1', ['view', 'view', 'buy'])
+        self.add_history('u2', ['view'])
+        self.assertTrue(self.client.bulk_events)
+        events = self.client.get_events(self.table, 'u1')
+        self.assertEquals(
+            [e.data['action'] for e in events],
+            ['view', 'view', 'buy']
+        )
+
+    def test_bulk_events_to_missing_table(self):
+        result = self.client.create_events(
+            resources.Table(name='missing'),
+            [('u1', resources.Event({'action': 'view'}, START))]
+        )
+        self.assertEquals(result.failed, 1)
+        self.assertIsNone(self.client.bulk_events)
+        self.add_history('u1', ['view'])
+        self.assertTrue(self.client.bulk_events)
+
+    def test_window_and_pages(self):
+        self.add_history('u1', ['view'] * 10)
+        events = self.client.get_events(
+            self.table,
+            'u1',
+            start=START + timedelta(minutes=2),
+            end=START + timedelta(minutes=5)
+        )
+        self.assertEquals([e.data['price'] for e in events], [2, 3, 4])
+        pages = list(self.client.iter_pages(self.table, 'u1', page_size=4))
+        self.assertEquals([len(page) for page in pages], [4, 4, 2])
+        self.assertEquals(pages[2][0].data['price'], 8)
+
+    def test_streamed_reads_are_recorded(self):
+        self.add_history('u1', ['view'] * 10)
+        recorder = LatencyRecorder()
+        self.client.post_hooks.append(recorder)
+        events = list(self.client.iter_events(self.table, 'u1'))
+        self.assertEquals(len(events), 10)
+        events = self.client.get_events(self.table, 'u1', limit=5)
+        self.assertEquals(len(events), 5)
+        self.assertEquals(
+            len(list(self.client.iter_pages(self.table, 'u1', page_size=4))),
+            3
+        )
+        histogram = recorder.histogram(
+            'get',
+            '/tables/{table}/objects/{object_id}/events'
+        )
+        self.assertEquals(histogram.count, 5)
+
+    def test_get_events_many(self):
+        self.add_history('u1', ['view'])
+        self.add_history('u2', ['view', 'buy'])
+        results = list(self.client.get_events_many(
+            self.table,
+            ['u1', 'u2', 'u3']
+        ))
+        self.assertEquals(
+            [len(result.events) for result in results],
+            [1, 2, 0]
+        )
+
+
+class TestWindowsIgnored(StubServerTestCase):
+
+    server_options = {'supports_windows': False}
+
+    def test_client_applies_window(self):
+        self.add_history('u1', ['view'] * 10)
+        events = self.client.get_events(
+            self.table,
+            'u1',
+            start=START + timedelta(minutes=2),
+            end=START + timedelta(minutes=5)
+        )
+        self.assertEquals([e.data['price'] for e in events], [2, 3, 4])
+        pages = list(self.client.iter_pages(self.table, 'u1', page_size=4))
+        self.assertEquals(
+            [[e.data['price'] for e in page] for page in pages],
+            [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+        )
+
+
+@skipIf(wire.msgpack is None, 'msgpack is not installed')
+class TestCompactEvents(StubServerTestCase):
+
+    def create(self, client):
+        return client.create_events(self.table, [
+            ('u1', resources.Event({'price': n}, START + timedelta(seconds=n)))
+            for n in range(5)
+        ])
+
+    def test_compact_writes(self):
+        client = SkyClient(
+            self.server.host,
+            self.server.port,
+            event_encoding='msgpack'
+        )
+        self.assertEquals(self.create(client).written, 5)
+        self.assertTrue(client.compact_events)
+        self.assertEquals(
+            [e.data['price'] for e in client.get_events(self.table, 'u1')],
+            list(range(5))
+        )
+        client.close()
+
+    def test_falls_back_to_json(self):
+        self.server.compact_events = False
+        client = SkyClient(
+            self.server.host,
+            self.server.port,
+            event_encoding='msgpack'
+        )
+        self.assertEquals(self.create(client).written, 5)
+        self.assertIs(client.compact_events, False)
+        self.assertEquals(len(client.get_events(self.table, 'u1')), 5)
+        client.close()
+
+
+class TestQuery(StubServerTestCase):
+
+    def test_selection(self):
+        self.add_history('u1', ['view', 'view', 'buy'])
+        self.add_history('u2', ['view', 'buy'])
+        q = Query(
+            Selection().group_by('action').count().sum('price', 'total')
+        )
+        self.assertEquals(
+            self.client.query(self.table, self.client.compile_query(
+                self.table,
+                q
+            )),
+            {
+                'action': {
+                    'buy': {'count': 2, 'total': 3},
+                    'view': {'count': 3, 'total': 1},
+                }
+            }
+        )
+
+    def test_funnel(self):
+        self.add_history('u1', ['view', 'cart', 'buy'])
+        self.add_history('u2', ['view', 'buy'])
+        self.add_history('u3', ['view', 'cart', 'view'])
+        q = Query(funnel([
+            "action == 'view'",
+            "action == 'cart'",
+            "action == 'buy'",
+        ]))
+        self.assertEquals(self.client.query(self.table, q), {'count': 1})
+
+    def test_invalid_query(self):
+        with self.assertRaises(HTTPError) as context:
+            self.client.query(self.table, [{
+                'type': 'selection',
+                'fields': [{'name': 'x', 'expression': 'median(price)'}],
+            }])
+        self.assertEquals(context.exception.response.status_code, 400)
+
+
+class TestFaults(StubServerTestCase):
+
+    def test_ping(self):
+        self.assertTrue(self.client.ping())
+        self.server.error_rate = 1
+        self.assertFalse(self.client.ping())
+
+    def test_retries_injected_errors(self):
+        self.server.error_rate = 0.5
+        self.server.random.seed(3)
+        client = SkyClient(
+            self.server.host,
+            self.server.port,
+            codec='json',
+            retry=RetryPolicy(max_retries=10)
+        )
+        for _ in range(10):
+            self.assertEquals(client.get_table('users').name, 'users')
+        self.assertTrue(self.server.requests > 10)
+        client.close()
+
+    def test_latency(self):
+        self.server.latency = 0.05
+        client = SkyClient(
+            self.server.host,
+            self.server.port,
+            codec='json',
+            read_timeout=0.01
+        )
+        with self.assertRaises(Timeout):
+            client.get_tables()
+        client.close()
+
+
+class TestAsyncClient(StubServerTestCase):
+
+    def test_events_and_query(self):
+        if AsyncSkyClient is None:
+            self.skipTest('aiohttp is not installed')
+        self.add_history('u1', ['view', 'buy'])
+
+        async def run():
+            async with AsyncSkyClient(
+                self.server.host,
+                self.server.port,
+                codec='json'
+            ) as client:
+                table = await client.get_table('users')
+                events = await client.get_events(table, 'u1')
+                result = await client.query(table, [
+                    Selection().count().to_dict()
+                ])
+                return events, result
+
+        events, result = asyncio.run(run())
+        self.assertEquals([e.data['action'] for e in events], ['view', 'buy'])
+        self.assertEquals(result, {'count': 2})
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+import itertools
+import json
+import pytz
+
+from datetime import datetime
+from unittest import skipIf, TestCase
+from mock import Mock
+
+from sky import resources
+from sky.query import Query, Selection
+
+try:
+    import aiohttp
+    import asyncio
+    from sky.aio import AsyncSkyClient
+except ImportError:
+    AsyncSkyClient = None
+
+
+class FakeContent(object):
+
+    def __init__(self, data):
+        self.data = data
+
+    async def iter_chunked(self, size):
+        for i in range(0, len(self.data), size):
+            yield self.data[i:i + size]
+
+
+class FakeResponse(object):
+
+    def __init__(self, payload, status=200):
+        self.payload = payload
+        self.status = status
+        self.content = FakeContent(json.dumps(payload).encode('utf-8'))
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise Exception(self.status)
+
+    async def read(self):
+        if self.payload is None:
+            return b''
+        return json.dumps(self.payload).encode('utf-8')
+
+    def __await__(self):
+        return self.__aenter__().__await__()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+
+class FakeSession(object):
+
+    closed = False
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.request = Mock(side_effect=self.respond)
+
+    def respond(self, *args, **kwargs):
+        return FakeResponse(self.payload)
+
+    async def close(self):
+        self.closed = True
+
+
+@skipIf(AsyncSkyClient is None, 'aiohttp is not installed')
+class TestAsyncSkyClient(TestCase):
+
+    def setUp(self):
+        self.dt = datetime(2014, 2, 21, 10, 10, 23, 203, pytz.utc)
+        self.dts = "2014-02-21T10:10:23.000203Z"
+
+    def run_with(self, payload, func, *args):
+        session = FakeSession(payload)
+
+        async def run():
+            client = AsyncSkyClient(codec='json')
+            client.make_session = Mock(return_value=session)
+            async with client:
+                return await func(client, *args)
+
+        return session, asyncio.run(run())
+
+    def test_get_tables(self):
+        session, tables = self.run_with(
+            [{'name': 'users'}],
+            AsyncSkyClient.get_tables
+        )
+        session.request.assert_called_once_with(
+            'get',
+            'http://127.0.0.1:8585/tables',
+            data=None,
+            headers={'content-type': 'application/json'}
+        )
+        self.assertEquals(tables[0].name, 'users')
+        self.assertIsInstance(tables[0].client, AsyncSkyClient)
+        self.assertTrue(session.closed)
+
+    def test_create_property(self):
+        table = resources.Table(name='users')
+        prop = resources.Property(1, 'age', False, 'string')
+        session, _ = self.run_with(
+            {},
+            AsyncSkyClient.create_property,
+            table,
+            prop
+        )
+        session.request.assert_called_once_with(
+            'post',
+            'http://127.0.0.1:8585/tables/users/properties',
+            data=b'{"name":"age","transient":false,"data_type":"string",'
+                 b'"id":1}',
+            headers={'content-type': 'application/json'}
+        )
+
+    def test_get_event(self):
+        table = resources.Table(name='users')
+        session, event = self.run_with(
+            {'timestamp': self.dts, 'data': {'a': 1}},
+            AsyncSkyClient.get_event,
+            table,
+            123,
+            self.dt
+        )
+        session.request.assert_called_once_with(
+            'get',
+            'http://127.0.0.1:8585/tables/users/objects/123/events/%s' % (
+                self.dts
+            ),
+            data=None,
+            headers={'content-type': 'application/json'}
+        )
+        self.assertEquals(event.timestamp, self.dt)
+        self.assertEquals(event.data, {'a': 1})
+
+    def test_create_events_uses_bulk_endpoint(self):
+        table = resources.Table(name='users')
+        events = [(i, resources.Event(timestamp=self.dt)) for i in range(3)]
+        session, result = self.run_with(
+            None,
+            AsyncSkyClient.create_events,
+            table,
+            events
+        )
+        args, kwargs = session.request.call_args
+        self.assertEquals(
+            args,
+            ('put', 'http://127.0.0.1:8585/tables/users/events')
+        )
+        self.assertEquals(result.written, 3)
+
+    def test_query_with_list(self):
+        table = resources.Table(name='users')
+        session, _ = self.run_with({}, AsyncSkyClient.query, table, [])
+        self.assertEquals(
+            session.request.call_args[1]['data'],
+            b'{"steps":[]}'
+        )
+
+    def test_query_with_compiled_query(self):
+        table = resources.Table(name='users')
+        q = Query(Selection().count()).compile()
+        session, _ = self.run_with({}, AsyncSkyClient.query, table, q)
+        self.assertEquals(session.request.call_args[1]['data'], q.body)
+
+    def test_ping(self):
+        session, ping = self.run_with(None, AsyncSkyClient.ping)
+        self.assertTrue(ping)
+        timeout = session.request.call_args[1]['timeout']
+        self.assertEquals(timeout.sock_connect, 1)
+        self.assertEquals(timeout.sock_read, 1)
+
+    def ping_raising(self, error):
+        session = FakeSession(None)
+        session.request.side_effect = error
+
+        async def run():
+            client = AsyncSkyClient(codec='json')
+            client.make_session = Mock(return_value=session)
+            async with client:
+                return await client.ping()
+
+        return asyncio.run(run())
+
+    def test_failed_ping(self):
+        self.assertFalse(self.ping_raising(aiohttp.ClientConnectionError()))
+        self.assertFalse(self.ping_raising(asyncio.TimeoutError()))
+
+    def test_ping_does_not_hide_bugs(self):
+        self.assertRaises(KeyError, self.ping_raising, KeyError('oops'))
+
+    def test_table_delegates_to_async_client(self):
+        table = resources.Table(name='users')
+
+        async def run():
+            client = AsyncSkyClient(codec='json')
+            client.make_session = Mock(return_value=FakeSession([]))
+            table.client = client
+            async with client:
+                return await table.get_properties()
+
+        self.assertEquals(asyncio.run(run()), [])
+
+    def test_send_with_invalid_method(self):
+        client = AsyncSkyClient(codec='json')
+        with self.assertRaises(ValueError):
+            asyncio.run(client.send('custard', '/path'))
+
+    def test_decode_response(self):
+        client = AsyncSkyClient(codec='json')
+        self.assertEquals(client.decode_response(b'{"a":1}'), {'a': 1})
+        self.assertIsNone(client.decode_response(b''))
+        self.assertRaises(ValueError, client.decode_response, b'<html>')
+
+    def test_query_many(self):
+        queries = [(resources.Table(name='t%d' % i), []) for i in range(3)]
+
+        async def collect(client, ordered):
+            return [
+                result async for result in client.query_many(
+                    queries,
+                    concurrency=2,
+                    ordered=ordered
+                )
+            ]
+
+        for ordered in (True, False):
+            session, results = self.run_with({'count': 1}, collect, ordered)
+            self.assertEquals(
+                sorted(r.index for r in results),
+                [0, 1, 2]
+            )
+            self.assertEquals(results[0].result, {'count': 1})
+            self.assertIsNone(results[0].error)
+            self.assertEquals(session.request.call_count, 3)
+
+    def test_get_events_many(self):
+        table = resources.Table(name='users')
+
+        async def collect(client, ordered):
+            return [
+                result async for result in client.get_events_many(
+                    table,
+                    [1, 2, 3],
+                    concurrency=2,
+                    ordered=ordered
+                )
+            ]
+
+        payload = [{'data': {'n': 1}, 'timestamp': self.dts}]
+        for ordered in (True, False):
+            session, results = self.run_with(payload, collect, ordered)
+            self.assertEquals(
+                sorted(r.object_id for r in results),
+                [1, 2, 3]
+            )
+            self.assertEquals(results[0].events[0].data, {'n': 1})
+            self.assertIsNone(results[0].error)
+            self.assertEquals(session.request.call_count, 3)
+
+    def test_get_events_many_bounds_tasks(self):
+        table = resources.Table(name='users')
+
+        async def collect(client, ordered):
+            results = client.get_events_many(
+                table,
+                itertools.count(),
+                concurrency=2,
+                ordered=ordered
+            )
+            try:
+                return [await results.__anext__() for _ in range(5)]
+            finally:
+                await results.aclose()
+
+        for ordered in (True, False):
+            session, results = self.run_with([], collect, ordered)
+            self.assertEquals(len(results), 5)
+            self.assertTrue(session.request.call_count <= 5 + 4)
+
+    def test_iter_events(self):
+        table = resources.Table(name='users')
+
+        async def collect(client):
+            return [
+                event async for event in client.iter_events(
+                    table,
+                    123,
+                    chunk_size=7
+                )
+            ]
+
+        session, events = self.run_with(
+            [{'timestamp': self.dts, 'data': {'n': n}} for n in range(3)],
+            collect
+        )
+        self.assertEquals([e.data['n'] for e in events], [0, 1, 2])
+        self.assertEquals(events[0].timestamp, self.dt)
+
+    def test_iter_events_frees_its_slot_between_events(self):
+        table = resources.Table(name='users')
+
+        async def collect(client):
+            client.max_in_flight = 1
+            locked = []
+            async for event in client.iter_events(table, 123, chunk_size=7):
+                locked.append(client._semaphore.locked())
+            return locked
+
+        session, locked = self.run_with(
+            [{'timestamp': self.dts, 'data': {'n': n}} for n in range(3)],
+            collect
+        )
+        self.assertEquals(locked, [False, False, False])
+
+    def test_default_timeouts(self):
+        client = AsyncSkyClient()
+        self.assertEquals(client.connect_timeout, 3.05)
+        self.assertEquals(client.read_timeout, 60)
+
+        async def make():
+            session = client.make_session()
+            await session.close()
+            return session.timeout
+
+        timeout = asyncio.run(make())
+        self.assertIsNone(timeout.total)
+        self.assertEquals(timeout.sock_connect, 3.05)
+        self.assertEquals(timeout.sock_read, 60)
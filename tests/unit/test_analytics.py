@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+import pickle
+
+from unittest import TestCase
+
+from sky import analytics
+from sky import resources
+from sky import timestamp as ts
+from sky.analytics import (
+    LocalQuery,
+    QueryState,
+    compile_expression,
+    matches,
+    merge_states,
+)
+from sky.frame import EventFrame
+from sky.query import Condition, Query, QueryError, Selection
+
+
+PROPERTIES = [
+    resources.Property(1, 'action', False, 'factor'),
+    resources.Property(2, 'price', False, 'float'),
+    resources.Property(3, 'paid', False, 'boolean'),
+    resources.Property(4, 'page', False, 'string'),
+]
+
+
+def history(*events):
+    return [
+        (n * 1000000, dict(data))
+        for n, data in enumerate(events)
+    ]
+
+
+OBJECTS = [
+    history(
+        {'action': 'view', 'page': '/a'},
+        {'action': 'buy', 'price': 5.0, 'paid': True},
+        {'action': 'view', 'page': '/b'},
+        {'action': 'buy', 'price': 7.5, 'paid': False},
+    ),
+    history(
+        {'action': 'view', 'page': '/a'},
+        {'action': 'view', 'page': '/a'},
+        {'action': 'buy', 'price': 12.0, 'paid': True},
+    ),
+    history(
+        {'action': 'signup'},
+    ),
+]
+
+
+def frames(objects):
+    return [EventFrame.from_rows(rows, PROPERTIES) for rows in objects]
+
+
+class TestExpressions(TestCase):
+
+    def test_operators(self):
+        code = compile_expression("action == 'buy' && !(price < 5)")
+        self.assertTrue(matches(code, {'action': 'buy', 'price': 5}))
+        self.assertFalse(matches(code, {'action': 'buy'}))
+
+    def test_sky_operators(self):
+        data = {'action': 'buy', 'price': 10}
+        for expression, expected in (
+            ("action == 'buy' && price > 5", True),
+            ("action == 'view' || price >= 10", True),
+            ("!(price < 20)", False),
+            ("action != 'buy'", False),
+            ("action == '&&'", False),
+            ("missing > 3", False),
+            ("true", True),
+        ):
+            self.assertEquals(
+                matches(compile_expression(expression), data),
+                expected,
+                expression
+            )
+
+    def test_invalid(self):
+        self.assertRaises(QueryError, compile_expression, "open('x')")
+        for expression in ("__import__('os')", "action.lower()", "a ==", ""):
+            self.assertRaises(QueryError, compile_expression, expression)
+
+
+class TestLocalQuery(TestCase):
+
+    def test_queries(self):
+        for q, expected in (
+            (
+                Query(Selection().group_by('action').count().sum('price')),
+                {'action': {
+                    'view': {'count': 4},
+                    'buy': {'count': 3, 'sum_price': 24.5},
+                    'signup': {'count': 1},
+                }},
+            ),
+            (
+                Query(
+                    Selection('totals').count().min('price').max('price'),
+                    Selection().group_by('paid', 'page').count(),
+                ),
+                {
+                    'totals': {
+                        'count': 8,
+                        'min_price': 5.0,
+                        'max_price': 12.0,
+                    },
+                    'paid': {
+                        'null': {'page': {
+                            '/a': {'count': 3},
+                            '/b': {'count': 1},
+                            'null': {'count': 1},
+                        }},
+                        'true': {'page': {'null': {'count': 2}}},
+                        'false': {'page': {'null': {'count': 1}}},
+                    },
+                },
+            ),
+            (
+                Query(
+                    Condition("action == 'view'").then(
+                        Condition("action == 'buy'", within=(1, 2)).then(
+                            Selection().group_by('paid').count().sum('price')
+                        )
+                    )
+                ),
+                {'paid': {
+                    'true': {'count': 3, 'sum_price': 29.0},
+                    'false': {'count': 1, 'sum_price': 7.5},
+                }},
+            ),
+            (
+                Query(
+                    Condition(
+                        "action == 'buy'",
+                        within=(0, 2),
+                        within_units='seconds'
+                    ).then(Selection('bought').count())
+                ),
+                {'bought': {'count': 7}},
+            ),
+        ):
+            q = q.to_dict()
+            local = LocalQuery(q)
+            self.assertEquals(local.run(OBJECTS), expected, q)
+            self.assertEquals(local.run(frames(OBJECTS)), expected, q)
+
+    def test_event_inputs(self):
+        q = Query(
+            Condition("action == 'view'").then(
+                Condition("action == 'buy'", within=(1, 1)).then(
+                    Selection().count()
+                )
+            )
+        )
+        rows = OBJECTS[0]
+        events = [
+            resources.Event(data, ts.from_micros(micros))
+            for micros, data in rows
+        ]
+        dicts = [event.to_dict() for event in events]
+        local = LocalQuery(q)
+        for objects in ([rows], [events], [dicts]):
+            self.assertEquals(local.run(objects), {'count': 2})
+
+    def test_distinct_and_histogram(self):
+        local = LocalQuery([
+            Selection()
+            .distinct('page')
+            .histogram('action')
+            .histogram('price', 5)
+            .to_dict()
+        ])
+        expected = {
+            'distinct_page': 2,
+            'histogram_action': {'view': 4, 'buy': 3, 'signup': 1},
+            'histogram_price': {'5.0': 2, '10.0': 1},
+        }
+        self.assertEquals(local.run(OBJECTS), expected)
+        self.assertEquals(local.run(frames(OBJECTS)), expected)
+
+    def test_merged_states_equal_one_pass(self):
+        q = Query(
+            Selection().group_by('action').count().distinct('page'),
+            Selection('prices').histogram('price', 10).min('price'),
+        )
+        local = LocalQuery(q)
+        rows = [row for rows in OBJECTS for row in rows]
+        whole = local.state().add_events(rows)
+        pages = [
+            local.state().add_events(rows[i:i + 3])
+            for i in range(0, len(rows), 3)
+        ]
+        merged = merge_states(pages)
+        self.assertEquals(merged.result(), whole.result())
+        self.assertEquals(
+            merged.result()['action']['view']['distinct_page'],
+            2
+        )
+        # Merging leaves the merged states as they were
+        self.assertEquals(
+            pages[0].result(),
+            local.state().add_events(rows[:3]).result()
+        )
+
+    def test_many_groups(self):
+        rows = [
+            (n, {'page': '/%d' % (n % 40), 'n': n}) for n in range(200)
+        ]
+        local = LocalQuery(Query(
+            Selection().group_by('page').count().sum('n')
+        ))
+        scanned = analytics.SCAN_GROUPS
+        try:
+            for limit in (0, 100):
+                analytics.SCAN_GROUPS = limit
+                result = local.run([rows])['page']
+                self.assertEquals(len(result), 40)
+                self.assertEquals(result['/3'], {'count': 5, 'sum_n': 415})
+                self.assertEquals(
+                    local.run(frames([rows]))['page'],
+                    result
+                )
+        finally:
+            analytics.SCAN_GROUPS = scanned
+
+    def test_state_survives_pickling(self):
+        local = LocalQuery(Query(Selection().distinct('page')))
+        state = local.state().add_events(OBJECTS[0])
+        copy = pickle.loads(pickle.dumps(state))
+        copy.merge(local.state().add_frame(frames(OBJECTS)[1]))
+        self.assertEquals(copy.result(), {'distinct_page': 2})
+
+    def test_cannot_merge_other_queries(self):
+        first = QueryState(LocalQuery(Query(Selection().count())))
+        second = QueryState(LocalQuery(Query(Selection().sum('price'))))
+        self.assertRaises(QueryError, first.merge, second)
+
+    def test_frame_grouping_decodes_keys(self):
+        frame = frames(OBJECTS)[0]
+        result = LocalQuery(
+            Query(Selection().group_by('action', 'paid', 'missing').count())
+        ).state().add_frame(frame).result()
+        self.assertEquals(result, {'action': {
+            'view': {'paid': {'null': {'missing': {'null': {'count': 2}}}}},
+            'buy': {'paid': {
+                'true': {'missing': {'null': {'count': 1}}},
+                'false': {'missing': {'null': {'count': 1}}},
+            }},
+        }})
+
+    def test_invalid_queries(self):
+        for steps in (
+            [{'type': 'selection', 'fields': [{'expression': 'avg(x)'}]}],
+            [{'type': 'selection', 'fields': [{'expression': 'sum()'}]}],
+            [{'type': 'selection', 'fields': [
+                {'expression': 'histogram(price, -1)'}
+            ]}],
+            [{'type': 'condition', 'expression': 'a ==', 'steps': []}],
+            [{'type': 'session'}],
+        ):
+            self.assertRaises(QueryError, LocalQuery, steps)
+
+    def test_aggregates_must_fold_and_merge(self):
+        class Median(analytics.Aggregate):
+            def finish(self, state):
+                return state
+
+        self.assertRaises(TypeError, Median, 'median', 'price')
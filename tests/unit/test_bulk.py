@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import json
+import pytz
+
+from datetime import datetime
+from unittest import TestCase
+
+from sky import bulk
+from sky import resources
+from sky.codec import JSONCodec
+
+
+class TestEncodeEvent(TestCase):
+
+    def test_encode_event(self):
+        event = resources.Event(
+            data={'action': 'click'},
+            timestamp=datetime(2014, 2, 21, 10, 10, 23, 203, pytz.utc)
+        )
+        line = bulk.encode_event(JSONCodec(), 123, event)
+        self.assertEquals(
+            line,
+            b'{"timestamp":"2014-02-21T10:10:23.000203Z",'
+            b'"data":{"action":"click"},"id":123}\n'
+        )
+
+
+class TestBatch(TestCase):
+
+    def setUp(self):
+        self.dt = datetime(2014, 2, 21, 10, 10, 23, 203, pytz.utc)
+        self.result = bulk.BulkResult()
+        self.codec = JSONCodec()
+
+    def make_source(self, count):
+        return enumerate(
+            (i, resources.Event(data={'n': i}, timestamp=self.dt))
+            for i in range(count)
+        )
+
+    def test_stream_is_bounded_by_count(self):
+        source = self.make_source(5)
+        batch = bulk.Batch(source, self.result, 2, 1024, self.codec)
+        lines = list(batch.stream())
+        self.assertEquals(len(lines), 2)
+        self.assertEquals(json.loads(lines[1].decode('utf-8'))['id'], 1)
+        self.assertEquals([index for index, _ in batch.items], [0, 1])
+        self.assertEquals(next(source)[0], 2)
+
+    def test_stream_is_bounded_by_size(self):
+        batch = bulk.Batch(
+            self.make_source(5),
+            self.result,
+            100,
+            1,
+            self.codec
+        )
+        self.assertEquals(len(list(batch.stream())), 1)
+
+    def test_stream_of_exhausted_source(self):
+        batch = bulk.Batch(
+            self.make_source(0),
+            self.result,
+            2,
+            1024,
+            self.codec
+        )
+        self.assertIsNone(batch.stream())
+
+    def test_unencodable_events_are_reported(self):
+        source = enumerate([
+            (1, resources.Event(data={'bad': object()}, timestamp=self.dt)),
+            (2, resources.Event(data={}, timestamp=self.dt)),
+        ])
+        batch = bulk.Batch(source, self.result, 10, 1024, self.codec)
+        self.assertEquals(len(list(batch.stream())), 1)
+        self.assertEquals(self.result.failed, 1)
+        self.assertEquals(self.result.failures[0].index, 0)
+        self.assertEquals(self.result.failures[0].object_id, 1)
+        self.assertIsInstance(self.result.failures[0].error, TypeError)
+
+
+class TestBulkResult(TestCase):
+
+    def test_add_batch_failure(self):
+        result = bulk.BulkResult()
+        error = Exception('')
+        result.add_batch_failure([(0, (1, 'a')), (1, (2, 'b'))], error)
+        self.assertEquals(result.failed, 2)
+        self.assertEquals(result.failures[1], (1, 2, 'b', error))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from unittest import TestCase
+from mock import Mock
+
+from sky.cache import QueryCache, SchemaCache
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestQueryCache(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = QueryCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def key(self, table='users', query='{}'):
+        return ('127.0.0.1', 8585, table, query)
+
+    def test_hit_after_miss(self):
+        load = Mock(return_value={'count': 1})
+        for _ in range(2):
+            self.assertEquals(
+                self.cache.get_or_load(self.key(), load),
+                {'count': 1}
+            )
+        self.assertEquals(load.call_count, 1)
+        self.assertEquals(self.cache.hits, 1)
+        self.assertEquals(self.cache.misses, 1)
+
+    def test_entries_expire(self):
+        load = Mock(return_value={})
+        self.cache.get_or_load(self.key(), load)
+        self.clock.now += 11
+        self.cache.get_or_load(self.key(), load)
+        self.assertEquals(load.call_count, 2)
+        self.assertEquals(self.cache.expirations, 1)
+
+    def test_least_recently_used_is_evicted(self):
+        load = Mock(return_value={})
+        self.cache.get_or_load(self.key(query='a'), load)
+        self.cache.get_or_load(self.key(query='b'), load)
+        self.cache.get_or_load(self.key(query='a'), load)
+        self.cache.get_or_load(self.key(query='c'), load)
+        self.assertEquals(self.cache.evictions, 1)
+        self.cache.get_or_load(self.key(query='a'), load)
+        self.assertEquals(load.call_count, 3)
+
+    def test_evicts_to_stay_within_max_bytes(self):
+        cache = QueryCache(max_bytes=10, sizeof=len)
+        cache.get_or_load(self.key(query='a'), lambda: 'x' * 6)
+        cache.get_or_load(self.key(query='b'), lambda: 'x' * 6)
+        self.assertEquals(len(cache), 1)
+        self.assertEquals(cache.size_bytes, 6)
+        cache.get_or_load(self.key(query='c'), lambda: 'x' * 11)
+        self.assertEquals(len(cache), 1)
+
+    def test_invalidate_only_affects_table(self):
+        load = Mock(return_value={})
+        self.cache.get_or_load(self.key('users'), load)
+        self.cache.get_or_load(self.key('orders'), load)
+        self.cache.invalidate('127.0.0.1', 8585, 'users')
+        self.cache.get_or_load(self.key('users'), load)
+        self.cache.get_or_load(self.key('orders'), load)
+        self.assertEquals(load.call_count, 3)
+
+    def test_invalidate_discards_load_in_flight(self):
+        def load():
+            self.cache.invalidate('127.0.0.1', 8585, 'users')
+            return {}
+        self.cache.get_or_load(self.key(), load)
+        self.assertEquals(len(self.cache), 0)
+
+    def test_errors_are_not_cached(self):
+        load = Mock(side_effect=[ValueError(''), {}])
+        with self.assertRaises(ValueError):
+            self.cache.get_or_load(self.key(), load)
+        self.assertEquals(self.cache.get_or_load(self.key(), load), {})
+
+    def test_concurrent_misses_share_one_load(self):
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def load():
+            started.set()
+            release.wait(5)
+            return {'count': 1}
+
+        leader = threading.Thread(
+            target=lambda: results.append(
+                self.cache.get_or_load(self.key(), load)
+            )
+        )
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(
+            target=lambda: results.append(
+                self.cache.get_or_load(self.key(), Mock())
+            )
+        )
+        follower.start()
+        while not self.cache.coalesced:
+            time.sleep(0.001)
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEquals(results, [{'count': 1}, {'count': 1}])
+        self.assertEquals(self.cache.stats()['misses'], 1)
+
+
+class TestSchemaCache(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = SchemaCache(ttl=10, clock=self.clock)
+
+    def test_get_and_set(self):
+        self.assertIsNone(self.cache.get(('table', 'users')))
+        self.cache.set(('table', 'users'), 'users')
+        self.assertEquals(self.cache.get(('table', 'users')), 'users')
+        self.assertEquals((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_entries_expire(self):
+        self.cache.set(('table', 'users'), 'users')
+        self.clock.now += 11
+        self.assertIsNone(self.cache.get(('table', 'users')))
+        self.assertEquals(len(self.cache), 0)
+
+    def test_invalidate_table(self):
+        self.cache.set(('tables',), [])
+        self.cache.set(('table', 'users'), 'users')
+        self.cache.set(('property', 'users', 'age'), 'age')
+        self.cache.set(('table', 'orders'), 'orders')
+        self.cache.invalidate('users')
+        self.assertIsNone(self.cache.get(('tables',)))
+        self.assertIsNone(self.cache.get(('property', 'users', 'age')))
+        self.assertEquals(self.cache.get(('table', 'orders')), 'orders')
+
+    def test_invalidate_everything(self):
+        self.cache.set(('table', 'users'), 'users')
+        self.cache.invalidate()
+        self.assertEquals(len(self.cache), 0)
@@ -1,12 +1,20 @@
 # -*- coding: utf-8 -*-
+import json
 import pytz
 
-from unittest import TestCase
+from unittest import skipIf, TestCase
 from mock import Mock, patch
 from datetime import datetime
+from requests import ConnectionError, HTTPError, RequestException
+from requests.exceptions import ChunkedEncodingError
 
+from sky.cache import QueryCache, SchemaCache
 from sky.client import SkyClient
+from sky.factors import FactorCache
+from sky.policy import CircuitBreaker, CircuitOpenError, RetryPolicy
+from sky.query import Query, QueryError, Selection
 from sky import resources
+from sky import wire
 
 
 @patch('sky.client.requests')
@@ -28,80 +36,87 @@ class TestSkyClient(TestCase):
     def get_mock_response(self, payload):
         response = Mock()
         response.raise_for_status = Mock()
-        response.json = payload
+        response.content = b''
+        if payload is not None:
+            response.content = json.dumps(payload).encode('utf-8')
         return response
 
     def test_get_tables(self, requests):
-        requests.get = Mock(return_value=self.get_mock_response(
+        requests.Session().get = Mock(return_value=self.get_mock_response(
             [
                 {"name": "users"}
             ]
         ))
-        client = SkyClient()
+        client = SkyClient(codec='json')
         tables = client.get_tables()
-        requests.get.assert_called_once_with(
+        requests.Session().get.assert_called_once_with(
             'http://127.0.0.1:8585/tables',
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data=None
         )
         self.assertEquals(tables[0].name, 'users')
 
     def test_get_table(self, requests):
-        requests.get = Mock(
+        requests.Session().get = Mock(
             return_value=self.get_mock_response({})
         )
-        client = SkyClient()
+        client = SkyClient(codec='json')
         client.get_table('users')
-        requests.get.assert_called_once_with(
+        requests.Session().get.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users',
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data=None
         )
 
     def test_magic_get(self, requests):
-        requests.get = Mock(
+        requests.Session().get = Mock(
             return_value=self.get_mock_response({})
         )
-        client = SkyClient()
+        client = SkyClient(codec='json')
         client.users
-        requests.get.assert_called_once_with(
+        requests.Session().get.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users',
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data=None
         )
 
     def test_create_table(self, requests):
-        requests.post = Mock(
+        requests.Session().post = Mock(
             return_value=self.get_mock_response({})
         )
 
         table = resources.Table(name='users')
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         client.create_table(table)
-        requests.post.assert_called_once_with(
+        requests.Session().post.assert_called_once_with(
             'http://127.0.0.1:8585/tables',
             headers={'content-type': 'application/json'},
-            data='{"name": "users"}'
+            timeout=(3.05, 60),
+            data=b'{"name":"users"}'
         )
 
     def test_delete_table(self, requests):
-        requests.delete = Mock(
+        requests.Session().delete = Mock(
             return_value=self.get_mock_response({})
         )
 
         table = resources.Table(name='users')
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         client.delete_table(table)
-        requests.delete.assert_called_once_with(
+        requests.Session().delete.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users',
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data=None
         )
 
     def test_get_properties(self, requests):
-        requests.get = Mock(
+        requests.Session().get = Mock(
             return_value=self.get_mock_response(
                 [
                     {
@@ -116,11 +131,12 @@ class TestSkyClient(TestCase):
 
         table = resources.Table(name='users')
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         props = client.get_properties(table)
-        requests.get.assert_called_once_with(
+        requests.Session().get.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users/properties',
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data=None
         )
         self.assertEquals(props[0].object_id, 213)
@@ -129,61 +145,69 @@ class TestSkyClient(TestCase):
         self.assertEquals(props[0].data_type, 'string')
 
     def test_get_property(self, requests):
-        requests.get = Mock(return_value=self.get_mock_response({}))
+        requests.Session().get = Mock(return_value=self.get_mock_response({}))
         table = resources.Table(name='users')
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         client.get_property(table, 'age')
-        requests.get.assert_called_once_with(
+        requests.Session().get.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users/properties/age',
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data=None
         )
 
     def test_create_property(self, requests):
-        requests.post = Mock(return_value=self.get_mock_response({}))
+        requests.Session().post = Mock(return_value=self.get_mock_response({}))
         table = resources.Table(name='users')
 
         prop = resources.Property(1, 'age', False, 'string')
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         client.create_property(table, prop)
-        requests.post.assert_called_once_with(
+        requests.Session().post.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users/properties',
             headers={'content-type': 'application/json'},
-            data='{"data_type": "string", "id": 1, "name": "age", "transient": false}'  # NOQA
+            timeout=(3.05, 60),
+            data=b'{"name":"age","transient":false,"data_type":"string","id":1}'  # NOQA
         )
 
     def test_update_property(self, requests):
-        requests.patch = Mock(return_value=self.get_mock_response({}))
+        requests.Session().patch = Mock(
+            return_value=self.get_mock_response({})
+        )
         table = resources.Table(name='users')
 
         prop = resources.Property(1, 'ysb', False, 'string')
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         client.update_property(table, 'age', prop)
-        requests.patch.assert_called_once_with(
+        requests.Session().patch.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users/properties/age',
             headers={'content-type': 'application/json'},
-            data='{"data_type": "string", "id": 1, "name": "ysb", "transient": false}'  # NOQA
+            timeout=(3.05, 60),
+            data=b'{"name":"ysb","transient":false,"data_type":"string","id":1}'  # NOQA
         )
 
     def test_delete_property(self, requests):
-        requests.delete = Mock(return_value=self.get_mock_response({}))
+        requests.Session().delete = Mock(
+            return_value=self.get_mock_response({})
+        )
         table = resources.Table(name='users')
 
         prop = resources.Property(1, 'age', False, 'string')
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         client.delete_property(table, prop)
-        requests.delete.assert_called_once_with(
+        requests.Session().delete.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users/properties/age',
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data=None
         )
 
     def test_get_events(self, requests):
-        requests.get = Mock(
+        requests.Session().get = Mock(
             return_value=self.get_mock_response(
                 [
                     {
@@ -194,137 +218,164 @@ class TestSkyClient(TestCase):
             )
         )
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         table = resources.Table(name='users')
         events = client.get_events(table, 123)
 
-        requests.get.assert_called_once_with(
+        requests.Session().get.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users/objects/123/events',
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data=None
         )
 
         self.assertEquals(events[0].timestamp, self.dt)
 
     def test_get_event(self, requests):
-        requests.get = Mock(return_value=self.get_mock_response({}))
+        requests.Session().get = Mock(return_value=self.get_mock_response({}))
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         table = resources.Table(name='users')
 
         client.get_event(table, 123, self.dt)
-        requests.get.assert_called_once_with(
+        requests.Session().get.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users/objects/123/events/%s' % (
                 self.dts
             ),
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data=None
         )
 
     def test_create_event_with_replace(self, requests):
-        requests.put = Mock(return_value=self.get_mock_response({}))
-        client = SkyClient()
+        requests.Session().put = Mock(return_value=self.get_mock_response({}))
+        client = SkyClient(codec='json')
         table = resources.Table(name='users')
         event = resources.Event(timestamp=self.dt)
         client.create_event(table, 123, event)
-        requests.put.assert_called_once_with(
+        requests.Session().put.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users/objects/123/events/%s' % (
                 self.dts
             ),
             headers={'content-type': 'application/json'},
-            data='{"data": {}, "timestamp": "2014-02-21T10:10:23.000203Z"}'
+            timeout=(3.05, 60),
+            data=b'{"timestamp":"2014-02-21T10:10:23.000203Z","data":{}}'
         )
 
     def test_create_event_without_replace(self, requests):
-        requests.patch = Mock(return_value=self.get_mock_response({}))
-        client = SkyClient()
+        requests.Session().patch = Mock(
+            return_value=self.get_mock_response({})
+        )
+        client = SkyClient(codec='json')
         table = resources.Table(name='users')
         event = resources.Event(timestamp=self.dt)
         client.create_event(table, 123, event, False)
-        requests.patch.assert_called_once_with(
+        requests.Session().patch.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users/objects/123/events/%s' % (
                 self.dts
             ),
             headers={'content-type': 'application/json'},
-            data='{"data": {}, "timestamp": "2014-02-21T10:10:23.000203Z"}'
+            timeout=(3.05, 60),
+            data=b'{"timestamp":"2014-02-21T10:10:23.000203Z","data":{}}'
         )
 
     def test_delete_event(self, requests):
-        requests.delete = Mock(return_value=self.get_mock_response({}))
+        requests.Session().delete = Mock(
+            return_value=self.get_mock_response({})
+        )
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         table = resources.Table(name='users')
 
         event = resources.Event(timestamp=self.dt)
 
         client.delete_event(table, 123, event)
-        requests.delete.assert_called_once_with(
+        requests.Session().delete.assert_called_once_with(
             'http://127.0.0.1:8585/tables/users/objects/123/events/%s' % (
                 self.dts
             ),
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data=None
         )
 
     def test_query_with_dict(self, requests):
-        requests.get = Mock(return_value=self.get_mock_response({}))
+        requests.Session().get = Mock(return_value=self.get_mock_response({}))
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         table = resources.Table(name='users')
         client.query(table, {})
 
-        requests.get.assert_called_once_with(
+        requests.Session().get.assert_called_once_with(
             "http://127.0.0.1:8585/tables/users/query",
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data={}
         )
 
     def test_query_with_list(self, requests):
-        requests.get = Mock(return_value=self.get_mock_response({}))
+        requests.Session().get = Mock(return_value=self.get_mock_response({}))
 
-        client = SkyClient()
+        client = SkyClient(codec='json')
         table = resources.Table(name='users')
         client.query(table, [])
 
-        requests.get.assert_called_once_with(
+        requests.Session().get.assert_called_once_with(
             "http://127.0.0.1:8585/tables/users/query",
             headers={'content-type': 'application/json'},
-            data='{"steps": []}'
+            timeout=(3.05, 60),
+            data=b'{"steps":[]}'
         )
 
     def test_ping(self, requests):
-        requests.get = Mock(return_value=self.get_mock_response({}))
-        client = SkyClient()
+        requests.Session().get = Mock(return_value=self.get_mock_response({}))
+        client = SkyClient(codec='json')
         ping = client.ping()
-        requests.get.assert_called_once_with(
+        requests.Session().get.assert_called_once_with(
             'http://127.0.0.1:8585/ping',
             headers={'content-type': 'application/json'},
+            timeout=(1, 1),
             data=None
         )
         self.assertTrue(ping)
 
     def test_failed_ping(self, requests):
-        requests.get = Mock(side_effect=Exception(''))
-        client = SkyClient()
+        requests.RequestException = RequestException
+        requests.Session().get = Mock(side_effect=ConnectionError(''))
+        client = SkyClient(codec='json', max_retries=3)
         ping = client.ping()
         self.assertFalse(ping)
+        self.assertEquals(requests.Session().get.call_count, 1)
+
+    def test_ping_answered_without_json(self, requests):
+        requests.RequestException = RequestException
+        response = self.get_mock_response(None)
+        response.content = b'pong'
+        requests.Session().get = Mock(return_value=response)
+        self.assertTrue(SkyClient(codec='json').ping())
+
+    def test_ping_does_not_hide_bugs(self, requests):
+        requests.RequestException = RequestException
+        requests.Session().get = Mock(side_effect=KeyError('oops'))
+        client = SkyClient(codec='json')
+        self.assertRaises(KeyError, client.ping)
 
     def test_make_url(self, requests):
-        client = SkyClient()
+        client = SkyClient(codec='json')
         self.assertEquals(
             client.make_url('/bob'),
             "http://127.0.0.1:8585/bob"
         )
 
     def test_make_url_when_using_ssl(self, requests):
-        client = SkyClient(use_ssl=True)
+        client = SkyClient(use_ssl=True, codec='json')
         self.assertEquals(
             client.make_url('/bob'),
             "https://127.0.0.1:8585/bob"
         )
 
     def test_send_with_invalid_method(self, requests):
-        client = SkyClient()
+        client = SkyClient(codec='json')
         self.assertRaises(
             ValueError,
             client.send,
@@ -333,13 +384,1029 @@ class TestSkyClient(TestCase):
         )
 
     def test_send_with_use_ssl(self, requests):
-        requests.get = Mock(return_value=self.get_mock_response({}))
-        client = SkyClient(use_ssl=True)
+        requests.Session().get = Mock(return_value=self.get_mock_response({}))
+        client = SkyClient(use_ssl=True, codec='json')
         client.send('get', '/path')
 
-        requests.get.assert_called_once_with(
+        requests.Session().get.assert_called_once_with(
             'https://127.0.0.1:8585/path',
             headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
             data=None,
             verify=False
         )
+
+    def test_session_is_reused_between_requests(self, requests):
+        requests.Session().get = Mock(return_value=self.get_mock_response({}))
+        requests.Session.reset_mock()
+        client = SkyClient(codec='json')
+        client.ping()
+        client.ping()
+        requests.Session.assert_called_once_with()
+        self.assertEquals(requests.Session().get.call_count, 2)
+
+    def test_session_mounts_pooled_adapter(self, requests):
+        client = SkyClient(pool_connections=2, pool_maxsize=20, codec='json')
+        client.get_session()
+        adapter = requests.Session().mount.call_args[0][1]
+        self.assertEquals(adapter._pool_connections, 2)
+        self.assertEquals(adapter._pool_maxsize, 20)
+
+    def test_make_retry(self, requests):
+        client = SkyClient(max_retries=3, backoff_factor=0.5, codec='json')
+        retry = client.make_retry()
+        self.assertEquals(retry.max_retries, 3)
+        self.assertEquals(retry.backoff_factor, 0.5)
+        self.assertIsInstance(client.retry, RetryPolicy)
+
+    def test_make_retry_when_disabled(self, requests):
+        client = SkyClient(codec='json')
+        self.assertFalse(client.retry.should_retry('get', 0))
+
+    def get_status_response(self, status, payload=None):
+        response = self.get_mock_response(payload)
+        response.status_code = status
+        if status >= 400:
+            response.raise_for_status = Mock(
+                side_effect=self.get_http_error(status)
+            )
+        return response
+
+    def test_per_method_timeouts(self, requests):
+        requests.Session().get = Mock(return_value=self.get_mock_response({}))
+        requests.Session().put = Mock(return_value=self.get_mock_response({}))
+        client = SkyClient(
+            codec='json',
+            connect_timeout=1,
+            read_timeout=5,
+            timeouts={'put': (2, 10)}
+        )
+        client.send('get', '/path')
+        client.send('put', '/path')
+        client.send('get', '/path', timeout=(0.5, 0.5))
+        self.assertEquals(
+            [c[1]['timeout'] for c in requests.Session().get.call_args_list],
+            [(1, 5), (0.5, 0.5)]
+        )
+        self.assertEquals(requests.Session().put.call_args[1]['timeout'], (
+            2,
+            10
+        ))
+
+    def test_retries_idempotent_methods(self, requests):
+        requests.HTTPError = HTTPError
+        sleep = Mock()
+        requests.Session().get = Mock(side_effect=[
+            self.get_status_response(503),
+            ConnectionError('reset'),
+            self.get_status_response(200, {'ok': True}),
+        ])
+        client = SkyClient(
+            codec='json',
+            retry=RetryPolicy(max_retries=2, backoff_factor=1, sleep=sleep)
+        )
+        self.assertEquals(client.send('get', '/path'), {'ok': True})
+        self.assertEquals(requests.Session().get.call_count, 3)
+        self.assertEquals(sleep.call_count, 2)
+        self.assertTrue(all(0 <= c[0][0] <= 2 for c in sleep.call_args_list))
+
+    def test_gives_up_after_max_retries(self, requests):
+        requests.HTTPError = HTTPError
+        requests.Session().get = Mock(
+            return_value=self.get_status_response(503)
+        )
+        client = SkyClient(
+            codec='json',
+            retry=RetryPolicy(max_retries=2, sleep=Mock())
+        )
+        self.assertRaises(HTTPError, client.send, 'get', '/path')
+        self.assertEquals(requests.Session().get.call_count, 3)
+
+    def test_does_not_retry_patch_or_client_errors(self, requests):
+        requests.HTTPError = HTTPError
+        requests.Session().patch = Mock(
+            return_value=self.get_status_response(503)
+        )
+        requests.Session().get = Mock(
+            return_value=self.get_status_response(404)
+        )
+        client = SkyClient(
+            codec='json',
+            retry=RetryPolicy(max_retries=2, sleep=Mock())
+        )
+        self.assertRaises(HTTPError, client.send, 'patch', '/path', {})
+        self.assertRaises(HTTPError, client.send, 'get', '/path')
+        self.assertEquals(requests.Session().patch.call_count, 1)
+        self.assertEquals(requests.Session().get.call_count, 1)
+
+    def test_does_not_retry_streamed_bodies(self, requests):
+        requests.Session().put = Mock(side_effect=ConnectionError('reset'))
+        client = SkyClient(
+            codec='json',
+            retry=RetryPolicy(max_retries=2, sleep=Mock())
+        )
+        self.assertRaises(
+            ConnectionError,
+            client.send,
+            'put',
+            '/path',
+            body=iter([b'{}\n'])
+        )
+        self.assertEquals(requests.Session().put.call_count, 1)
+
+    def test_hooks_see_request_details(self, requests):
+        response = self.get_mock_response({'count': 1})
+        response.status_code = 200
+        requests.Session().get = Mock(return_value=response)
+        seen = []
+        client = SkyClient(
+            codec='json',
+            pre_hooks=[lambda info: seen.append(('pre', info.total))],
+            post_hooks=[seen.append]
+        )
+        table = resources.Table(name='users')
+        self.assertEquals(client.query(table, [{'a': 1}]), {'count': 1})
+        (stage, total), info = seen
+        self.assertEquals((stage, total), ('pre', 0.0))
+        self.assertEquals(info.method, 'get')
+        self.assertEquals(info.template, '/tables/{table}/query')
+        self.assertEquals(info.request_bytes, len(b'{"steps":[{"a":1}]}'))
+        self.assertEquals(info.response_bytes, len(response.content))
+        self.assertEquals(info.status, 200)
+        self.assertIsNone(info.error)
+        self.assertTrue(
+            info.total >= info.encode + info.network + info.decode
+        )
+        requests.Session().get.assert_called_once_with(
+            'http://127.0.0.1:8585/tables/users/query',
+            headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
+            data=b'{"steps":[{"a":1}]}'
+        )
+
+    def test_hooks_see_failures(self, requests):
+        error = self.get_http_error(404)
+        response = self.get_mock_response(None)
+        response.raise_for_status = Mock(side_effect=error)
+        requests.Session().get = Mock(return_value=response)
+        seen = []
+        client = SkyClient(codec='json', post_hooks=[seen.append])
+        self.assertRaises(HTTPError, client.send, 'get', '/tables/nope')
+        self.assertIs(seen[0].error, error)
+        self.assertEquals(seen[0].status, 404)
+
+    def test_hooks_see_streamed_reads(self, requests):
+        payload = [
+            {'data': {'age': n}, 'timestamp': self.dts} for n in range(3)
+        ]
+        response = self.get_streamed_response(payload)
+        response.status_code = 200
+        requests.Session().get = Mock(return_value=response)
+        seen = []
+        client = SkyClient(codec='json', post_hooks=[seen.append])
+        table = resources.Table(name='users')
+        events = client.iter_events(table, 123)
+        self.assertEquals(len(list(events)), 3)
+        info, = seen
+        self.assertEquals(
+            info.template,
+            '/tables/{table}/objects/{object_id}/events'
+        )
+        self.assertEquals(info.status, 200)
+        self.assertEquals(
+            info.response_bytes,
+            len(json.dumps(payload).encode('utf-8'))
+        )
+        self.assertIsNone(info.error)
+        self.assertTrue(info.total >= info.network + info.decode)
+        response.close.assert_called_once_with()
+
+    def test_hooks_see_abandoned_streamed_reads(self, requests):
+        response = self.get_streamed_response(
+            [{'data': {'age': n}, 'timestamp': self.dts} for n in range(3)]
+        )
+        response.status_code = 200
+        requests.Session().get = Mock(return_value=response)
+        seen = []
+        client = SkyClient(codec='json', post_hooks=[seen.append])
+        events = client.iter_events(resources.Table(name='users'), 123)
+        next(events)
+        self.assertEquals(seen, [])
+        events.close()
+        self.assertEquals(len(seen), 1)
+        self.assertIsNone(seen[0].error)
+        response.close.assert_called_once_with()
+
+    def test_circuit_breaker_sheds_load(self, requests):
+        requests.Session().get = Mock(side_effect=ConnectionError('down'))
+        breaker = CircuitBreaker(failure_threshold=2)
+        client = SkyClient(codec='json', circuit_breaker=breaker)
+        self.assertRaises(ConnectionError, client.send, 'get', '/path')
+        self.assertRaises(ConnectionError, client.send, 'get', '/path')
+        self.assertRaises(CircuitOpenError, client.send, 'get', '/path')
+        self.assertEquals(requests.Session().get.call_count, 2)
+
+    def test_half_open_trial_failing_otherwise_reopens(self, requests):
+        now = [0]
+        breaker = CircuitBreaker(
+            failure_threshold=1,
+            reset_timeout=10,
+            clock=lambda: now[0]
+        )
+        breaker.record_failure()
+        now[0] = 10
+        requests.Session().get = Mock(
+            side_effect=ChunkedEncodingError('cut off')
+        )
+        client = SkyClient(codec='json', circuit_breaker=breaker)
+        self.assertRaises(ChunkedEncodingError, client.send, 'get', '/path')
+        self.assertEquals(breaker.state, CircuitBreaker.OPEN)
+
+        now[0] = 20
+        requests.Session().get = Mock(
+            return_value=self.get_mock_response({'ok': True})
+        )
+        self.assertEquals(client.send('get', '/path'), {'ok': True})
+        self.assertEquals(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_circuit_breaker_shared_per_host(self, requests):
+        client = SkyClient('10.9.9.9', 1234, circuit_breaker=True)
+        other = SkyClient('10.9.9.9', 1234, circuit_breaker=True)
+        self.assertIs(client.circuit_breaker, other.circuit_breaker)
+        self.assertIsNone(SkyClient().circuit_breaker)
+
+    def test_close(self, requests):
+        client = SkyClient(codec='json')
+        session = client.get_session()
+        client.close()
+        session.close.assert_called_once_with()
+        self.assertIsNone(client._session)
+
+    def test_context_manager_closes_session(self, requests):
+        with SkyClient(codec='json') as client:
+            session = client.get_session()
+        session.close.assert_called_once_with()
+
+    def test_private_attributes_are_not_tables(self, requests):
+        client = SkyClient(codec='json')
+        with self.assertRaises(AttributeError):
+            client._custard
+        self.assertFalse(requests.Session().get.called)
+
+    def test_decode_response(self, requests):
+        client = SkyClient(codec='json')
+        response = self.get_mock_response({'a': 1})
+        self.assertEquals(client.decode_response(response), {'a': 1})
+
+    def test_decode_response_with_empty_body(self, requests):
+        client = SkyClient(codec='json')
+        self.assertIsNone(client.decode_response(self.get_mock_response(None)))
+
+    def test_decode_response_with_invalid_body(self, requests):
+        client = SkyClient(codec='json')
+        response = self.get_mock_response(None)
+        response.content = b'<html>'
+        self.assertRaises(ValueError, client.decode_response, response)
+
+    def test_default_codec_is_picked_automatically(self, requests):
+        self.assertIsNotNone(SkyClient().codec)
+
+    def get_http_error(self, status_code):
+        response = Mock()
+        response.status_code = status_code
+        return HTTPError(response=response)
+
+    def test_create_events_streams_batches(self, requests):
+        bodies = []
+
+        def put(url, data, **kwargs):
+            bodies.append(list(data))
+            return self.get_mock_response({})
+
+        requests.Session().put = Mock(side_effect=put)
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users')
+        events = [
+            (i, resources.Event(timestamp=self.dt)) for i in range(5)
+        ]
+        result = client.create_events(table, events, batch_size=2)
+
+        self.assertEquals([len(body) for body in bodies], [2, 2, 1])
+        url, = requests.Session().put.call_args[0]
+        self.assertEquals(url, 'http://127.0.0.1:8585/tables/users/events')
+        self.assertEquals(
+            requests.Session().put.call_args[1]['headers'],
+            {'content-type': 'application/x-ndjson'}
+        )
+        self.assertEquals(result.written, 5)
+        self.assertEquals(result.failed, 0)
+        self.assertTrue(client.bulk_events)
+
+    def test_create_events_reports_failed_batches(self, requests):
+        requests.HTTPError = HTTPError
+        requests.RequestException = RequestException
+
+        def patch(url, data, **kwargs):
+            list(data)
+            if patch.calls:
+                raise self.get_http_error(500)
+            patch.calls += 1
+            return self.get_mock_response({})
+        patch.calls = 0
+
+        requests.Session().patch = Mock(side_effect=patch)
+        client = SkyClient(bulk_events=True, codec='json')
+        table = resources.Table(name='users')
+        events = [
+            (i, resources.Event(timestamp=self.dt)) for i in range(3)
+        ]
+        result = client.create_events(table, events, False, batch_size=2)
+
+        self.assertEquals(result.written, 2)
+        self.assertEquals([f.index for f in result.failures], [2])
+
+    def test_create_events_falls_back_to_single_events(self, requests):
+        requests.HTTPError = HTTPError
+        requests.RequestException = RequestException
+        urls = []
+
+        def put(url, data, **kwargs):
+            if url.endswith('/events'):
+                list(data)
+                raise self.get_http_error(404)
+            urls.append(url)
+            return self.get_mock_response({})
+
+        requests.Session().put = Mock(side_effect=put)
+        requests.Session().get = Mock(
+            return_value=self.get_mock_response({'name': 'users'})
+        )
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users')
+        events = [
+            (i, resources.Event(timestamp=self.dt)) for i in range(3)
+        ]
+        result = client.create_events(table, events, batch_size=2)
+
+        self.assertFalse(client.bulk_events)
+        self.assertEquals(result.written, 3)
+        self.assertEquals(
+            sorted(urls),
+            [
+                'http://127.0.0.1:8585/tables/users/objects/%d/events/%s' % (
+                    i,
+                    self.dts
+                )
+                for i in range(3)
+            ]
+        )
+
+    def test_create_events_to_missing_table_keeps_bulk(self, requests):
+        requests.HTTPError = HTTPError
+        requests.RequestException = RequestException
+
+        def put(url, data, **kwargs):
+            list(data)
+            raise self.get_http_error(404)
+
+        requests.Session().put = Mock(side_effect=put)
+        requests.Session().get = Mock(side_effect=self.get_http_error(404))
+        client = SkyClient(codec='json', retry=None)
+        table = resources.Table(name='users')
+        events = [
+            (i, resources.Event(timestamp=self.dt)) for i in range(3)
+        ]
+        result = client.create_events(table, events, batch_size=2)
+
+        # The table is missing, not the endpoint
+        self.assertIsNone(client.bulk_events)
+        self.assertEquals(result.written, 0)
+        self.assertEquals(result.failed, 3)
+        self.assertEquals(requests.Session().put.call_count, 2)
+
+    @skipIf(wire.msgpack is None, 'msgpack is not installed')
+    def test_create_events_compact(self, requests):
+        requests.HTTPError = HTTPError
+        requests.RequestException = RequestException
+        requests.Session().get = Mock(return_value=self.get_mock_response([
+            {'id': 1, 'name': 'n', 'data_type': 'integer'}
+        ]))
+        bodies = []
+
+        def put(url, data, headers, **kwargs):
+            bodies.append((headers['content-type'], b''.join(data)))
+            return self.get_mock_response({})
+
+        requests.Session().put = Mock(side_effect=put)
+        client = SkyClient(codec='json', event_encoding='msgpack')
+        table = resources.Table(name='users')
+        events = [
+            (i, resources.Event({'n': i}, self.dt)) for i in range(3)
+        ]
+        result = client.create_events(table, events)
+
+        self.assertEquals(result.written, 3)
+        self.assertTrue(client.compact_events)
+        content_type, body = bodies[0]
+        self.assertEquals(content_type, 'application/x-msgpack')
+        self.assertEquals(
+            [
+                (object_id, obj['data'])
+                for object_id, obj in wire.decode_events(
+                    body,
+                    [resources.Property(1, 'n', False, 'integer')]
+                )
+            ],
+            [(0, {'n': 0}), (1, {'n': 1}), (2, {'n': 2})]
+        )
+
+    @skipIf(wire.msgpack is None, 'msgpack is not installed')
+    def test_create_events_compact_falls_back_to_json(self, requests):
+        requests.HTTPError = HTTPError
+        requests.RequestException = RequestException
+        requests.Session().get = Mock(return_value=self.get_mock_response([
+            {'id': 1, 'name': 'n', 'data_type': 'integer'}
+        ]))
+        content_types = []
+
+        def put(url, data, headers, **kwargs):
+            list(data)
+            content_types.append(headers['content-type'])
+            if headers['content-type'] == 'application/x-msgpack':
+                raise self.get_http_error(415)
+            return self.get_mock_response({})
+
+        requests.Session().put = Mock(side_effect=put)
+        client = SkyClient(codec='json', event_encoding='msgpack')
+        table = resources.Table(name='users')
+        events = [
+            (i, resources.Event({'n': i}, self.dt)) for i in range(3)
+        ]
+        result = client.create_events(table, events, batch_size=2)
+        self.assertEquals(result.written, 3)
+        self.assertEquals(result.failed, 0)
+        self.assertIs(client.compact_events, False)
+        self.assertTrue(client.bulk_events)
+        self.assertEquals(content_types, [
+            'application/x-msgpack',
+            'application/x-ndjson',
+            'application/x-ndjson',
+        ])
+
+        # Known to be unsupported, so later writes go straight to JSON
+        client.create_events(table, events[:1])
+        self.assertEquals(content_types[-1], 'application/x-ndjson')
+
+    @skipIf(wire.msgpack is None, 'msgpack is not installed')
+    def test_create_events_compact_rejected_batch(self, requests):
+        requests.HTTPError = HTTPError
+        requests.RequestException = RequestException
+        requests.Session().get = Mock(return_value=self.get_mock_response([
+            {'id': 1, 'name': 'n', 'data_type': 'integer'}
+        ]))
+        content_types = []
+
+        def put(url, data, headers, **kwargs):
+            list(data)
+            content_types.append(headers['content-type'])
+            if len(content_types) <= 2:
+                raise self.get_http_error(400)
+            return self.get_mock_response({})
+
+        requests.Session().put = Mock(side_effect=put)
+        client = SkyClient(codec='json', event_encoding='msgpack')
+        table = resources.Table(name='users')
+        events = [
+            (i, resources.Event({'n': i}, self.dt)) for i in range(3)
+        ]
+        result = client.create_events(table, events, batch_size=2)
+
+        # Refused as NDJSON too, so the batch was bad, not the encoding
+        self.assertEquals(result.failed, 2)
+        self.assertEquals(result.written, 1)
+        self.assertIs(client.compact_events, True)
+        self.assertEquals(content_types, [
+            'application/x-msgpack',
+            'application/x-ndjson',
+            'application/x-msgpack',
+        ])
+
+    @skipIf(wire.msgpack is None, 'msgpack is not installed')
+    def test_create_events_compact_ambiguous_error(self, requests):
+        requests.HTTPError = HTTPError
+        requests.RequestException = RequestException
+        requests.Session().get = Mock(return_value=self.get_mock_response([
+            {'id': 1, 'name': 'n', 'data_type': 'integer'}
+        ]))
+        content_types = []
+
+        def put(url, data, headers, **kwargs):
+            list(data)
+            content_types.append(headers['content-type'])
+            if headers['content-type'] == 'application/x-msgpack':
+                raise self.get_http_error(400)
+            return self.get_mock_response({})
+
+        requests.Session().put = Mock(side_effect=put)
+        client = SkyClient(codec='json', event_encoding='msgpack')
+        table = resources.Table(name='users')
+        events = [
+            (i, resources.Event({'n': i}, self.dt)) for i in range(3)
+        ]
+        result = client.create_events(table, events, batch_size=2)
+
+        # Taken as NDJSON, so it was msgpack the server could not read
+        self.assertEquals(result.written, 3)
+        self.assertIs(client.compact_events, False)
+        self.assertEquals(content_types, [
+            'application/x-msgpack',
+            'application/x-ndjson',
+            'application/x-ndjson',
+        ])
+
+    def test_event_encoding_must_be_known(self, requests):
+        self.assertRaises(ValueError, SkyClient, event_encoding='xml')
+
+    def test_query_many_in_order(self, requests):
+        requests.RequestException = RequestException
+        requests.Session().get = Mock(
+            side_effect=lambda url, **kwargs: self.get_mock_response(url)
+        )
+        client = SkyClient(codec='json')
+        queries = [
+            (resources.Table(name='t%d' % i), []) for i in range(5)
+        ]
+        results = list(client.query_many(queries, concurrency=2))
+        self.assertEquals([r.index for r in results], list(range(5)))
+        self.assertEquals(
+            results[3].result,
+            'http://127.0.0.1:8585/tables/t3/query'
+        )
+        self.assertIs(results[3].table, queries[3][0])
+        self.assertTrue(all(r.elapsed >= 0 for r in results))
+
+    def test_query_many_as_completed_reports_errors(self, requests):
+        requests.RequestException = RequestException
+        error = RequestException('down')
+
+        def get(url, **kwargs):
+            if '/t1/' in url:
+                raise error
+            return self.get_mock_response({})
+
+        requests.Session().get = Mock(side_effect=get)
+        client = SkyClient(codec='json')
+        queries = [
+            (resources.Table(name='t%d' % i), {}) for i in range(3)
+        ]
+        results = list(client.query_many(queries, ordered=False))
+        self.assertEquals(sorted(r.index for r in results), [0, 1, 2])
+        failed = [r for r in results if r.error is not None]
+        self.assertEquals(len(failed), 1)
+        self.assertEquals(failed[0].index, 1)
+        self.assertIs(failed[0].error, error)
+
+    def test_get_events_many_in_order(self, requests):
+        requests.RequestException = RequestException
+
+        def get(url, **kwargs):
+            object_id = url.split('/')[-2]
+            return self.get_mock_response([
+                {'data': {'id': object_id}, 'timestamp': self.dts}
+            ])
+
+        requests.Session().get = Mock(side_effect=get)
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users')
+        results = list(client.get_events_many(
+            table,
+            ['u%d' % i for i in range(5)],
+            concurrency=2
+        ))
+        self.assertEquals([r.index for r in results], list(range(5)))
+        self.assertEquals(results[3].object_id, 'u3')
+        self.assertEquals(results[3].events[0].data, {'id': 'u3'})
+        self.assertEquals(results[3].events[0].timestamp, self.dt)
+        self.assertTrue(all(r.error is None for r in results))
+
+    def test_get_events_many_as_completed_reports_errors(self, requests):
+        requests.RequestException = RequestException
+        error = RequestException('down')
+
+        def get(url, **kwargs):
+            if '/u1/' in url:
+                raise error
+            return self.get_mock_response([])
+
+        requests.Session().get = Mock(side_effect=get)
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users', client=client)
+        results = list(table.get_events_many(
+            ['u0', 'u1', 'u2'],
+            ordered=False
+        ))
+        self.assertEquals(sorted(r.index for r in results), [0, 1, 2])
+        failed = [r for r in results if r.error is not None]
+        self.assertEquals(len(failed), 1)
+        self.assertEquals(failed[0].object_id, 'u1')
+        self.assertIsNone(failed[0].events)
+        self.assertIs(failed[0].error, error)
+
+    def test_query_with_cache(self, requests):
+        requests.Session().get = Mock(
+            return_value=self.get_mock_response({'count': 2})
+        )
+        client = SkyClient(query_cache=QueryCache(), codec='json')
+        table = resources.Table(name='users')
+        self.assertEquals(client.query(table, {'b': 1, 'a': 2}), {'count': 2})
+        self.assertEquals(client.query(table, {'a': 2, 'b': 1}), {'count': 2})
+        requests.Session().get.assert_called_once_with(
+            "http://127.0.0.1:8585/tables/users/query",
+            headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
+            data=b'{"a":2,"b":1}'
+        )
+
+    def test_query_with_compiled_query(self, requests):
+        requests.Session().get = Mock(
+            return_value=self.get_mock_response({'count': 2})
+        )
+        client = SkyClient(query_cache=QueryCache(), codec='json')
+        table = resources.Table(name='users')
+        q = Query(Selection().count()).compile()
+        self.assertEquals(client.query(table, q), {'count': 2})
+        self.assertEquals(client.query(table, q), {'count': 2})
+        requests.Session().get.assert_called_once_with(
+            "http://127.0.0.1:8585/tables/users/query",
+            headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
+            data=q.body
+        )
+
+    def test_compile_query_checks_properties(self, requests):
+        requests.Session().get = Mock(
+            return_value=self.get_mock_response(
+                [{'id': 1, 'name': 'action', 'data_type': 'factor'}]
+            )
+        )
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users')
+        q = client.compile_query(
+            table,
+            Query(Selection().group_by('action').count())
+        )
+        self.assertEquals(
+            q.to_dict()['steps'][0]['dimensions'],
+            ['action']
+        )
+        self.assertRaises(
+            QueryError,
+            client.compile_query,
+            table,
+            Query(Selection().group_by('country'))
+        )
+
+    def test_writes_invalidate_query_cache(self, requests):
+        requests.Session().get = Mock(return_value=self.get_mock_response({}))
+        requests.Session().put = Mock(return_value=self.get_mock_response({}))
+        client = SkyClient(query_cache=QueryCache(), codec='json')
+        table = resources.Table(name='users')
+        client.query(table, [])
+        client.create_event(table, 123, resources.Event(timestamp=self.dt))
+        client.query(table, [])
+        self.assertEquals(requests.Session().get.call_count, 2)
+
+    def test_magic_get_with_schema_cache(self, requests):
+        requests.Session().get = Mock(
+            return_value=self.get_mock_response({'name': 'users'})
+        )
+        client = SkyClient(schema_cache=SchemaCache(), codec='json')
+        self.assertIs(client.users, client.users)
+        self.assertIs(client.users.client, client)
+        requests.Session().get.assert_called_once_with(
+            'http://127.0.0.1:8585/tables/users',
+            headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
+            data=None
+        )
+
+    def test_get_tables_warms_schema_cache(self, requests):
+        requests.Session().get = Mock(
+            return_value=self.get_mock_response([{'name': 'users'}])
+        )
+        client = SkyClient(schema_cache=SchemaCache(), codec='json')
+        client.get_tables()
+        client.get_tables()
+        client.get_table('users')
+        self.assertEquals(requests.Session().get.call_count, 1)
+
+    def test_delete_table_refreshes_schema_cache(self, requests):
+        requests.Session().get = Mock(
+            return_value=self.get_mock_response({'name': 'users'})
+        )
+        requests.Session().delete = Mock(
+            return_value=self.get_mock_response(None)
+        )
+        client = SkyClient(schema_cache=SchemaCache(), codec='json')
+        client.delete_table(client.users)
+        client.users
+        self.assertEquals(requests.Session().get.call_count, 2)
+
+    def test_properties_with_schema_cache(self, requests):
+        requests.Session().get = Mock(return_value=self.get_mock_response([
+            {'id': 1, 'name': 'age', 'data_type': 'integer'}
+        ]))
+        client = SkyClient(schema_cache=SchemaCache(), codec='json')
+        table = resources.Table(name='users')
+        client.get_properties(table)
+        props = client.get_properties(table)
+        self.assertEquals(props[0].name, 'age')
+        self.assertIs(client.get_property(table, 'age'), props[0])
+        self.assertEquals(requests.Session().get.call_count, 1)
+
+    def test_property_changes_keep_schema_cache_coherent(self, requests):
+        requests.Session().get = Mock(return_value=self.get_mock_response([
+            {'id': 1, 'name': 'age', 'data_type': 'integer'}
+        ]))
+        requests.Session().patch = Mock(return_value=self.get_mock_response(
+            {'id': 1, 'name': 'years', 'data_type': 'integer'}
+        ))
+        requests.Session().delete = Mock(
+            return_value=self.get_mock_response(None)
+        )
+        client = SkyClient(schema_cache=SchemaCache(), codec='json')
+        table = resources.Table(name='users')
+        client.get_properties(table)
+
+        prop = resources.Property(1, 'years', False, 'integer')
+        client.update_property(table, 'age', prop)
+        self.assertIs(client.get_property(table, 'years'), prop)
+        self.assertEquals(requests.Session().get.call_count, 1)
+
+        client.delete_property(table, prop)
+        client.get_properties(table)
+        self.assertEquals(requests.Session().get.call_count, 2)
+
+    def test_iter_events(self, requests):
+        body = json.dumps([
+            {'data': {'n': 1}, 'timestamp': self.dts},
+            {'data': {'n': 2}, 'timestamp': self.dts},
+        ]).encode('utf-8')
+        response = self.get_mock_response(None)
+        response.iter_content = Mock(
+            return_value=iter([body[:10], body[10:]])
+        )
+        requests.Session().get = Mock(return_value=response)
+
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users')
+        events = client.iter_events(table, 123, chunk_size=10)
+        self.assertEquals(next(events).data, {'n': 1})
+        self.assertFalse(response.close.called)
+        self.assertEquals([e.data for e in events], [{'n': 2}])
+
+        requests.Session().get.assert_called_once_with(
+            'http://127.0.0.1:8585/tables/users/objects/123/events',
+            headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
+            data=None,
+            stream=True
+        )
+        response.iter_content.assert_called_once_with(10)
+        response.close.assert_called_once_with()
+
+    def get_streamed_response(self, payload):
+        response = self.get_mock_response(None)
+        response.iter_content = Mock(
+            return_value=iter([json.dumps(payload).encode('utf-8')])
+        )
+        return response
+
+    def test_get_events_as_frame(self, requests):
+        requests.Session().get = Mock(return_value=self.get_streamed_response(
+            [{'data': {'age': n}, 'timestamp': self.dts} for n in range(3)]
+        ))
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users')
+        frame = client.get_events(
+            table,
+            123,
+            as_frame=True,
+            properties=[resources.Property(1, 'age', False, 'integer')]
+        )
+        self.assertEquals(list(frame['age']), [0, 1, 2])
+        self.assertEquals(frame['age'].values.format, 'q')
+        self.assertEquals(frame[0].timestamp, self.dt)
+        requests.Session().get.return_value.close.assert_called_once_with()
+
+    def test_iter_frames_uses_table_properties(self, requests):
+        responses = [
+            self.get_mock_response([
+                {'id': 1, 'name': 'action', 'data_type': 'factor'}
+            ]),
+            self.get_streamed_response([
+                {'data': {'action': 'view'}, 'timestamp': self.dts}
+                for n in range(5)
+            ]),
+        ]
+        requests.Session().get = Mock(side_effect=responses)
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users')
+        frames = list(client.iter_frames(table, 123, frame_size=2))
+        self.assertEquals([len(frame) for frame in frames], [2, 2, 1])
+        self.assertEquals(frames[0]['action'].labels, ['view'])
+
+    def test_get_events_interns_factors(self, requests):
+        properties = self.get_mock_response([
+            {'id': 1, 'name': 'action', 'data_type': 'factor'},
+            {'id': 2, 'name': 'page', 'data_type': 'string'},
+        ])
+        events = self.get_mock_response([
+            {
+                'data': {'action': 'view', 'page': '/home'},
+                'timestamp': self.dts,
+            }
+            for n in range(3)
+        ])
+        requests.Session().get = Mock(side_effect=[properties, events])
+        cache = FactorCache()
+        client = SkyClient(codec='json', factor_cache=cache)
+        table = resources.Table(name='users')
+        events = client.get_events(table, 123)
+        self.assertEquals([e.data['action'] for e in events], ['view'] * 3)
+        self.assertIs(events[0].data['action'], events[2].data['action'])
+        self.assertIsNot(events[0].data['page'], events[2].data['page'])
+        self.assertEquals(
+            cache.dictionary('users', 'action').labels,
+            ['view']
+        )
+
+        requests.Session().delete = Mock(
+            return_value=self.get_mock_response(None)
+        )
+        client.delete_property(table, resources.Property(name='action'))
+        self.assertEquals(len(cache), 0)
+
+    def test_factor_properties_are_fetched_once(self, requests):
+        requests.Session().get = Mock(side_effect=lambda url, **kwargs: (
+            self.get_mock_response([
+                {'id': 1, 'name': 'action', 'data_type': 'factor'}
+            ])
+            if url.endswith('/properties') else
+            self.get_mock_response([
+                {'data': {'action': 'view'}, 'timestamp': self.dts}
+            ])
+        ))
+        cache = FactorCache()
+        client = SkyClient(codec='json', factor_cache=cache)
+        table = resources.Table(name='users')
+        for object_id in range(10):
+            client.get_events(table, object_id)
+        self.assertEquals(requests.Session().get.call_count, 11)
+
+        # A new property might be a factor, so they are looked up again
+        requests.Session().post = Mock(return_value=self.get_mock_response(
+            {'id': 2, 'name': 'plan', 'data_type': 'factor'}
+        ))
+        client.create_property(table, resources.Property(name='plan'))
+        client.get_events(table, 1)
+        self.assertEquals(requests.Session().get.call_count, 13)
+
+    def test_iter_frames_share_factor_codes(self, requests):
+        requests.Session().get = Mock(side_effect=[
+            self.get_streamed_response([
+                {'data': {'action': action}, 'timestamp': self.dts}
+                for action in actions
+            ])
+            for actions in (['view', 'buy'], ['buy'])
+        ])
+        client = SkyClient(codec='json', factor_cache=FactorCache())
+        table = resources.Table(name='users')
+        properties = [resources.Property(1, 'action', False, 'factor')]
+        first = client.get_events(
+            table,
+            1,
+            as_frame=True,
+            properties=properties
+        )
+        second = client.get_events(
+            table,
+            2,
+            as_frame=True,
+            properties=properties
+        )
+        self.assertEquals(list(first['action'].codes), [0, 1])
+        self.assertEquals(list(second['action'].codes), [1])
+        self.assertIs(first['action'].labels, second['action'].labels)
+
+    def get_history(self, count):
+        # One event a minute, each in its own chunk, like a server that
+        # ignores the window parameters
+        events = [
+            json.dumps({
+                'data': {'n': n},
+                'timestamp': '2014-02-21T10:%02d:00.000000Z' % n
+            })
+            for n in range(count)
+        ]
+        chunks = ['['] + [
+            (',' if n else '') + event for n, event in enumerate(events)
+        ] + [']']
+        response = self.get_mock_response(None)
+        response.iter_content = Mock(
+            return_value=iter([chunk.encode('utf-8') for chunk in chunks])
+        )
+        return response
+
+    def test_get_events_window(self, requests):
+        response = self.get_history(10)
+        requests.Session().get = Mock(return_value=response)
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users')
+        events = client.get_events(
+            table,
+            123,
+            start=datetime(2014, 2, 21, 10, 2, tzinfo=pytz.utc),
+            end='2014-02-21T10:05:00.000000Z'
+        )
+        self.assertEquals([e.data['n'] for e in events], [2, 3, 4])
+        requests.Session().get.assert_called_once_with(
+            'http://127.0.0.1:8585/tables/users/objects/123/events'
+            '?end=2014-02-21T10%3A05%3A00.000000Z'
+            '&start=2014-02-21T10%3A02%3A00.000000Z',
+            headers={'content-type': 'application/json'},
+            timeout=(3.05, 60),
+            data=None,
+            stream=True
+        )
+        # Reading stopped at the first event past the window
+        self.assertEquals(len(list(response.iter_content.return_value)), 5)
+        response.close.assert_called_once_with()
+
+    def test_get_events_limit_and_cursor(self, requests):
+        response = self.get_history(10)
+        requests.Session().get = Mock(return_value=response)
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users')
+        events = client.get_events(
+            table,
+            123,
+            limit=2,
+            cursor='2014-02-21T10:03:00.000000Z'
+        )
+        self.assertEquals([e.data['n'] for e in events], [4, 5])
+        self.assertEquals(
+            requests.Session().get.call_args[0][0],
+            'http://127.0.0.1:8585/tables/users/objects/123/events'
+            '?cursor=2014-02-21T10%3A03%3A00.000000Z&limit=2'
+        )
+        self.assertEquals(len(list(response.iter_content.return_value)), 5)
+
+    def test_get_events_window_as_frame(self, requests):
+        requests.Session().get = Mock(return_value=self.get_history(10))
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users')
+        frame = client.get_events(
+            table,
+            123,
+            as_frame=True,
+            properties=[resources.Property(1, 'n', False, 'integer')],
+            end='2014-02-21T10:03:00.000000Z'
+        )
+        self.assertEquals(list(frame['n']), [0, 1, 2])
+
+    def test_iter_pages(self, requests):
+        for prefetch in (True, False):
+            requests.Session().get = Mock(
+                side_effect=lambda *args, **kwargs: self.get_history(5)
+            )
+            client = SkyClient(codec='json')
+            table = resources.Table(name='users')
+            pages = list(client.iter_pages(
+                table,
+                123,
+                page_size=2,
+                prefetch=prefetch
+            ))
+            self.assertEquals(
+                [[e.data['n'] for e in page] for page in pages],
+                [[0, 1], [2, 3], [4]]
+            )
+            urls = [
+                call[0][0] for call in requests.Session().get.call_args_list
+            ]
+            self.assertEquals(len(urls), 3)
+            self.assertTrue(urls[0].endswith('/events?limit=2'))
+            self.assertTrue(urls[2].endswith(
+                '/events?cursor=2014-02-21T10%3A03%3A00.000000Z&limit=2'
+            ))
+
+    def test_iter_pages_stops_on_a_full_last_page(self, requests):
+        requests.Session().get = Mock(
+            side_effect=lambda *args, **kwargs: self.get_history(4)
+        )
+        client = SkyClient(codec='json')
+        table = resources.Table(name='users')
+        pages = list(client.iter_pages(table, 123, page_size=2))
+        self.assertEquals([len(page) for page in pages], [2, 2])
+        self.assertEquals(requests.Session().get.call_count, 3)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from unittest import skipIf, TestCase
+
+from sky import codec
+
+
+class CodecTests(object):
+
+    def test_dumps_is_compact_utf8_bytes(self):
+        self.assertEquals(
+            self.codec.dumps({'name': u'caf\xe9', 'n': [1, 2.5, True, None]}),
+            u'{"name":"caf\xe9","n":[1,2.5,true,null]}'.encode('utf-8')
+        )
+
+    def test_dumps_sorts_keys_on_request(self):
+        self.assertEquals(
+            self.codec.dumps({'b': 1, 'a': {'d': 1, 'c': 2}}, sort_keys=True),
+            b'{"a":{"c":2,"d":1},"b":1}'
+        )
+
+    def test_loads_bytes_and_text(self):
+        self.assertEquals(self.codec.loads(b'{"a":[1]}'), {'a': [1]})
+        self.assertEquals(self.codec.loads(u'{"a":[1]}'), {'a': [1]})
+
+    def test_loads_invalid_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            self.codec.loads(b'<html>')
+
+
+class TestJSONCodec(CodecTests, TestCase):
+
+    def setUp(self):
+        self.codec = codec.JSONCodec()
+
+
+@skipIf(codec.orjson is None, 'orjson is not installed')
+class TestOrjsonCodec(CodecTests, TestCase):
+
+    def setUp(self):
+        self.codec = codec.OrjsonCodec()
+
+
+@skipIf(codec.ujson is None, 'ujson is not installed')
+class TestUjsonCodec(CodecTests, TestCase):
+
+    def setUp(self):
+        self.codec = codec.UjsonCodec()
+
+
+class TestGetCodec(TestCase):
+
+    def test_by_name(self):
+        self.assertIsInstance(codec.get_codec('json'), codec.JSONCodec)
+
+    def test_unknown_name(self):
+        with self.assertRaises(ValueError):
+            codec.get_codec('custard')
+
+    def test_instance_is_returned_as_is(self):
+        instance = codec.JSONCodec()
+        self.assertIs(codec.get_codec(instance), instance)
+
+    def test_automatic_prefers_fastest_installed(self):
+        expected = codec.JSONCodec
+        if codec.ujson is not None:
+            expected = codec.UjsonCodec
+        if codec.orjson is not None:
+            expected = codec.OrjsonCodec
+        self.assertIsInstance(codec.get_codec(), expected)
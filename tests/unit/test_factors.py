@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+
+from unittest import TestCase
+
+from sky.factors import FactorCache, FactorDictionary
+from sky import resources
+
+
+PROPERTIES = [
+    resources.Property(1, 'action', False, 'factor'),
+    resources.Property(2, 'page', False, 'string'),
+    resources.Property(3, 'plan', False, 'factor'),
+]
+
+
+def fresh(value):
+    """An equal string that is not the same object"""
+    return json.loads(json.dumps(value))
+
+
+class TestFactorDictionary(TestCase):
+
+    def test_codes_in_order_of_appearance(self):
+        dictionary = FactorDictionary()
+        self.assertEquals(
+            [dictionary.code(v) for v in ('b', 'a', 'b', 'c')],
+            [0, 1, 0, 2]
+        )
+        self.assertEquals(dictionary.labels, ['b', 'a', 'c'])
+        self.assertEquals(len(dictionary), 3)
+
+    def test_intern_returns_one_object_per_value(self):
+        dictionary = FactorDictionary()
+        first = dictionary.intern(fresh('signup'))
+        second = fresh('signup')
+        self.assertIsNot(first, second)
+        self.assertIs(dictionary.intern(second), first)
+
+    def test_bounded(self):
+        dictionary = FactorDictionary(max_size=2)
+        self.assertEquals(dictionary.code('a'), 0)
+        self.assertEquals(dictionary.code('b'), 1)
+        self.assertTrue(dictionary.full)
+        self.assertIsNone(dictionary.code('c'))
+        self.assertEquals(dictionary.code('a'), 0)
+        value = fresh('c')
+        self.assertIs(dictionary.intern(value), value)
+
+        copy = dictionary.copy()
+        self.assertEquals(copy.code('c'), 2)
+        self.assertEquals(dictionary.labels, ['a', 'b'])
+
+    def test_concurrent_codes_are_unique(self):
+        dictionary = FactorDictionary()
+        values = ['v%d' % (i % 50) for i in range(2000)]
+        results = []
+
+        def run():
+            results.append([dictionary.code(v) for v in values])
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(len(dictionary), 50)
+        self.assertTrue(all(codes == results[0] for codes in results))
+        for value, code in zip(values, results[0]):
+            self.assertEquals(dictionary.labels[code], value)
+
+
+class TestFactorCache(TestCase):
+
+    def test_dictionary_per_table_and_property(self):
+        cache = FactorCache()
+        self.assertIs(
+            cache.dictionary('users', 'action'),
+            cache.dictionary('users', 'action')
+        )
+        self.assertIsNot(
+            cache.dictionary('users', 'action'),
+            cache.dictionary('orders', 'action')
+        )
+        self.assertEquals(
+            sorted(cache.dictionaries('users', PROPERTIES)),
+            ['action', 'plan']
+        )
+
+    def test_interner(self):
+        cache = FactorCache()
+        intern = cache.interner('users', PROPERTIES)
+        first = {'action': fresh('view'), 'page': fresh('/home')}
+        second = {
+            'action': fresh('view'),
+            'page': fresh('/home'),
+            'plan': None,
+        }
+        intern(first)
+        intern(second)
+        self.assertIs(first['action'], second['action'])
+        self.assertIsNot(first['page'], second['page'])
+        self.assertIsNone(second['plan'])
+        self.assertIsNone(cache.interner('users', PROPERTIES[1:2]))
+
+    def test_remembers_factor_names(self):
+        cache = FactorCache()
+        loads = []
+
+        def load():
+            loads.append(1)
+            return PROPERTIES
+
+        self.assertEquals(
+            cache.factor_names('users', load),
+            ('action', 'plan')
+        )
+        self.assertIsNotNone(cache.interner('users', load))
+        self.assertEquals(len(loads), 1)
+        self.assertEquals(
+            cache.factor_names('users', PROPERTIES[:1]),
+            ('action',)
+        )
+        self.assertEquals(cache.factor_names('users', load), ('action',))
+        cache.forget_properties('users')
+        cache.factor_names('users', load)
+        self.assertEquals(len(loads), 2)
+        cache.invalidate('users', 'plan')
+        cache.factor_names('users', load)
+        self.assertEquals(len(loads), 3)
+
+    def test_invalidate(self):
+        cache = FactorCache()
+        for table in ('users', 'orders'):
+            for prop in ('action', 'plan'):
+                cache.dictionary(table, prop).code('x')
+        cache.invalidate('users', 'plan')
+        self.assertEquals(len(cache), 3)
+        cache.invalidate('orders')
+        self.assertEquals(len(cache), 1)
+        cache.invalidate()
+        self.assertEquals(len(cache), 0)
+
+    def test_round_trip(self):
+        cache = FactorCache(max_size=10)
+        for value in ('view', 'buy'):
+            cache.dictionary('users', 'action').code(value)
+        obj = json.loads(json.dumps(cache.to_dict()))
+        self.assertEquals(obj, {'users': {'action': ['view', 'buy']}})
+        restored = FactorCache.from_dict(obj, max_size=10)
+        dictionary = restored.dictionary('users', 'action')
+        self.assertEquals(dictionary.code('buy'), 1)
+        self.assertEquals(dictionary.max_size, 10)
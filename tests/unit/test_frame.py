@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import pytz
+
+from datetime import datetime
+from unittest import TestCase
+
+from sky import resources
+from sky.factors import FactorDictionary
+from sky.frame import EventFrame
+
+
+class TestEventFrame(TestCase):
+
+    def setUp(self):
+        self.properties = [
+            resources.Property(1, 'count', False, 'integer'),
+            resources.Property(2, 'price', False, 'float'),
+            resources.Property(3, 'paid', False, 'boolean'),
+            resources.Property(4, 'action', False, 'factor'),
+            resources.Property(5, 'page', False, 'string'),
+        ]
+        self.dicts = [
+            {
+                'timestamp': '2014-02-21T10:10:2%d.000000Z' % i,
+                'data': {
+                    'count': i,
+                    'price': i * 1.5,
+                    'paid': i % 2 == 0,
+                    'action': ['view', 'buy'][i % 2],
+                    'page': '/p/%d' % i,
+                }
+            }
+            for i in range(5)
+        ]
+        self.dicts[2]['data'] = {'extra': 'x'}
+        self.frame = EventFrame.from_dicts(self.dicts, self.properties)
+
+    def test_typed_columns(self):
+        self.assertEquals(len(self.frame), 5)
+        self.assertEquals(
+            self.frame.columns,
+            ['action', 'count', 'extra', 'page', 'paid', 'price']
+        )
+        self.assertEquals(self.frame['count'].values.format, 'q')
+        self.assertEquals(self.frame['price'].values.format, 'd')
+        self.assertEquals(
+            list(self.frame['count']),
+            [0, 1, None, 3, 4]
+        )
+        self.assertEquals(
+            list(self.frame['paid']),
+            [True, False, None, False, True]
+        )
+        self.assertEquals(list(self.frame['extra'].mask), [0, 0, 1, 0, 0])
+
+    def test_factor_columns_are_dictionary_encoded(self):
+        action = self.frame['action']
+        self.assertEquals(action.labels, ['view', 'buy'])
+        self.assertEquals(list(action.codes), [0, 1, 0, 1, 0])
+        self.assertEquals(
+            list(action),
+            ['view', 'buy', None, 'buy', 'view']
+        )
+
+    def test_shared_factor_dictionaries(self):
+        dictionary = FactorDictionary(labels=['buy'])
+        first = EventFrame.from_dicts(
+            self.dicts,
+            self.properties,
+            {'action': dictionary}
+        )
+        second = EventFrame.from_dicts(
+            self.dicts[1:2],
+            self.properties,
+            {'action': dictionary}
+        )
+        self.assertIs(first['action'].labels, second['action'].labels)
+        self.assertEquals(list(first['action'].codes), [1, 0, 0, 0, 1])
+        self.assertEquals(list(second['action'].codes), [0])
+        self.assertEquals(dictionary.labels, ['buy', 'view'])
+
+    def test_full_factor_dictionary_falls_back_to_a_copy(self):
+        dictionary = FactorDictionary(max_size=1, labels=['buy'])
+        frame = EventFrame.from_dicts(
+            self.dicts,
+            self.properties,
+            {'action': dictionary}
+        )
+        self.assertEquals(
+            list(frame['action']),
+            ['view', 'buy', None, 'buy', 'view']
+        )
+        self.assertEquals(dictionary.labels, ['buy'])
+        self.assertEquals(frame['action'].labels, ['buy', 'view'])
+
+    def test_value_counts(self):
+        self.assertEquals(
+            self.frame['action'].value_counts(),
+            {'view': 2, 'buy': 2}
+        )
+        self.assertEquals(
+            self.frame[1:3]['action'].value_counts(),
+            {'buy': 1}
+        )
+        self.assertEquals(
+            self.frame['paid'].value_counts(),
+            {True: 2, False: 2}
+        )
+
+    def test_timestamps_are_epoch_micros(self):
+        self.assertEquals(self.frame.timestamps[0], 1392977420000000)
+
+    def test_slices_share_buffers(self):
+        view = self.frame[1:3]
+        self.assertEquals(len(view), 2)
+        self.assertEquals(list(view['count']), [1, None])
+        self.assertIs(view._timestamps, self.frame._timestamps)
+        self.assertEquals(list(view[1:]['page']), [None])
+
+    def test_between(self):
+        start = datetime(2014, 2, 21, 10, 10, 21, tzinfo=pytz.utc)
+        view = self.frame.between(start, 1392977423000000)
+        self.assertEquals(list(view['count']), [1, None])
+        self.assertEquals(len(self.frame.between(end=start)), 1)
+        self.assertEquals(len(self.frame.between(start=start)), 4)
+
+    def test_events_round_trip(self):
+        events = self.frame.to_events()
+        self.assertEquals(events[0].data, self.dicts[0]['data'])
+        self.assertEquals(events[2].data, {'extra': 'x'})
+        self.assertEquals(
+            events[4].timestamp,
+            datetime(2014, 2, 21, 10, 10, 24, tzinfo=pytz.utc)
+        )
+        frame = EventFrame.from_events(events, self.properties)
+        self.assertEquals(
+            [e.data for e in frame],
+            [e.data for e in events]
+        )
+        self.assertEquals(list(frame.timestamps), list(self.frame.timestamps))
+
+    def test_negative_index(self):
+        self.assertEquals(self.frame[-1].data['count'], 4)
+        with self.assertRaises(IndexError):
+            self.frame[5]
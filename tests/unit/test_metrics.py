@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import random
+
+from unittest import TestCase
+
+from sky.metrics import (
+    LatencyHistogram,
+    LatencyRecorder,
+    RequestInfo,
+    path_template,
+    to_prometheus,
+)
+
+
+class TestPathTemplate(TestCase):
+
+    def test_replaces_identifiers(self):
+        self.assertEquals(path_template('/tables'), '/tables')
+        self.assertEquals(path_template('/tables/users'), '/tables/{table}')
+        self.assertEquals(
+            path_template('/tables/users/query'),
+            '/tables/{table}/query'
+        )
+        self.assertEquals(
+            path_template('/tables/users/properties/age'),
+            '/tables/{table}/properties/{property}'
+        )
+        self.assertEquals(
+            path_template(
+                '/tables/users/objects/123/events/2014-02-21T10:10:23Z'
+            ),
+            '/tables/{table}/objects/{object_id}/events/{timestamp}'
+        )
+        self.assertEquals(
+            path_template('/tables/users/events'),
+            '/tables/{table}/events'
+        )
+        self.assertEquals(path_template('/ping'), '/ping')
+
+
+class TestLatencyHistogram(TestCase):
+
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(50))
+        self.assertIsNone(histogram.mean)
+
+    def test_small_values_are_exact(self):
+        histogram = LatencyHistogram()
+        for micros in range(1, 101):
+            histogram.record(micros / 1e6)
+        self.assertAlmostEqual(histogram.percentile(50), 50e-6)
+        self.assertAlmostEqual(histogram.percentile(99), 99e-6)
+        self.assertAlmostEqual(histogram.percentile(100), 100e-6)
+
+    def test_percentiles_within_one_percent(self):
+        rng = random.Random(7)
+        samples = sorted(rng.expovariate(100) for _ in range(20000))
+        histogram = LatencyHistogram()
+        for sample in samples:
+            histogram.record(sample)
+        for percent in (50, 90, 99, 99.9):
+            exact = samples[int(len(samples) * percent / 100.0) - 1]
+            self.assertAlmostEqual(
+                histogram.percentile(percent) / exact,
+                1,
+                delta=0.01
+            )
+        self.assertEquals(histogram.count, 20000)
+        self.assertEquals(histogram.max, samples[-1])
+        self.assertEquals(histogram.min, samples[0])
+
+    def test_bucket_count_is_logarithmic(self):
+        histogram = LatencyHistogram()
+        histogram.record(100.0)
+        # 100 seconds in microseconds needs 27 bits: 21 doublings of 64
+        self.assertTrue(len(histogram.counts) < 64 * 23)
+
+
+class TestLatencyRecorder(TestCase):
+
+    def info(self, method, path, total, status=200):
+        info = RequestInfo(method, path)
+        info.total = total
+        info.status = status
+        return info
+
+    def test_records_per_endpoint(self):
+        recorder = LatencyRecorder()
+        recorder(self.info('get', '/tables/a/query', 0.010))
+        recorder(self.info('get', '/tables/b/query', 0.030))
+        recorder(self.info('put', '/tables/a/events', 0.5, 503))
+        histogram = recorder.histogram('get', '/tables/{table}/query')
+        self.assertEquals(histogram.count, 2)
+        self.assertAlmostEqual(
+            recorder.percentile('get', '/tables/{table}/query', 50),
+            0.010,
+            places=4
+        )
+        self.assertIsNone(recorder.percentile('get', '/nope', 50))
+        snapshot = recorder.snapshot()
+        self.assertEquals(
+            snapshot[('put', '/tables/{table}/events')]['count'],
+            1
+        )
+
+    def test_prometheus(self):
+        recorder = LatencyRecorder()
+        recorder(self.info('get', '/tables/a/query', 0.25))
+        recorder(self.info('get', '/tables/a/query', 0.25, None))
+        text = to_prometheus(recorder)
+        lines = text.splitlines()
+        self.assertIn('# TYPE sky_client_request_seconds summary', lines)
+        self.assertIn(
+            'sky_client_request_seconds{method="get",'
+            'path="/tables/{table}/query",quantile="0.5"} 0.25',
+            lines
+        )
+        self.assertIn(
+            'sky_client_request_seconds_count{method="get",'
+            'path="/tables/{table}/query"} 2',
+            lines
+        )
+        self.assertIn(
+            'sky_client_responses_total{method="get",'
+            'path="/tables/{table}/query",status="error"} 1',
+            lines
+        )
+        self.assertTrue(text.endswith('\n'))
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from requests import ConnectionError
+
+from sky.policy import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    get_circuit_breaker,
+    is_server_failure,
+)
+
+
+class TestRetryPolicy(TestCase):
+
+    def test_retries_idempotent_methods_only(self):
+        retry = RetryPolicy(max_retries=2)
+        self.assertTrue(retry.should_retry('get', 0))
+        self.assertTrue(retry.should_retry('put', 1))
+        self.assertTrue(retry.should_retry('delete', 0, 503))
+        self.assertFalse(retry.should_retry('get', 2))
+        self.assertFalse(retry.should_retry('patch', 0))
+        self.assertFalse(retry.should_retry('post', 0))
+
+    def test_retries_listed_statuses_only(self):
+        retry = RetryPolicy(max_retries=2)
+        self.assertTrue(retry.should_retry('get', 0, 502))
+        self.assertFalse(retry.should_retry('get', 0, 500))
+        retry = RetryPolicy(max_retries=2, methods=('patch',))
+        self.assertTrue(retry.should_retry('patch', 0, 503))
+
+    def test_backoff_is_exponential_and_capped(self):
+        retry = RetryPolicy(backoff_factor=0.5, max_backoff=3, jitter=False)
+        self.assertEquals(
+            [retry.backoff(attempt) for attempt in range(4)],
+            [0.5, 1, 2, 3]
+        )
+
+    def test_backoff_jitter(self):
+        retry = RetryPolicy(backoff_factor=1)
+        delays = [retry.backoff(3) for _ in range(100)]
+        self.assertTrue(all(0 <= delay <= 8 for delay in delays))
+        self.assertTrue(len(set(delays)) > 1)
+
+    def test_wait_sleeps(self):
+        slept = []
+        retry = RetryPolicy(backoff_factor=1, jitter=False, sleep=slept.append)
+        retry.wait(1)
+        RetryPolicy(sleep=slept.append).wait(1)
+        self.assertEquals(slept, [2])
+
+
+class TestCircuitBreaker(TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.breaker = CircuitBreaker(
+            failure_threshold=3,
+            reset_timeout=10,
+            clock=lambda: self.now
+        )
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertEquals(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertRaises(CircuitOpenError, self.breaker.allow)
+
+    def test_half_open_trial(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now = 10
+        self.breaker.allow()
+        self.assertEquals(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        # Only the one trial request goes through
+        self.assertRaises(CircuitOpenError, self.breaker.allow)
+        self.breaker.record_failure()
+        self.assertEquals(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertRaises(CircuitOpenError, self.breaker.allow)
+
+        self.now = 20
+        self.breaker.allow()
+        self.breaker.record_success()
+        self.assertEquals(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.allow()
+
+    def test_unreported_trial_times_out(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now = 10
+        self.breaker.allow()
+        self.now = 19
+        self.assertRaises(CircuitOpenError, self.breaker.allow)
+        self.now = 20
+        self.breaker.allow()
+        self.assertEquals(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_open_error_is_a_connection_error(self):
+        self.assertTrue(issubclass(CircuitOpenError, ConnectionError))
+
+    def test_shared_per_host(self):
+        breaker = get_circuit_breaker('10.1.1.1', 1)
+        self.assertIs(get_circuit_breaker('10.1.1.1', 1), breaker)
+        self.assertIsNot(get_circuit_breaker('10.1.1.1', 2), breaker)
+
+    def test_is_server_failure(self):
+        self.assertTrue(is_server_failure(503))
+        self.assertFalse(is_server_failure(404))
+        self.assertFalse(is_server_failure(None))
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from sky.pool import imap_bounded, imap_unordered_bounded
+
+
+class TestImapBounded(TestCase):
+
+    def test_results_are_in_input_order(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(
+                imap_bounded(executor, lambda x: x * 2, range(10), 3)
+            )
+        self.assertEquals(results, [x * 2 for x in range(10)])
+
+    def test_submission_is_bounded(self):
+        consumed = []
+
+        def source():
+            for i in range(10):
+                consumed.append(i)
+                yield i
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = imap_bounded(executor, lambda x: x, source(), 3)
+            next(results)
+            self.assertEquals(len(consumed), 3)
+            list(results)
+
+
+class TestImapUnorderedBounded(TestCase):
+
+    def test_slow_calls_do_not_block_fast_ones(self):
+        release = threading.Event()
+
+        def func(x):
+            if x == 0:
+                release.wait(5)
+            return x
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = imap_unordered_bounded(executor, func, range(4), 2)
+            first = [next(results) for _ in range(3)]
+            release.set()
+            rest = list(results)
+        self.assertEquals(sorted(first), [1, 2, 3])
+        self.assertEquals(rest, [0])
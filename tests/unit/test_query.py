@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import json
+
+from unittest import TestCase
+
+from sky.query import (
+    CompiledQuery,
+    Condition,
+    Param,
+    Query,
+    QueryError,
+    Selection,
+    Step,
+    expression_identifiers,
+    funnel,
+)
+from sky.resources import Property
+
+
+class QueryTest(TestCase):
+
+    properties = [
+        Property(name='action', data_type=Property.DATA_TYPE_FACTOR),
+        Property(name='country', data_type=Property.DATA_TYPE_FACTOR),
+        Property(name='price', data_type=Property.DATA_TYPE_FLOAT),
+    ]
+
+    def test_selection(self):
+        step = Selection('totals').group_by('country').count().sum('price')
+        self.assertEquals(
+            step.to_dict(),
+            {
+                'type': 'selection',
+                'name': 'totals',
+                'dimensions': ['country'],
+                'fields': [
+                    {'name': 'count', 'expression': 'count()'},
+                    {'name': 'sum_price', 'expression': 'sum(price)'},
+                ],
+            }
+        )
+
+    def test_selection_aggregates(self):
+        step = (
+            Selection()
+            .min('price')
+            .max('price', 'top')
+            .distinct('country')
+            .histogram('price', 10)
+        )
+        self.assertEquals(step.fields, [
+            ('min_price', 'min(price)'),
+            ('top', 'max(price)'),
+            ('distinct_country', 'distinct(country)'),
+            ('histogram_price', 'histogram(price, 10)'),
+        ])
+        self.assertEquals(step.references(), set(['price', 'country']))
+
+    def test_condition(self):
+        step = Condition("action == 'buy'", within=(1, 3)).then(
+            Selection().count()
+        )
+        obj = step.to_dict()
+        self.assertEquals(obj['type'], 'condition')
+        self.assertEquals(obj['expression'], "action == 'buy'")
+        self.assertEquals(obj['within'], [1, 3])
+        self.assertEquals(obj['withinUnits'], 'steps')
+        self.assertEquals(obj['steps'][0]['type'], 'selection')
+
+    def test_funnel_nests_conditions(self):
+        step = funnel(
+            ["action == 'home'", "action == 'signup'", "action == 'buy'"],
+            within=(1, 2)
+        )
+        obj = step.to_dict()
+        self.assertEquals(obj['within'], [0, 0])
+        second = obj['steps'][0]
+        self.assertEquals(second['expression'], "action == 'signup'")
+        self.assertEquals(second['within'], [1, 2])
+        third = second['steps'][0]
+        self.assertEquals(third['expression'], "action == 'buy'")
+        self.assertEquals(third['steps'][0]['fields'][0]['name'], 'count')
+        self.assertRaises(QueryError, funnel, [])
+
+    def test_steps_must_have_json(self):
+        self.assertRaises(TypeError, Step)
+
+    def test_session_idle_time(self):
+        q = Query(Selection().count(), session_idle_time=7200)
+        self.assertEquals(q.to_dict()['sessionIdleTime'], 7200)
+        self.assertRaises(TypeError, Query, bad=1)
+
+    def test_compile_is_canonical(self):
+        q = Query(Selection().group_by('country').count()).compile()
+        self.assertEquals(
+            q.body,
+            json.dumps(
+                q.to_dict(),
+                sort_keys=True,
+                separators=(',', ':')
+            ).encode('utf-8')
+        )
+        again = Query(Selection().group_by('country').count()).compile()
+        self.assertEquals(q, again)
+        self.assertEquals(hash(q), hash(again))
+        self.assertEquals(len(set([q, again])), 1)
+
+    def test_compiled_query_is_immutable(self):
+        q = Query().compile()
+        self.assertRaises(AttributeError, setattr, q, 'body', b'{}')
+        self.assertIsInstance(q, CompiledQuery)
+
+    def test_expression_identifiers(self):
+        self.assertEquals(
+            expression_identifiers(
+                "action == 'buy now' && price > 10.5 || count() > 1"
+            ),
+            set(['action', 'price'])
+        )
+        self.assertEquals(
+            expression_identifiers('sum(price) AND true'),
+            set(['price'])
+        )
+
+    def test_validate(self):
+        q = Query(
+            Condition("action == 'buy'").then(
+                Selection().group_by('country').sum('price')
+            )
+        )
+        q.compile(self.properties)
+        bad = Query(Selection().group_by('city').sum('amount'))
+        with self.assertRaises(QueryError) as cm:
+            bad.compile(self.properties)
+        self.assertIn('amount, city', str(cm.exception))
+
+    def test_template(self):
+        template = Query(
+            Condition(Param('first'), within=Param('within')).then(
+                Selection().count()
+            )
+        ).template(self.properties)
+        self.assertEquals(template.params, ['first', 'within'])
+
+        q = template.bind(first="action == 'home'", within=[1, 2])
+        expected = Query(
+            Condition("action == 'home'", within=(1, 2)).then(
+                Selection().count()
+            )
+        ).compile()
+        self.assertEquals(q, expected)
+
+        other = template.bind(first="action == 'buy'", within=[1, 2])
+        self.assertEquals(other.to_dict()['steps'][0]['expression'], (
+            "action == 'buy'"
+        ))
+
+    def test_template_reuses_unchanged_parameters(self):
+        template = Query(Condition(Param('expr'))).template()
+        first = template.encode('expr', 'a == 1')
+        self.assertIs(template.encode('expr', 'a == 1'), first)
+        self.assertIsNot(template.encode('expr', 'a == 2'), first)
+
+    def test_template_sees_parameters_changed_in_place(self):
+        template = Query(
+            Condition('a == 1', within=Param('within'))
+        ).template()
+        within = [0, 1]
+        template.bind(within=within)
+        within[1] = 7
+        self.assertEquals(
+            template.bind(within=within).to_dict()['steps'][0]['within'],
+            [0, 7]
+        )
+
+    def test_template_tells_equal_values_of_other_types_apart(self):
+        template = Query(Condition(Param('expr'))).template()
+        self.assertEquals(template.encode('expr', 1), b'1')
+        self.assertEquals(template.encode('expr', True), b'true')
+        self.assertEquals(template.encode('expr', 1.0), b'1.0')
+        self.assertEquals(template.encode('expr', [1, 2]), b'[1,2]')
+        self.assertEquals(template.encode('expr', [True, 2]), b'[true,2]')
+        self.assertEquals(
+            template.bind(expr={'a': 1}).body,
+            b'{"steps":[{"expression":{"a":1},"steps":[],'
+            b'"type":"condition","within":[0,0],"withinUnits":"steps"}]}'
+        )
+        self.assertIn(b'{"a":false}', template.bind(expr={'a': False}).body)
+
+    def test_template_requires_all_parameters(self):
+        template = Query(Condition(Param('expr'))).template()
+        self.assertRaises(QueryError, template.bind)
+        self.assertRaises(
+            QueryError,
+            Query(Condition(Param('expr'))).compile
+        )
+
+    def test_template_escapes_parameter_values(self):
+        template = Query(Condition(Param('expr'))).template()
+        q = template.bind(expr='name == "\\u00e9\u00e9"')
+        self.assertEquals(
+            q.to_dict()['steps'][0]['expression'],
+            'name == "\\u00e9\u00e9"'
+        )
@@ -60,6 +60,55 @@ class TestEvent(TestCase):
         event = resources.Event()
         self.assertEquals(event.timestamp, self.dt)
 
+    def test_data_default_is_not_shared(self):
+        event = resources.Event()
+        event.data['a'] = 1
+        self.assertEquals(resources.Event().data, {})
+
+    def test_has_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            resources.Event().custard = 1
+
+    @patch('sky.resources.ts.loads')
+    def test_from_dict_parses_timestamp_lazily(self, loads):
+        loads.return_value = self.dt
+        event = resources.Event().from_dict({'timestamp': self.dts})
+        self.assertFalse(loads.called)
+        self.assertEquals(event.timestamp, self.dt)
+        self.assertEquals(event.timestamp, self.dt)
+        loads.assert_called_once_with(self.dts)
+
+    @patch('sky.resources.datetime')
+    def test_from_dict_fast(self, mock_dt):
+        event = resources.Event.from_dict_fast({
+            'timestamp': self.dts,
+            'data': {'num': 123}
+        })
+        self.assertFalse(mock_dt.utcnow.called)
+        self.assertEquals(event.data, {'num': 123})
+        self.assertEquals(event.timestamp, self.dt)
+
+    def test_from_dict_fast_with_no_timestamp(self):
+        event = resources.Event.from_dict_fast({})
+        self.assertIsInstance(event.timestamp, datetime)
+        self.assertEquals(event.data, {})
+
+    @patch('sky.resources.ts.loads')
+    def test_to_dict_reuses_unparsed_timestamp(self, loads):
+        event = resources.Event.from_dict_fast({'timestamp': self.dts})
+        self.assertEquals(event.to_dict()['timestamp'], self.dts)
+        self.assertFalse(loads.called)
+
+    def test_setting_timestamp_replaces_unparsed_timestamp(self):
+        event = resources.Event.from_dict_fast({'timestamp': self.dts})
+        later = self.dt.replace(year=2015)
+        event.timestamp = later
+        self.assertEquals(event.timestamp, later)
+        self.assertEquals(
+            event.to_dict()['timestamp'],
+            '2015-02-21T10:10:23.000203Z'
+        )
+
 
 class TestProperty(TestCase):
 
@@ -176,6 +225,13 @@ class TestTable(TestCase):
         table.get_events(123)
         client.get_events.assert_called_once_with(table, 123)
 
+    def test_iter_events(self):
+        client = Mock()
+        client.iter_events = Mock(return_value=iter([]))
+        table = resources.Table(name='test', client=client)
+        table.iter_events(123, chunk_size=10)
+        client.iter_events.assert_called_once_with(table, 123, chunk_size=10)
+
     def test_get_event(self):
         client = Mock()
         client.get_event = Mock(return_value={})
@@ -189,14 +245,27 @@ class TestTable(TestCase):
 
     def test_add_event(self):
         client = Mock()
-        client.add_event = Mock(return_value={})
+        client.create_event = Mock(return_value={})
         table = resources.Table(name='test', client=client)
         event = resources.Event(timestamp=self.dt)
         table.add_event(123, event)
-        client.add_event.assert_called_once_with(
+        client.create_event.assert_called_once_with(
             table,
             123,
-            event
+            event,
+            True
+        )
+
+    def test_create_events(self):
+        client = Mock()
+        client.create_events = Mock(return_value=None)
+        table = resources.Table(name='test', client=client)
+        events = [(123, resources.Event(timestamp=self.dt))]
+        table.create_events(events, batch_size=10)
+        client.create_events.assert_called_once_with(
+            table,
+            events,
+            batch_size=10
         )
 
     def test_delete_event(self):
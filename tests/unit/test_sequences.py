@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import random
+
+from unittest import TestCase
+
+from sky import resources
+from sky import timestamp as ts
+from sky.analytics import LocalQuery
+from sky.frame import EventFrame
+from sky.query import QueryError, Selection
+from sky.sequences import Funnel, SequenceQuery, Sessions, iter_sessions
+
+
+PROPERTIES = [
+    resources.Property(1, 'action', False, 'factor'),
+    resources.Property(2, 'price', False, 'integer'),
+]
+
+
+def make_objects(count, seed=7):
+    rng = random.Random(seed)
+    objects = []
+    for _ in range(count):
+        micros = 0
+        rows = []
+        for _ in range(rng.randint(0, 30)):
+            micros += rng.choice((1, 2, 3, 60, 1800)) * 1000000
+            rows.append((micros, {
+                'action': rng.choice(('view', 'cart', 'buy')),
+                'price': rng.randint(1, 5),
+            }))
+        objects.append(rows)
+    return objects
+
+
+OBJECTS = make_objects(60)
+
+STEPS = ["action == 'view'", "action == 'cart'", "action == 'buy'"]
+
+
+class TestFunnel(TestCase):
+
+    def test_matches_server_query(self):
+        for within, units in (
+            ((1, 1), 'steps'),
+            ((1, 4), 'steps'),
+            ((0, 2), 'steps'),
+            ((0, 120), 'seconds'),
+            ((2, 3600), 'seconds'),
+        ):
+            f = Funnel(
+                STEPS,
+                within,
+                units,
+                Selection().group_by('price').count().sum('price')
+            )
+            q = f.query().to_dict()
+            expected = LocalQuery(q).run(OBJECTS)
+            self.assertEquals(f.run(OBJECTS), expected, q)
+            frames = [EventFrame.from_rows(r, PROPERTIES) for r in OBJECTS]
+            self.assertEquals(f.run(frames), expected, q)
+
+    def test_single_step(self):
+        f = Funnel(["action == 'buy'"])
+        self.assertEquals(
+            f.run(OBJECTS),
+            LocalQuery(f.query()).run(OBJECTS)
+        )
+
+    def test_starts_are_merged(self):
+        rows = [(n, {'action': 'view'}) for n in range(1000)]
+        rows.append((1000, {'action': 'buy'}))
+        f = Funnel(["action == 'view'", "action == 'buy'"], within=(1, 5))
+        self.assertEquals(f.run([rows]), {'count': 5})
+        f = Funnel(
+            ["action == 'view'", "action == 'view'", "action == 'buy'"],
+            within=(1, 1000)
+        )
+        self.assertEquals(
+            f.run([rows]),
+            LocalQuery(f.query()).run([rows])
+        )
+
+    def test_sessions(self):
+        f = Funnel(STEPS, within=(1, 10), session_idle_time=600)
+        self.assertEquals(f.query().to_dict()['sessionIdleTime'], 600)
+        sessions = [
+            session
+            for rows in OBJECTS
+            for session in iter_sessions(rows, 600)
+        ]
+        self.assertEquals(
+            f.run(OBJECTS),
+            LocalQuery(f.query()).run(sessions)
+        )
+        self.assertNotEquals(
+            f.run(OBJECTS),
+            Funnel(STEPS, within=(1, 10)).run(OBJECTS)
+        )
+
+    def test_processes(self):
+        f = Funnel(STEPS, within=(1, 3))
+        self.assertEquals(
+            f.run(OBJECTS, processes=2, chunk_size=7),
+            f.run(OBJECTS)
+        )
+        self.assertEquals(f.run([], processes=2), {})
+
+    def test_nobody_completes(self):
+        f = Funnel(["action == 'view'", "action == 'refund'"])
+        self.assertEquals(f.run(OBJECTS), {})
+        self.assertEquals(f.run(OBJECTS), LocalQuery(f.query()).run(OBJECTS))
+        self.assertEquals(f.run(OBJECTS, processes=2), {})
+
+    def test_invalid(self):
+        self.assertRaises(QueryError, Funnel, [])
+        self.assertRaises(TypeError, SequenceQuery, Selection().count())
+        self.assertRaises(QueryError, Funnel, STEPS, within=(-1, 1))
+        self.assertRaises(QueryError, Funnel, STEPS, within_units='days')
+        self.assertRaises(QueryError, Funnel, ['action =='])
+
+
+class TestSessions(TestCase):
+
+    def setUp(self):
+        self.rows = [
+            (seconds * 1000000, {'action': action})
+            for seconds, action in (
+                (0, 'view'),
+                (10, 'buy'),
+                (1000, 'view'),
+                (2000, 'view'),
+                (2030, 'buy'),
+            )
+        ]
+
+    def test_iter_sessions(self):
+        self.assertEquals(
+            [len(s) for s in iter_sessions(self.rows, 300)],
+            [2, 1, 2]
+        )
+        events = [
+            resources.Event(data, ts.from_micros(micros))
+            for micros, data in self.rows
+        ]
+        self.assertEquals(
+            [[e.data['action'] for e in s] for s in iter_sessions(events, 0)],
+            [['view'], ['buy'], ['view'], ['view'], ['buy']]
+        )
+        frame = EventFrame.from_rows(self.rows, PROPERTIES)
+        sessions = list(iter_sessions(frame, 300))
+        self.assertEquals([len(s) for s in sessions], [2, 1, 2])
+        self.assertEquals(list(sessions[2]['action']), ['view', 'buy'])
+        self.assertEquals(list(iter_sessions([], 300)), [])
+
+    def test_run(self):
+        expected = {
+            'sessions': 3,
+            'sum_events': 5,
+            'sum_duration': 40.0,
+            'max_duration': 30.0,
+        }
+        sessions = Sessions(300)
+        self.assertEquals(sessions.run([self.rows]), expected)
+        frame = EventFrame.from_rows(self.rows, PROPERTIES)
+        self.assertEquals(sessions.run([frame]), expected)
+        self.assertEquals(
+            Sessions(
+                300,
+                Selection().group_by('action').count()
+            ).run([self.rows, self.rows[:1]]),
+            {'action': {'view': {'count': 4}}}
+        )
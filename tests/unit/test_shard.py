@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+import json
+import pytz
+
+from unittest import TestCase
+from mock import Mock, patch
+from datetime import datetime
+from requests import ConnectionError, HTTPError, RequestException
+
+from sky import resources
+from sky.client import SkyClient
+from sky.query import Query, Selection
+from sky.shard import (
+    HashRing,
+    ShardedSkyClient,
+    merge_results,
+    query_aggregates,
+)
+
+
+class TestHashRing(TestCase):
+
+    def test_spreads_keys_evenly(self):
+        ring = HashRing(['a:1', 'b:1', 'c:1', 'd:1'])
+        counts = [0] * 4
+        for key in range(10000):
+            counts[ring.get(key)] += 1
+        self.assertTrue(all(1500 < count < 3500 for count in counts))
+
+    def test_adding_a_node_moves_few_keys(self):
+        before = HashRing(['a:1', 'b:1', 'c:1', 'd:1'])
+        after = HashRing(['a:1', 'b:1', 'c:1', 'd:1', 'e:1'])
+        moved = sum(1 for key in range(10000) if before(key) != after(key))
+        self.assertTrue(moved < 3000)
+        # Keys only ever move to the new node
+        self.assertTrue(all(
+            after(key) == 4
+            for key in range(10000) if before(key) != after(key)
+        ))
+
+    def test_ids_hash_as_strings(self):
+        ring = HashRing(['a:1', 'b:1'])
+        self.assertEquals(ring.get(123), ring.get('123'))
+
+    def test_needs_nodes(self):
+        self.assertRaises(ValueError, HashRing, [])
+
+
+class TestMerge(TestCase):
+
+    def test_query_aggregates(self):
+        q = Query(
+            Selection().count().field('low', 'min(price)').field(
+                'mean',
+                'avg(price)'
+            )
+        )
+        self.assertEquals(
+            query_aggregates(q),
+            {'count': 'count', 'low': 'min', 'mean': 'avg'}
+        )
+        self.assertEquals(query_aggregates(q.compile()), query_aggregates(q))
+        self.assertEquals(query_aggregates([]), {})
+
+    def test_merges_group_by_buckets(self):
+        aggregates = {'count': 'count', 'low': 'min', 'high': 'max'}
+        left = {'country': {
+            'UK': {'count': 2, 'low': 5, 'high': 9},
+            'US': {'count': 1, 'low': 3, 'high': 3},
+        }}
+        right = {'country': {
+            'UK': {'count': 3, 'low': 1, 'high': 7},
+            'FR': {'count': 4, 'low': 2, 'high': 8},
+        }}
+        self.assertEquals(
+            merge_results([left, right, None], aggregates),
+            {'country': {
+                'UK': {'count': 5, 'low': 1, 'high': 9},
+                'US': {'count': 1, 'low': 3, 'high': 3},
+                'FR': {'count': 4, 'low': 2, 'high': 8},
+            }}
+        )
+        # The shard results are left alone, they may be cached
+        self.assertEquals(left['country']['UK']['count'], 2)
+
+    def test_unmergeable_aggregates_raise(self):
+        with self.assertRaises(ValueError):
+            merge_results([{'mean': 1.5}, {'mean': 2.5}], {'mean': 'avg'})
+        with self.assertRaises(ValueError):
+            merge_results([{'count': 1}, {'count': 'x'}])
+
+
+@patch('sky.client.requests')
+class TestShardedSkyClient(TestCase):
+
+    ports = (8001, 8002, 8003)
+
+    def setUp(self):
+        self.dt = datetime(2014, 2, 21, 10, 10, 23, 203, tzinfo=pytz.utc)
+        self.table = resources.Table(name='users')
+
+    def get_mock_response(self, payload):
+        response = Mock()
+        response.raise_for_status = Mock()
+        response.content = json.dumps(payload).encode('utf-8')
+        return response
+
+    def get_client(self, requests, payloads=None, **kwargs):
+        """
+        Stand in for one server per port; every request is recorded
+        against its port and answered with that port's payload
+        """
+        self.calls = dict((port, []) for port in self.ports)
+        payloads = payloads or {}
+
+        def handle(url, data=None, **kwargs):
+            if data is not None and not isinstance(data, bytes):
+                # Drain streamed bulk bodies as a server would
+                list(data)
+            port = int(url.split(':')[2].split('/')[0])
+            self.calls[port].append(url)
+            payload = payloads.get(port, {})
+            if isinstance(payload, Exception):
+                raise payload
+            return self.get_mock_response(payload)
+
+        for method in ('get', 'post', 'put', 'patch', 'delete'):
+            setattr(requests.Session(), method, Mock(side_effect=handle))
+        return ShardedSkyClient(
+            ['127.0.0.1:%d' % port for port in self.ports],
+            codec='json',
+            **kwargs
+        )
+
+    def port_for(self, client, object_id):
+        return client.client_for(object_id).port
+
+    def test_nodes(self, requests):
+        node = SkyClient('10.0.0.1', 8585)
+        client = ShardedSkyClient([node, ('10.0.0.2', 8585), '10.0.0.3:8586'])
+        self.assertIs(client.clients[0], node)
+        self.assertEquals(client.clients[1].host, '10.0.0.2')
+        self.assertEquals(client.clients[2].port, 8586)
+
+    def test_custom_shard_func(self, requests):
+        client = self.get_client(requests, shard_func=lambda object_id: 2)
+        client.create_event(self.table, 'a', resources.Event(
+            timestamp=self.dt
+        ))
+        self.assertEquals(len(self.calls[8003]), 1)
+
+    def test_writes_go_to_the_owning_shard(self, requests):
+        client = self.get_client(requests)
+        for object_id in range(20):
+            client.create_event(self.table, object_id, resources.Event(
+                timestamp=self.dt
+            ))
+        for port, urls in self.calls.items():
+            for url in urls:
+                object_id = int(url.split('/')[6])
+                self.assertEquals(self.port_for(client, object_id), port)
+        self.assertTrue(all(self.calls.values()))
+
+    def test_reads_go_to_the_owning_shard(self, requests):
+        client = self.get_client(requests)
+        client.get_events(self.table, 'user-1')
+        port = self.port_for(client, 'user-1')
+        self.assertEquals(
+            self.calls[port],
+            ['http://127.0.0.1:%d/tables/users/objects/user-1/events' % port]
+        )
+
+    def test_get_events_many_reads_each_owning_shard(self, requests):
+        requests.RequestException = RequestException
+        client = self.get_client(requests, payloads={
+            8001: [],
+            8002: RequestException('down'),
+            8003: [],
+        })
+        object_ids = ['user-%d' % i for i in range(12)]
+        results = list(client.get_events_many(self.table, object_ids))
+        self.assertEquals([r.object_id for r in results], object_ids)
+        for result in results:
+            port = self.port_for(client, result.object_id)
+            self.assertIn(
+                'http://127.0.0.1:%d/tables/users/objects/%s/events' % (
+                    port,
+                    result.object_id
+                ),
+                self.calls[port]
+            )
+            if port == 8002:
+                self.assertIsInstance(result.error, RequestException)
+            else:
+                self.assertEquals(result.events, [])
+        self.assertEquals(sum(len(c) for c in self.calls.values()), 12)
+
+    def test_create_events_splits_by_shard(self, requests):
+        client = self.get_client(requests)
+        events = [
+            (object_id, resources.Event(timestamp=self.dt))
+            for object_id in range(30)
+        ]
+        result = client.create_events(self.table, events)
+        self.assertEquals(result.written, 30)
+        self.assertEquals(
+            sum(len(urls) for urls in self.calls.values()),
+            len([urls for urls in self.calls.values() if urls])
+        )
+
+    def test_create_events_reports_original_indexes(self, requests):
+        requests.HTTPError = HTTPError
+        requests.RequestException = RequestException
+        client = self.get_client(
+            requests,
+            payloads={8002: RequestException('down')}
+        )
+        events = [
+            (object_id, resources.Event(timestamp=self.dt))
+            for object_id in range(30)
+        ]
+        result = client.create_events(self.table, events)
+        failed = [
+            index for index, (object_id, event) in enumerate(events)
+            if self.port_for(client, object_id) == 8002
+        ]
+        self.assertEquals([f.index for f in result.failures], failed)
+        self.assertEquals(result.written, 30 - len(failed))
+        for failure in result.failures:
+            self.assertEquals(failure.object_id, events[failure.index][0])
+
+    def test_create_events_writes_while_reading(self, requests):
+        client = self.get_client(requests, shard_func=lambda object_id: 0)
+        written = []
+
+        def events():
+            for object_id in range(10):
+                written.append(len(self.calls[8001]))
+                yield object_id, resources.Event(timestamp=self.dt)
+
+        result = client.create_events(self.table, events(), batch_size=4)
+        self.assertEquals(result.written, 10)
+        self.assertEquals(len(self.calls[8001]), 3)
+        # The first batch went out before the ninth event was read
+        self.assertTrue(written[8] >= 1)
+
+    def test_query_fans_out_and_merges(self, requests):
+        client = self.get_client(requests, payloads={
+            8001: {'count': 1, 'action': {'buy': {'count': 1}}},
+            8002: {'count': 2, 'action': {'buy': {'count': 2}}},
+            8003: {'count': 4, 'action': {'view': {'count': 4}}},
+        })
+        result = client.query(
+            self.table,
+            Query(Selection().group_by('action').count())
+        )
+        self.assertEquals(
+            result,
+            {'count': 7, 'action': {'buy': {'count': 3}, 'view': {'count': 4}}}
+        )
+        for port in self.ports:
+            self.assertEquals(
+                self.calls[port],
+                ['http://127.0.0.1:%d/tables/users/query' % port]
+            )
+
+    def test_query_many_merges_each_query(self, requests):
+        requests.RequestException = RequestException
+        client = self.get_client(requests, payloads={
+            8001: {'count': 1},
+            8002: {'count': 2},
+            8003: {'count': 4},
+        })
+        other = resources.Table(name='orders')
+        q = Query(Selection().count())
+        results = list(client.query_many([(self.table, q), (other, q)]))
+        self.assertEquals([r.index for r in results], [0, 1])
+        self.assertEquals([r.table for r in results], [self.table, other])
+        self.assertEquals([r.result for r in results], [
+            {'count': 7},
+            {'count': 7},
+        ])
+        for port in self.ports:
+            self.assertEquals(sorted(self.calls[port]), [
+                'http://127.0.0.1:%d/tables/orders/query' % port,
+                'http://127.0.0.1:%d/tables/users/query' % port,
+            ])
+
+    def test_query_many_reports_failures(self, requests):
+        requests.RequestException = RequestException
+        client = self.get_client(requests, payloads={
+            8001: {'count': 1},
+            8002: {'count': 2},
+            8003: RequestException('down'),
+        })
+        q = Query(Selection().count())
+        result, = client.query_many([(self.table, q)])
+        self.assertIsNone(result.result)
+        self.assertIsInstance(result.error, RequestException)
+
+    def test_schema_changes_go_to_every_shard(self, requests):
+        client = self.get_client(requests, payloads=dict(
+            (port, {'name': 'users'}) for port in self.ports
+        ))
+        table = client.create_table(resources.Table(name='users'))
+        self.assertIs(table.client, client)
+        self.assertTrue(all(len(urls) == 1 for urls in self.calls.values()))
+
+    def test_tables_are_bound_to_the_sharded_client(self, requests):
+        payloads = {8001: {'name': 'users'}}
+        client = self.get_client(requests, payloads)
+        table = client.users
+        self.assertIs(table.client, client)
+        self.assertEquals(len(self.calls[8001]), 1)
+        payloads[8001] = []
+        table.get_events('user-1')
+        port = self.port_for(client, 'user-1')
+        self.assertEquals(self.calls[port][-1].split('/')[-2], 'user-1')
+
+    def test_ping(self, requests):
+        requests.RequestException = RequestException
+        client = self.get_client(requests)
+        self.assertTrue(client.ping())
+        client = self.get_client(
+            requests,
+            payloads={8003: ConnectionError('down')}
+        )
+        self.assertFalse(client.ping())
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import pytz
+import requests
+
+from unittest import TestCase
+from mock import Mock
+from datetime import datetime, timedelta
+
+from sky import resources
+from sky.bulk import BulkResult
+from sky.spool import DEAD_LETTER_NAME, Spool
+
+
+class TestSpool(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.dt = datetime(2014, 2, 21, 10, 10, 23, 203, tzinfo=pytz.utc)
+        self.table = resources.Table(name='users')
+        self.batches = []
+        self.client = Mock()
+        self.client.create_events = Mock(side_effect=self.create_events)
+
+    def create_events(self, table, events, **kwargs):
+        self.batches.append((table.name, list(events), kwargs))
+        result = BulkResult()
+        result.written = len(events)
+        return result
+
+    def get_spool(self, **kwargs):
+        kwargs.setdefault('codec', 'json')
+        spool = Spool(self.directory, **kwargs)
+        self.addCleanup(spool.close)
+        return spool
+
+    def events(self, count, start=0):
+        return [
+            (i, resources.Event({'n': i}, self.dt + timedelta(seconds=i)))
+            for i in range(start, start + count)
+        ]
+
+    def replayed(self):
+        return [
+            (object_id, event.data['n'], event.timestamp)
+            for name, events, kwargs in self.batches
+            for object_id, event in events
+        ]
+
+    def segments(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_replay_writes_events_in_order(self):
+        spool = self.get_spool()
+        spool.extend(self.table, self.events(3))
+        spool.append(self.table, 3, self.events(1, 3)[0][1])
+        self.assertEquals(spool.pending, 4)
+        self.assertEquals(spool.replay(self.client), 4)
+        self.assertEquals(
+            self.replayed(),
+            [(i, i, self.dt + timedelta(seconds=i)) for i in range(4)]
+        )
+        self.assertEquals(self.batches[0][0], 'users')
+        self.assertEquals(
+            self.batches[0][2],
+            {'replace': True, 'batch_size': 1000}
+        )
+        self.assertEquals(spool.pending, 0)
+        self.assertEquals(self.segments(), [])
+
+    def test_batches_split_by_table_replace_and_size(self):
+        spool = self.get_spool()
+        other = resources.Table(name='other')
+        spool.extend(self.table, self.events(3))
+        spool.extend(other, self.events(1))
+        spool.extend(self.table, self.events(1), replace=False)
+        spool.replay(self.client, batch_size=2)
+        self.assertEquals(
+            [
+                (name, len(events), kwargs['replace'])
+                for name, events, kwargs in self.batches
+            ],
+            [
+                ('users', 2, True),
+                ('users', 1, True),
+                ('other', 1, True),
+                ('users', 1, False),
+            ]
+        )
+
+    def test_rolls_over_segments(self):
+        spool = self.get_spool(segment_bytes=512)
+        spool.extend(self.table, self.events(20))
+        self.assertTrue(len(self.segments()) > 1)
+        spool.replay(self.client)
+        self.assertEquals([r[0] for r in self.replayed()], list(range(20)))
+        self.assertEquals(self.segments(), [])
+
+    def test_reopen_recovers_pending_events(self):
+        spool = self.get_spool(segment_bytes=512)
+        spool.extend(self.table, self.events(20))
+        spool.close()
+        spool = self.get_spool(segment_bytes=512)
+        self.assertEquals(spool.pending, 20)
+        spool.extend(self.table, self.events(1, 20))
+        spool.replay(self.client)
+        self.assertEquals([r[0] for r in self.replayed()], list(range(21)))
+
+    def test_torn_record_is_cut_off(self):
+        spool = self.get_spool()
+        spool.extend(self.table, self.events(3))
+        spool.close()
+        path = os.path.join(self.directory, self.segments()[0])
+        with open(path, 'r+b') as f:
+            data = f.read()
+            # Damage the last record's payload
+            end = data.index(b'\0' * 8)
+            f.seek(end - 2)
+            f.write(b'!!')
+        spool = self.get_spool()
+        self.assertEquals(spool.pending, 2)
+        spool.extend(self.table, self.events(1, 5))
+        spool.replay(self.client)
+        self.assertEquals([r[0] for r in self.replayed()], [0, 1, 5])
+
+    def test_leftover_rollover_files_are_removed(self):
+        open(os.path.join(self.directory, '0001.seg.tmp'), 'wb').close()
+        self.get_spool()
+        self.assertEquals(self.segments(), [])
+
+    def test_failed_replay_keeps_segment(self):
+        spool = self.get_spool()
+        spool.extend(self.table, self.events(3))
+        failing = BulkResult()
+        failing.written = 2
+        failing.add_failure(2, 2, None, requests.ConnectionError('down'))
+        self.client.create_events = Mock(return_value=failing)
+        self.assertEquals(spool.replay(self.client), 2)
+        self.assertEquals(spool.pending, 3)
+        self.assertEquals(len(self.segments()), 1)
+
+        # Replaying again rewrites the whole segment, which PUT makes safe
+        self.client.create_events = Mock(side_effect=self.create_events)
+        self.assertEquals(spool.replay(self.client), 3)
+        self.assertEquals(self.segments(), [])
+
+    def reject(self, rejected, error):
+        """create_events failing the events whose ``n`` is in ``rejected``"""
+        def create_events(table, events, **kwargs):
+            self.batches.append((table.name, list(events), kwargs))
+            result = BulkResult()
+            for index, (object_id, event) in enumerate(events):
+                if event.data['n'] in rejected:
+                    result.add_failure(index, object_id, event, error)
+                else:
+                    result.written += 1
+            return result
+        self.client.create_events = Mock(side_effect=create_events)
+
+    def test_rejected_event_is_passed_over(self):
+        spool = self.get_spool(segment_bytes=512)
+        spool.extend(self.table, self.events(20))
+        response = Mock(status_code=400)
+        self.reject(set([5]), requests.HTTPError('bad', response=response))
+        failures = []
+        self.assertEquals(
+            spool.replay(
+                self.client,
+                batch_size=4,
+                on_failure=lambda table, f: failures.extend(f)
+            ),
+            19
+        )
+        self.assertEquals([f.object_id for f in failures], [5])
+        self.assertEquals(spool.pending, 0)
+        self.assertEquals(spool.rejected, 1)
+        self.assertEquals(self.segments(), [])
+
+    def test_rejected_events_go_to_dead_letter_file(self):
+        spool = self.get_spool()
+        spool.extend(self.table, self.events(3))
+        self.reject(set([1]), ValueError('Unknown property'))
+        self.assertEquals(spool.replay(self.client), 2)
+        self.assertEquals(self.segments(), [DEAD_LETTER_NAME])
+        with open(os.path.join(self.directory, DEAD_LETTER_NAME)) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEquals(
+            [(r['id'], r['table'], r['data'], r['error']) for r in records],
+            [(1, 'users', {'n': 1}, 'Unknown property')]
+        )
+
+        # Written again on reopening, the dead letters are not replayed
+        spool.close()
+        self.assertEquals(self.get_spool().pending, 0)
+
+    def test_always_failing_event_is_given_up_on(self):
+        spool = self.get_spool()
+        spool.extend(self.table, self.events(3))
+        response = Mock(status_code=500)
+        self.reject(set([1]), requests.HTTPError('boom', response=response))
+        for attempt in range(2):
+            self.assertEquals(spool.replay(self.client, max_attempts=3), 2)
+            self.assertEquals(spool.pending, 3)
+        self.assertEquals(spool.replay(self.client, max_attempts=3), 2)
+        self.assertEquals(spool.pending, 0)
+        self.assertEquals(spool.rejected, 1)
+
+    def test_syncs_in_batches(self):
+        spool = self.get_spool(sync_every=3, sync_interval=60)
+        spool.extend(self.table, self.events(2))
+        self.assertEquals(spool._unsynced, 2)
+        spool.extend(self.table, self.events(1, 2))
+        self.assertEquals(spool._unsynced, 0)
+
+    def test_rejects_events_bigger_than_a_segment(self):
+        spool = self.get_spool(segment_bytes=64)
+        self.assertRaises(
+            ValueError,
+            spool.append,
+            self.table,
+            1,
+            resources.Event({'s': 'x' * 100}, self.dt)
+        )
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import json
+
+from unittest import TestCase
+
+from sky.stream import JSONArrayDecoder, iter_json_array
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestIterJsonArray(TestCase):
+
+    def setUp(self):
+        self.items = [
+            {'timestamp': '2014-02-21T10:10:23.000203Z', 'data': {'n': i}}
+            for i in range(20)
+        ] + [u'caf\xe9', 12345, -1.5e3, True, None, []]
+        self.data = json.dumps(self.items).encode('utf-8')
+
+    def test_any_chunking_decodes_the_same(self):
+        for size in (1, 2, 3, 7, 64, len(self.data)):
+            self.assertEquals(
+                list(iter_json_array(chunked(self.data, size))),
+                self.items
+            )
+
+    def test_empty_array(self):
+        self.assertEquals(list(iter_json_array([b' [', b' ] '])), [])
+
+    def test_items_are_yielded_before_the_end(self):
+        decoder = JSONArrayDecoder()
+        self.assertEquals(decoder.feed(b'[{"a": 1}, {"a"'), [{'a': 1}])
+        self.assertEquals(decoder.feed(b': 2}]'), [{'a': 2}])
+        self.assertEquals(decoder.close(), [])
+
+    def test_malformed_input(self):
+        for data in (b'{}', b'[1 2]', b'[1]x', b'[1,]', b'[1,', b'[\xc3'):
+            with self.assertRaises(ValueError):
+                list(iter_json_array([data]))
+
+    def test_buffer_is_bounded(self):
+        decoder = JSONArrayDecoder(max_buffer=16)
+        decoder.feed(b'[' + b'{"a": 1}, ' * 100)
+        with self.assertRaises(ValueError):
+            decoder.feed(b'"' + b'x' * 32)
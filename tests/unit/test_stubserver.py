@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import json
+
+from unittest import TestCase
+
+from sky.stubserver import SkyStubServer, StubError, run_query
+
+
+def history(*actions):
+    return [
+        (n * 1000000, {'action': action, 'n': n})
+        for n, action in enumerate(actions)
+    ]
+
+
+class TestRunQuery(TestCase):
+
+    def test_selection(self):
+        result = run_query(
+            {'steps': [{
+                'type': 'selection',
+                'dimensions': ['action'],
+                'fields': [
+                    {'name': 'count', 'expression': 'count()'},
+                    {'name': 'first', 'expression': 'min(n)'},
+                ],
+            }]},
+            [history('view', 'buy', 'view'), history('view')]
+        )
+        self.assertEquals(result, {
+            'action': {
+                'view': {'count': 3, 'first': 0},
+                'buy': {'count': 1, 'first': 1},
+            }
+        })
+
+    def test_condition_within_steps(self):
+        step = {
+            'type': 'condition',
+            'expression': "action == 'view'",
+            'within': [0, 0],
+            'steps': [{
+                'type': 'condition',
+                'expression': "action == 'buy'",
+                'within': [1, 2],
+                'steps': [{
+                    'type': 'selection',
+                    'name': 'bought',
+                    'fields': [{'name': 'count', 'expression': 'count()'}],
+                }],
+            }],
+        }
+        result = run_query(
+            {'steps': [step]},
+            [history('view', 'x', 'buy'), history('view', 'x', 'x', 'buy')]
+        )
+        self.assertEquals(result, {'bought': {'count': 1}})
+
+    def test_condition_within_seconds(self):
+        step = {
+            'type': 'condition',
+            'expression': "action == 'view'",
+            'within': [0, 0],
+            'withinUnits': 'seconds',
+            'steps': [{
+                'type': 'condition',
+                'expression': "action == 'buy'",
+                'within': [1, 3],
+                'withinUnits': 'seconds',
+                'steps': [{
+                    'type': 'selection',
+                    'fields': [{'name': 'count', 'expression': 'count()'}],
+                }],
+            }],
+        }
+        result = run_query(
+            {'steps': [step]},
+            [
+                history('view', 'x', 'x', 'buy'),
+                history('view', 'x', 'x', 'x', 'buy'),
+            ]
+        )
+        self.assertEquals(result, {'count': 1})
+
+    def test_checks_the_query_up_front(self):
+        self.assertRaises(StubError, run_query, {'steps': [{
+            'type': 'selection',
+            'fields': [{'name': 'x', 'expression': 'median(n)'}],
+        }]}, [])
+        self.assertRaises(StubError, run_query, {'steps': [{
+            'type': 'loop',
+        }]}, [])
+
+    def test_rejects_local_only_fields(self):
+        for expression in ('distinct(n)', 'histogram(n, 5)'):
+            self.assertRaises(StubError, run_query, {'steps': [{
+                'type': 'condition',
+                'expression': 'true',
+                'steps': [{
+                    'type': 'selection',
+                    'fields': [{'name': 'x', 'expression': expression}],
+                }],
+            }]}, [history('view')])
+
+
+class TestDispatch(TestCase):
+
+    def setUp(self):
+        self.server = SkyStubServer()
+        self.addCleanup(self.server.server_close)
+
+    def dispatch(self, method, path, obj=None):
+        body = b'' if obj is None else json.dumps(obj).encode('utf-8')
+        return self.server.dispatch(method, path, body)
+
+    def test_events(self):
+        self.dispatch('post', '/tables', {'name': 't'})
+        self.dispatch('post', '/tables/t/properties', {'name': 'n'})
+        lines = b'\n'.join(
+            json.dumps({
+                'id': 'o',
+                'timestamp': '2014-02-21T10:00:0%d.000000Z' % n,
+                'data': {'n': n},
+            }).encode('utf-8')
+            for n in range(5)
+        )
+        self.assertEquals(
+            self.server.dispatch('put', '/tables/t/events', lines),
+            {'count': 5}
+        )
+        events = self.dispatch(
+            'get',
+            '/tables/t/objects/o/events?start=2014-02-21T10%3A00%3A01.000000Z'
+            '&limit=2'
+        )
+        self.assertEquals([e['data']['n'] for e in events], [1, 2])
+
+        self.server.supports_windows = False
+        events = self.dispatch('get', '/tables/t/objects/o/events?limit=2')
+        self.assertEquals(len(events), 5)
+
+    def test_errors(self):
+        for method, path, status in (
+            ('get', '/tables/missing', 404),
+            ('get', '/nowhere', 404),
+            ('post', '/ping', 405),
+        ):
+            with self.assertRaises(StubError) as context:
+                self.dispatch(method, path)
+            self.assertEquals(context.exception.status, status)
+
+    def test_injected_errors(self):
+        self.server.error_rate = 1
+        self.assertEquals(self.server.inject_faults(), 503)
+        self.server.error_rate = 0
+        self.assertIsNone(self.server.inject_faults())
+        self.assertEquals(self.server.requests, 2)
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 import pytz
+import random
 
 from unittest import TestCase
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from sky import timestamp
 
@@ -42,3 +43,98 @@ class TestDatetimeMarshalling(TestCase):
         local_dt = self.dt.replace(tzinfo=tz)
         dt = timestamp.loads(self.dts, tz)
         self.assertEquals(dt, local_dt)
+
+
+class TestFastCodec(TestCase):
+
+    def setUp(self):
+        self.random = random.Random(1234)
+        self.dts = '2014-02-21T10:10:23.000203Z'
+        self.micros = 1392977423000203
+
+    def random_datetime(self):
+        return datetime(1970, 1, 1) + timedelta(
+            days=self.random.randint(-354000, 2900000),
+            microseconds=self.random.randint(0, 86400 * 1000000 - 1)
+        )
+
+    def reference_dumps(self, dt):
+        if dt.tzinfo:
+            dt = dt.astimezone(pytz.utc)
+        return dt.strftime(timestamp.TIMESTAMP_FORMAT)
+
+    def test_round_trip_against_strptime_and_strftime(self):
+        for _ in range(2000):
+            dt = self.random_datetime()
+            s = timestamp.dumps(dt)
+            self.assertEquals(s, self.reference_dumps(dt))
+            self.assertEquals(
+                timestamp.loads(s),
+                datetime.strptime(s, timestamp.TIMESTAMP_FORMAT).replace(
+                    tzinfo=pytz.utc
+                )
+            )
+
+    def test_loads_uses_cached_utc(self):
+        self.assertIs(timestamp.loads(self.dts).tzinfo, pytz.utc)
+
+    def test_loads_falls_back_for_short_fractions(self):
+        self.assertEquals(
+            timestamp.loads('2014-02-21T10:10:23.2Z'),
+            datetime(2014, 2, 21, 10, 10, 23, 200000, pytz.utc)
+        )
+
+    def test_loads_rejects_malformed_timestamps(self):
+        with self.assertRaises(ValueError):
+            timestamp.loads('2014-02-21 10:10:23.000203')
+
+    def test_loads_many(self):
+        dt = timestamp.loads(self.dts)
+        self.assertEquals(
+            timestamp.loads_many([self.dts, '2014-02-21T10:10:23.000203Z']),
+            [dt, dt]
+        )
+
+    def test_dumps_many(self):
+        dt = datetime(2014, 2, 21, 10, 10, 23, 203)
+        self.assertEquals(timestamp.dumps_many([dt]), [self.dts])
+
+    def test_loads_micros(self):
+        self.assertEquals(timestamp.loads_micros(self.dts), self.micros)
+        self.assertEquals(
+            timestamp.loads_micros('1970-01-01T00:00:00.000000Z'),
+            0
+        )
+        self.assertEquals(
+            timestamp.loads_micros('1969-12-31T23:59:59.999999Z'),
+            -1
+        )
+
+    def test_micros_round_trip(self):
+        for _ in range(2000):
+            dt = self.random_datetime()
+            s = timestamp.dumps(dt)
+            micros = timestamp.loads_micros(s)
+            self.assertEquals(micros, timestamp.to_micros(dt))
+            self.assertEquals(timestamp.dumps_micros(micros), s)
+            self.assertEquals(
+                timestamp.from_micros(micros),
+                dt.replace(tzinfo=pytz.utc)
+            )
+
+    def test_micros_many(self):
+        self.assertEquals(
+            timestamp.loads_micros_many([self.dts]),
+            [self.micros]
+        )
+        self.assertEquals(
+            timestamp.dumps_micros_many([self.micros]),
+            [self.dts]
+        )
+
+    def test_to_micros_of_aware_datetime(self):
+        local = pytz.timezone('Australia/Melbourne')
+        dt = datetime(2014, 2, 21, 10, 10, 23, 203, pytz.utc).astimezone(
+            local
+        )
+        self.assertEquals(timestamp.to_micros(dt), self.micros)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import json
+import pytz
+
+from datetime import datetime
+from unittest import skipIf, TestCase
+
+from sky import bulk
+from sky import codec
+from sky import resources
+from sky import wire
+
+
+PROPERTIES = [
+    resources.Property(1, 'action', False, 'factor'),
+    resources.Property(2, 'price', False, 'float'),
+    resources.Property(3, 'count', False, 'integer'),
+    resources.Property(4, 'member', False, 'boolean'),
+    resources.Property(-1, 'page', True, 'string'),
+]
+
+
+@skipIf(wire.msgpack is None, 'msgpack is not installed')
+class TestEventEncoder(TestCase):
+
+    def setUp(self):
+        self.dt = datetime(2014, 2, 21, 10, 10, 23, 203, tzinfo=pytz.utc)
+        self.encoder = wire.EventEncoder(PROPERTIES)
+
+    def test_round_trip(self):
+        event = resources.Event(
+            {
+                'action': 'view',
+                'price': 3,
+                'count': 7,
+                'member': True,
+                'page': None,
+            },
+            self.dt
+        )
+        body = self.encoder.encode('user-1', event)
+        body += self.encoder.encode(
+            2,
+            resources.Event.from_dict_fast({
+                'timestamp': '2014-02-21T10:10:24.000000Z',
+                'data': {'count': 1},
+            })
+        )
+        decoded = list(wire.decode_events(body, PROPERTIES))
+        self.assertEquals(decoded, [
+            ('user-1', {
+                'timestamp': '2014-02-21T10:10:23.000203Z',
+                'data': {
+                    'action': 'view',
+                    'price': 3.0,
+                    'count': 7,
+                    'member': True,
+                    'page': None,
+                },
+            }),
+            (2, {
+                'timestamp': '2014-02-21T10:10:24.000000Z',
+                'data': {'count': 1},
+            }),
+        ])
+        self.assertIsInstance(decoded[0][1]['data']['price'], float)
+
+    def test_values_must_match_their_type(self):
+        for data in (
+            {'member': 'false'},
+            {'member': 1},
+            {'count': 3.9},
+            {'count': '7'},
+            {'count': True},
+            {'price': '9.99'},
+            {'price': False},
+            {'action': 5},
+            {'page': b'/home'},
+        ):
+            event = resources.Event(data, self.dt)
+            self.assertRaises(TypeError, self.encoder.encode, 1, event)
+
+    def test_mismatched_value_fails_its_event(self):
+        events = [
+            (1, resources.Event({'count': 1}, self.dt)),
+            (2, resources.Event({'member': 'false'}, self.dt)),
+            (3, resources.Event({'count': 2}, self.dt)),
+        ]
+        result = bulk.BulkResult()
+        batch = bulk.Batch(
+            enumerate(events),
+            result,
+            10,
+            1024,
+            codec.JSONCodec(),
+            self.encoder.encode
+        )
+        body = b''.join(batch.stream())
+        self.assertEquals([i for i, item in batch.items], [0, 2])
+        self.assertEquals([f.index for f in result.failures], [1])
+        self.assertIsInstance(result.failures[0].error, TypeError)
+        self.assertEquals(
+            [object_id for object_id, obj in wire.decode_events(
+                body,
+                PROPERTIES
+            )],
+            [1, 3]
+        )
+
+    def test_unknown_property(self):
+        event = resources.Event({'colour': 'red'}, self.dt)
+        self.assertRaises(ValueError, self.encoder.encode, 1, event)
+
+    def test_smaller_than_json(self):
+        event = resources.Event(
+            {'action': 'view', 'price': 9.99, 'count': 3, 'member': True},
+            self.dt
+        )
+        compact = self.encoder.encode('user-1', event)
+        ndjson = bulk.encode_event(codec.JSONCodec(), 'user-1', event)
+        self.assertTrue(len(compact) < len(ndjson) / 2.0)
+        self.assertEquals(json.loads(ndjson)['id'], 'user-1')
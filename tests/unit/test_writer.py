@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import threading
+import pytz
+
+from unittest import TestCase
+from mock import Mock
+from datetime import datetime, timedelta
+from requests import ConnectionError, HTTPError
+
+from sky import resources
+from sky.bulk import BulkResult
+from sky.spool import Spool
+from sky.writer import (
+    BLOCK,
+    DROP_OLDEST,
+    RAISE,
+    BufferFull,
+    BufferedEventWriter,
+)
+
+
+class TestBufferedEventWriter(TestCase):
+
+    def setUp(self):
+        self.dt = datetime(2014, 2, 21, 10, 10, 23, 203, tzinfo=pytz.utc)
+        self.table = resources.Table(name='users')
+        self.batches = []
+        self.client = Mock()
+        self.client.create_events = Mock(side_effect=self.create_events)
+
+    def create_events(self, table, events, **kwargs):
+        self.batches.append((table, list(events), kwargs))
+        result = BulkResult()
+        result.written = len(events)
+        return result
+
+    def event(self, seconds=0, **data):
+        return resources.Event(data, self.dt + timedelta(seconds=seconds))
+
+    def get_writer(self, **kwargs):
+        kwargs.setdefault('flush_interval', 60)
+        writer = BufferedEventWriter(self.client, **kwargs)
+        self.addCleanup(writer.close)
+        return writer
+
+    def written(self):
+        return [
+            (object_id, event.data)
+            for table, events, kwargs in self.batches
+            for object_id, event in events
+        ]
+
+    def test_add_event_returns_before_writing(self):
+        writer = self.get_writer()
+        writer.add_event(self.table, 1, self.event(n=1))
+        self.assertEquals(self.batches, [])
+        self.assertEquals(writer.stats()['queue_depth'], 1)
+        self.assertTrue(writer.flush(5))
+        self.assertEquals(self.written(), [(1, {'n': 1})])
+        table, events, kwargs = self.batches[0]
+        self.assertIs(table, self.table)
+        self.assertEquals(kwargs, {'replace': True, 'batch_size': 1000})
+
+    def test_flushes_by_size(self):
+        writer = self.get_writer(flush_size=3)
+        done = threading.Event()
+        self.client.create_events.side_effect = (
+            lambda *args, **kwargs: (
+                done.set(),
+                self.create_events(*args, **kwargs)
+            )[1]
+        )
+        for i in range(3):
+            writer.add_event(self.table, i, self.event(i))
+        self.assertTrue(done.wait(5))
+
+    def test_flushes_by_time(self):
+        now = [0]
+        writer = self.get_writer(flush_interval=0.01, clock=lambda: now[0])
+        writer.add_event(self.table, 1, self.event())
+        now[0] = 1
+        with writer._cond:
+            writer._cond.notify_all()
+            self.assertTrue(writer._wait_for(1, 5))
+        self.assertEquals(len(self.batches), 1)
+
+    def test_close_writes_remaining_events(self):
+        writer = self.get_writer()
+        for i in range(5):
+            writer.add_event(self.table, i, self.event(i))
+        writer.close()
+        self.assertEquals(len(self.written()), 5)
+        self.assertRaises(
+            ValueError,
+            writer.add_event,
+            self.table,
+            1,
+            self.event()
+        )
+
+    def test_groups_by_table(self):
+        other = resources.Table(name='other')
+        writer = self.get_writer()
+        writer.add_event(self.table, 1, self.event(1))
+        writer.add_event(other, 1, self.event(1))
+        writer.add_event(self.table, 2, self.event(2))
+        writer.flush()
+        self.assertEquals(
+            [(table.name, len(events)) for table, events, _ in self.batches],
+            [('users', 2), ('other', 1)]
+        )
+
+    def test_coalesces_replacements(self):
+        writer = self.get_writer()
+        writer.add_event(self.table, 1, self.event(0, n=1))
+        writer.add_event(self.table, 1, self.event(0, n=2))
+        writer.add_event(self.table, 2, self.event(0, n=3))
+        writer.flush()
+        self.assertEquals(self.written(), [(1, {'n': 2}), (2, {'n': 3})])
+        self.assertEquals(writer.stats()['coalesced'], 1)
+
+    def test_coalesces_merges(self):
+        writer = self.get_writer(replace=False)
+        writer.add_event(self.table, 1, self.event(0, a=1, b=1))
+        writer.add_event(self.table, 1, self.event(0, b=2))
+        writer.flush()
+        self.assertEquals(self.written(), [(1, {'a': 1, 'b': 2})])
+        self.assertFalse(self.batches[0][2]['replace'])
+
+    def test_drop_oldest(self):
+        gate = threading.Event()
+        self.client.create_events.side_effect = (
+            lambda *args, **kwargs: (
+                gate.wait(5),
+                self.create_events(*args, **kwargs)
+            )[1]
+        )
+        writer = self.get_writer(max_queue=2, backpressure=DROP_OLDEST)
+        for i in range(4):
+            writer.add_event(self.table, i, self.event(i))
+        self.assertEquals(writer.stats()['dropped'], 2)
+        gate.set()
+        writer.flush(5)
+        self.assertEquals([object_id for object_id, _ in self.written()], [
+            2,
+            3
+        ])
+
+    def test_raise(self):
+        gate = threading.Event()
+        self.client.create_events.side_effect = (
+            lambda *a, **k: (gate.wait(5), BulkResult())[1]
+        )
+        writer = self.get_writer(max_queue=1, backpressure=RAISE)
+        writer.add_event(self.table, 1, self.event())
+        self.assertRaises(
+            BufferFull,
+            writer.add_event,
+            self.table,
+            2,
+            self.event()
+        )
+        gate.set()
+
+    def test_block_flushes_to_make_room(self):
+        writer = self.get_writer(max_queue=2, backpressure=BLOCK)
+        for i in range(10):
+            writer.add_event(self.table, i, self.event(i))
+        writer.flush(5)
+        self.assertEquals(len(self.written()), 10)
+        self.assertEquals(writer.stats()['dropped'], 0)
+
+    def test_block_timeout(self):
+        gate = threading.Event()
+        self.client.create_events.side_effect = (
+            lambda *a, **k: (gate.wait(5), BulkResult())[1]
+        )
+        writer = self.get_writer(
+            max_queue=1,
+            backpressure=BLOCK,
+            block_timeout=0.01
+        )
+        writer.add_event(self.table, 1, self.event())
+        # The first event is being written, so the second fills the queue
+        writer.flush(0.05)
+        writer.add_event(self.table, 2, self.event())
+        self.assertRaises(
+            BufferFull,
+            writer.add_event,
+            self.table,
+            3,
+            self.event()
+        )
+        gate.set()
+
+    def test_reports_failures(self):
+        failures = []
+        self.client.create_events.side_effect = Exception('down')
+        writer = self.get_writer(
+            on_failure=lambda table, f: failures.extend(f)
+        )
+        writer.add_event(self.table, 1, self.event())
+        writer.flush(5)
+        self.assertEquals(len(failures), 1)
+        self.assertEquals(failures[0].object_id, 1)
+        self.assertEquals(writer.stats()['failed'], 1)
+
+    def get_spool(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        spool = Spool(directory, codec='json')
+        self.addCleanup(spool.close)
+        return spool
+
+    def unreachable(self, table, events, **kwargs):
+        result = BulkResult()
+        result.add_batch_failure(
+            list(enumerate(events)),
+            ConnectionError('refused')
+        )
+        return result
+
+    def test_spools_while_unreachable_then_replays(self):
+        spool = self.get_spool()
+        self.client.create_events.side_effect = self.unreachable
+        self.client.ping = Mock(return_value=False)
+        writer = self.get_writer(spool=spool, retry_interval=0)
+        writer.add_event(self.table, 1, self.event(1, n=1))
+        writer.flush(5)
+        self.assertEquals(spool.pending, 1)
+
+        # Still down: new events queue up behind the spooled ones
+        writer.add_event(self.table, 2, self.event(2, n=2))
+        writer.flush(5)
+        self.assertEquals(spool.pending, 2)
+        self.assertEquals(self.client.create_events.call_count, 1)
+
+        self.client.create_events.side_effect = self.create_events
+        self.client.ping.return_value = True
+        writer.add_event(self.table, 3, self.event(3, n=3))
+        writer.flush(5)
+        self.assertEquals(spool.pending, 0)
+        self.assertEquals(
+            [object_id for object_id, data in self.written()],
+            [1, 2, 3]
+        )
+        stats = writer.stats()
+        self.assertEquals(stats['spooled'], 2)
+        self.assertEquals(stats['replayed'], 2)
+        self.assertEquals(stats['failed'], 0)
+
+    def test_rejected_spooled_event_does_not_wedge_writer(self):
+        spool = self.get_spool()
+        failures = []
+        self.client.create_events.side_effect = self.unreachable
+        self.client.ping = Mock(return_value=False)
+        writer = self.get_writer(
+            spool=spool,
+            retry_interval=0,
+            on_failure=lambda table, f: failures.extend(f)
+        )
+        for i in range(3):
+            writer.add_event(self.table, i, self.event(i, n=i))
+        writer.flush(5)
+        self.assertEquals(spool.pending, 3)
+
+        # Back, but the table lost a property the middle event uses
+        def create_events(table, events, **kwargs):
+            result = BulkResult()
+            for index, (object_id, event) in enumerate(events):
+                if object_id == 1:
+                    result.add_failure(index, object_id, event, HTTPError(
+                        response=Mock(status_code=400)
+                    ))
+                else:
+                    self.batches.append((table, [(object_id, event)], {}))
+                    result.written += 1
+            return result
+
+        self.client.create_events.side_effect = create_events
+        self.client.ping.return_value = True
+        writer.add_event(self.table, 3, self.event(3, n=3))
+        writer.flush(5)
+        self.assertEquals(spool.pending, 0)
+        self.assertEquals([f.object_id for f in failures], [1])
+        writer.add_event(self.table, 4, self.event(4, n=4))
+        writer.flush(5)
+        self.assertEquals(
+            [object_id for object_id, data in self.written()],
+            [0, 2, 3, 4]
+        )
+        self.assertEquals(writer.stats()['failed'], 1)
+
+    def test_only_unreachable_failures_are_spooled(self):
+        spool = self.get_spool()
+        failures = []
+
+        def create_events(table, events, **kwargs):
+            result = BulkResult()
+            response = Mock(status_code=400)
+            result.add_failure(0, 1, events[0][1], HTTPError(
+                response=response
+            ))
+            response = Mock(status_code=503)
+            result.add_failure(1, 2, events[1][1], HTTPError(
+                response=response
+            ))
+            return result
+
+        self.client.create_events.side_effect = create_events
+        self.client.ping = Mock(return_value=False)
+        writer = self.get_writer(
+            spool=spool,
+            on_failure=lambda table, f: failures.extend(f)
+        )
+        writer.add_event(self.table, 1, self.event(1))
+        writer.add_event(self.table, 2, self.event(2))
+        writer.flush(5)
+        self.assertEquals([f.object_id for f in failures], [1])
+        self.assertEquals(spool.pending, 1)
+
+    def test_survives_raising_on_failure(self):
+        def create_events(table, events, **kwargs):
+            result = BulkResult()
+            result.add_batch_failure(list(enumerate(events)), ValueError())
+            return result
+
+        def on_failure(table, failures):
+            raise RuntimeError('oops')
+
+        self.client.create_events.side_effect = create_events
+        writer = self.get_writer(on_failure=on_failure)
+        writer.add_event(self.table, 1, self.event(1))
+        self.assertTrue(writer.flush(5))
+        self.client.create_events.side_effect = self.create_events
+        writer.add_event(self.table, 2, self.event(2))
+        self.assertTrue(writer.flush(5))
+        self.assertEquals([object_id for object_id, d in self.written()], [2])
+        self.assertEquals(writer.stats()['failed'], 1)
+
+    def test_spool_errors_are_failures(self):
+        spool = Mock(pending=0)
+        spool.extend = Mock(side_effect=OSError('disk full'))
+        failures = []
+        self.client.create_events.side_effect = self.unreachable
+        self.client.ping = Mock(return_value=False)
+        writer = self.get_writer(
+            spool=spool,
+            on_failure=lambda table, f: failures.extend(f)
+        )
+        writer.add_event(self.table, 1, self.event(1))
+        self.assertTrue(writer.flush(5))
+        self.assertEquals([f.object_id for f in failures], [1])
+        self.assertIsInstance(failures[0].error, OSError)
+        self.assertTrue(writer._thread.is_alive())
+
+    def test_add_event_raises_once_thread_is_gone(self):
+        started = threading.Event()
+
+        def create_events(table, events, **kwargs):
+            started.set()
+            raise SystemExit()
+
+        self.client.create_events.side_effect = create_events
+        writer = self.get_writer(max_queue=1, backpressure=BLOCK)
+        writer.add_event(self.table, 1, self.event(1))
+        writer.flush(0)
+        self.assertTrue(started.wait(5))
+        writer._thread.join(5)
+        self.assertRaises(
+            RuntimeError,
+            writer.add_event,
+            self.table,
+            2,
+            self.event(2)
+        )
+
+    def test_blocked_producer_wakes_when_thread_is_gone(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def create_events(table, events, **kwargs):
+            started.set()
+            release.wait(5)
+            raise SystemExit()
+
+        self.client.create_events.side_effect = create_events
+        writer = self.get_writer(max_queue=1, backpressure=BLOCK)
+        writer.add_event(self.table, 1, self.event(1))
+        writer.flush(0)
+        self.assertTrue(started.wait(5))
+        writer.add_event(self.table, 2, self.event(2))
+        errors = []
+
+        def produce():
+            try:
+                writer.add_event(self.table, 3, self.event(3))
+            except RuntimeError as e:
+                errors.append(e)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        release.set()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+        self.assertEquals(len(errors), 1)
+
+    def test_stats(self):
+        writer = self.get_writer()
+        writer.add_event(self.table, 1, self.event())
+        writer.flush(5)
+        stats = writer.stats()
+        self.assertEquals(stats['enqueued'], 1)
+        self.assertEquals(stats['written'], 1)
+        self.assertEquals(stats['flushes'], 1)
+        self.assertEquals(stats['queue_depth'], 0)
+        self.assertTrue(stats['max_flush_seconds'] >= 0)
+
+    def test_rejects_unknown_backpressure(self):
+        self.assertRaises(
+            ValueError,
+            BufferedEventWriter,
+            self.client,
+            backpressure='spill'
+        )